@@ -0,0 +1,124 @@
+"""
+Compara el rendimiento de las páginas de lectura del catálogo servidas con WSGI (gunicorn, vistas síncronas) y con ASGI
+(uvicorn, con las vistas síncronas y con las vistas async def de catalog/async_views.py).
+
+Para cada configuración arranca el servidor, lanza --requests peticiones con --concurrency clientes simultáneos a cada ruta
+y muestra peticiones por segundo y latencias (p50 / p95). Usa la base de datos configurada en settings.py (DATABASE_URL),
+que conviene llenar antes con datos de prueba.
+
+uso (desde la carpeta del proyecto, con gunicorn y uvicorn instalados):
+
+    python benchmarks/asgi_vs_wsgi.py --requests 500 --concurrency 50 --workers 2
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_PATHS = ['/catalog/', '/catalog/books/', '/catalog/authors/', '/catalog/book/1', '/catalog/author/1']
+
+# nombre -> (comando, variables de entorno)
+SERVERS = {
+    'wsgi-gunicorn': (['gunicorn', 'locallibrary.wsgi', '--workers', '{workers}', '--threads', '{threads}', '--bind', '127.0.0.1:{port}'], {}),
+    'asgi-uvicorn-sync': (['uvicorn', 'locallibrary.asgi:application', '--workers', '{workers}', '--port', '{port}', '--no-access-log'], {}),
+    'asgi-uvicorn-async': (['uvicorn', 'locallibrary.asgi:application', '--workers', '{workers}', '--port', '{port}', '--no-access-log'],
+                           {'CATALOG_ASYNC_VIEWS': '1'}),
+}
+
+
+def wait_until_ready(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'El servidor no respondió en {url}')
+
+
+def fetch(url):
+    started = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=30) as response:
+        response.read()
+        status = response.status
+    return time.perf_counter() - started, status
+
+
+def load(url, requests, concurrency):
+    """
+    Lanza requests peticiones GET a url con concurrency hilos. Devuelve las estadísticas de la ruta.
+    """
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(fetch, [url] * requests))
+    elapsed = time.perf_counter() - started
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        'requests_per_second': round(requests / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+        'errors': sum(1 for _, status in results if status != 200),
+    }
+
+
+def run_server(name, options):
+    command, extra_env = SERVERS[name]
+    if shutil.which(command[0]) is None:
+        print(f'{name}: {command[0]} no está instalado, se omite', file=sys.stderr)
+        return None
+
+    values = {'workers': options.workers, 'threads': options.threads, 'port': options.port}
+    command = [part.format(**values) for part in command]
+    env = {**os.environ, **extra_env}
+    process = subprocess.Popen(command, cwd=PROJECT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{options.port}'
+    try:
+        wait_until_ready(base_url + options.paths[0])
+        results = {}
+        for path in options.paths:
+            load(base_url + path, min(options.concurrency, options.requests), options.concurrency) # calentamiento
+            results[path] = load(base_url + path, options.requests, options.concurrency)
+        return results
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compara WSGI (gunicorn) con ASGI (uvicorn) en las páginas del catálogo.')
+    parser.add_argument('--requests', type=int, default=500, help='Peticiones por ruta')
+    parser.add_argument('--concurrency', type=int, default=50, help='Clientes simultáneos')
+    parser.add_argument('--workers', type=int, default=2, help='Procesos del servidor')
+    parser.add_argument('--threads', type=int, default=4, help='Hilos por proceso de gunicorn')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--servers', nargs='+', choices=sorted(SERVERS), default=list(SERVERS))
+    parser.add_argument('--paths', nargs='+', default=DEFAULT_PATHS)
+    parser.add_argument('--json', action='store_true', help='Mostrar el resultado en JSON')
+    options = parser.parse_args()
+
+    report = {}
+    for name in options.servers:
+        results = run_server(name, options)
+        if results is not None:
+            report[name] = results
+
+    if options.json:
+        print(json.dumps(report, indent=2))
+        return
+    for name, results in report.items():
+        print(name)
+        for path, stats in results.items():
+            print(f"  {path:<24} {stats['requests_per_second']:>8} req/s  p50 {stats['p50_ms']:>7} ms  p95 {stats['p95_ms']:>7} ms  errores {stats['errors']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Compara SQLite con la configuración de Django por defecto y con el backend ajustado (locallibrary/db/sqlite_tuned, SQLITE_TUNED=1)
+bajo carga concurrente: varios procesos (como los workers de gunicorn), cada uno con varios hilos, que mezclan lecturas del catálogo
+con escrituras como las de la biblioteca (renovar una copia leyéndola y guardándola en una transacción, y guardar sesiones).
+
+Para cada configuración copia la misma base de datos de partida (migrada y llena con seed_catalog), la carga durante --duration segundos
+y muestra operaciones por segundo, latencias (p50 / p95) de lecturas y escrituras y cuántas escrituras fallaron con "database is locked".
+
+uso (desde la carpeta del proyecto):
+
+    python benchmarks/sqlite_concurrency.py --workers 4 --threads 4 --duration 10 --writes 0.2
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    'django-por-defecto': {},
+    'sqlite-ajustado': {'SQLITE_TUNED': '1'},
+}
+
+
+def environment(path, extra=None):
+    return {**os.environ, 'DATABASE_URL': f'sqlite:///{path}', 'CATALOG_METRICS': '0', **(extra or {})}
+
+
+def prepare(directory, books):
+    """
+    La base de datos de partida: migrada y con books libros (con la configuración por defecto, así empieza sin WAL).
+    """
+    path = os.path.join(directory, 'base.sqlite3')
+    for command in (['migrate', '--verbosity', '0'], ['seed_catalog', '--books', str(books), '--users', str(max(books // 10, 1))]):
+        subprocess.run([sys.executable, 'manage.py', *command], cwd=PROJECT_DIR, env=environment(path), check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return path
+
+
+def worker(path, extra_env, threads, duration, write_fraction, seed, results):
+    """
+    Un proceso: threads hilos haciendo lecturas y escrituras durante duration segundos. Pone en results sus latencias y errores.
+    """
+    os.environ.update(environment(path, extra_env))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'locallibrary.settings')
+    sys.path.insert(0, PROJECT_DIR)
+    import django
+    django.setup()
+    from django.contrib.sessions.backends.db import SessionStore
+    from django.db import OperationalError, connection, transaction
+    from catalog.models import Book, BookInstance
+
+    copies = list(BookInstance.objects.values_list('pk', flat=True))
+    books = Book.objects.count()
+    connection.close()
+    deadline = time.monotonic() + duration
+    lock = threading.Lock()
+    report = {'reads': [], 'writes': [], 'locked': 0, 'errors': 0}
+
+    def read(rng):
+        offset = rng.randrange(max(books - 10, 1))
+        list(Book.objects.select_related('author').order_by('title')[offset:offset + 10])
+        Book.objects.count()
+
+    def write(rng):
+        if rng.random() < 0.5:
+            # renovar: leer la copia y guardarla en una transacción, como renew_book_librarian
+            with transaction.atomic():
+                copy = BookInstance.objects.get(pk=rng.choice(copies))
+                copy.due_back = datetime.date.today() + datetime.timedelta(days=rng.randrange(1, 28))
+                copy.save(update_fields=['due_back'])
+        else:
+            session = SessionStore()
+            session['visits'] = rng.randrange(100)
+            session.create()
+
+    def run(number):
+        rng = random.Random(f'{seed}:{number}')
+        reads, writes, locked, errors = [], [], 0, 0
+        while time.monotonic() < deadline:
+            is_write = rng.random() < write_fraction
+            started = time.perf_counter()
+            try:
+                (write if is_write else read)(rng)
+            except OperationalError as error:
+                if 'locked' in str(error):
+                    locked += 1
+                else:
+                    errors += 1
+                continue
+            (writes if is_write else reads).append(time.perf_counter() - started)
+        connection.close()
+        with lock:
+            report['reads'] += reads
+            report['writes'] += writes
+            report['locked'] += locked
+            report['errors'] += errors
+
+    pool = [threading.Thread(target=run, args=(number,)) for number in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put(report)
+
+
+def percentile_ms(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[max(0, int(len(values) * fraction) - 1)] * 1000, 2)
+
+
+def run_mode(name, base_path, directory, options):
+    path = os.path.join(directory, f'{name}.sqlite3')
+    shutil.copyfile(base_path, path)
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(path, MODES[name], options.threads, options.duration, options.writes,
+                                                      number, results))
+                 for number in range(options.workers)]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    reads = [latency for report in reports for latency in report['reads']]
+    writes = [latency for report in reports for latency in report['writes']]
+    return {
+        'reads_per_second': round(len(reads) / options.duration, 1),
+        'writes_per_second': round(len(writes) / options.duration, 1),
+        'read_p50_ms': round(statistics.median(reads) * 1000, 2) if reads else None,
+        'read_p95_ms': percentile_ms(reads, 0.95),
+        'write_p50_ms': round(statistics.median(writes) * 1000, 2) if writes else None,
+        'write_p95_ms': percentile_ms(writes, 0.95),
+        'locked_errors': sum(report['locked'] for report in reports),
+        'other_errors': sum(report['errors'] for report in reports),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compara SQLite por defecto con el backend ajustado bajo escrituras concurrentes.')
+    parser.add_argument('--workers', type=int, default=4, help='Procesos (como workers de gunicorn)')
+    parser.add_argument('--threads', type=int, default=4, help='Hilos por proceso')
+    parser.add_argument('--duration', type=float, default=10, help='Segundos de carga por configuración')
+    parser.add_argument('--writes', type=float, default=0.2, help='Fracción de operaciones que escriben (por defecto 0.2)')
+    parser.add_argument('--books', type=int, default=1000, help='Libros en la base de datos de partida')
+    parser.add_argument('--modes', nargs='+', choices=sorted(MODES), default=list(MODES))
+    parser.add_argument('--json', action='store_true', help='Mostrar el resultado en JSON')
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        base_path = prepare(directory, options.books)
+        report = {name: run_mode(name, base_path, directory, options) for name in options.modes}
+
+    if options.json:
+        print(json.dumps(report, indent=2))
+        return
+    for name, stats in report.items():
+        print(f"{name:<20} lecturas {stats['reads_per_second']:>8}/s (p50 {stats['read_p50_ms']} ms, p95 {stats['read_p95_ms']} ms)  "
+              f"escrituras {stats['writes_per_second']:>7}/s (p50 {stats['write_p50_ms']} ms, p95 {stats['write_p95_ms']} ms)  "
+              f"'database is locked': {stats['locked_errors']}  otros errores: {stats['other_errors']}")
+
+
+if __name__ == '__main__':
+    main()
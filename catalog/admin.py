@@ -1,5 +1,15 @@
-from django.contrib import admin
-from .models import Author, Genre, Book, BookInstance
+from django.contrib import admin, messages
+from django.contrib.admin.utils import unquote
+from django.core.paginator import Paginator
+from django.http import Http404
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from .models import Author, Genre, Book, BookInstance, Hold
+from .counters import CounterPaginator
+from .forms import RenewBookForm
+from .loans import bulk_renew, bulk_return
+from .holds import cancel_hold, checkout_hold
+import datetime
 
 #importar los modelos que creamos en models.py, así es como los agregamos a la aplicación
 
@@ -7,20 +17,136 @@ from .models import Author, Genre, Book, BookInstance
 #admin.site.register(Author)
 #admin.site.register(BookInstance)
 
-admin.site.register(Genre) #el género no require que le modifiquemos el modo de presentacion porque solo tiene un campo, sería inútil.
+# las listas de cambios (changelists) del admin cuentan todas las filas para la paginación. Con este mixin el total sale de la tabla
+# de contadores (catalog/counters.py) cuando no hay filtros ni búsquedas, así no hace falta recorrer la tabla entera.
+# show_full_result_count = False: al filtrar o buscar, el admin muestra "N resultados (M en total)" y para el total hace otro COUNT(*)
+# de toda la tabla; así muestra solo los resultados del filtro y se ahorra esa consulta.
+class CounterPaginationMixin:
+    counter_name = None
+    show_full_result_count = False
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        return CounterPaginator(queryset, per_page, orphans, allow_empty_first_page, counter_name=self.counter_name)
+
+class GenreAdmin(CounterPaginationMixin, admin.ModelAdmin):
+    counter_name = 'genres'
+    search_fields = ['name'] # para el autocompletado del campo genre en BooksInLine
+
+admin.site.register(Genre, GenreAdmin) #el género no require que le modifiquemos el modo de presentacion porque solo tiene un campo, sería inútil.
 
 # A veces puede tener sentido el añadir registros asociados al mismo tiempo. 
 # Por ejemplo, puede tener sentido el tener información tanto de un libro como de las copias específicas que has adquirido del mismo, ambos en la misma página.
 # Puedes hacerlo declarando inlines, de tipo TabularInline (diseño horizontal) o StackedInline (diseño vertical, tal como el diseño de modelo por defecto).
 # Gracias a eso, al estar viendo la información de un libro, vamos a poder ver al final de la página todas las instancias "físicas" de ese libro
 
-# vamos a usar esto para mostrar los libros que tiene cada autor al final de la página de la vista detallada del autor
-class BooksInLine(admin.TabularInline):
+# Las filas relacionadas (los libros de un autor, las copias de un libro) pueden ser miles. Un inline normal las dibuja todas en el formulario,
+# cada una con sus widgets, así que la página de un autor prolífico pesaba megas y tardaba segundos.
+# Ahora los inlines solo sirven para añadir filas nuevas (AddOnlyInlineMixin), y las existentes se ven en una lista paginada que se carga
+# bajo demanda (LazyRelatedMixin): el formulario pide cada página a <id>/related/<nombre>/?page=N y la inserta, sin recargar.
+
+class AddOnlyInlineMixin:
+    """
+    Inline que no dibuja las filas existentes (esas se ven y editan desde la lista paginada), solo el enlace para añadir nuevas.
+    """
+    extra = 0
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).none()
+
+
+class RelatedRows:
+    """
+    Descripción de una lista paginada de filas relacionadas: título, modelo, campo que apunta al objeto (fk_name),
+    columnas [(encabezado, función que recibe la fila)] y los select_related / prefetch_related que necesitan las columnas.
+    """
+    def __init__(self, title, model, fk_name, columns, select_related=(), prefetch_related=(), ordering=None):
+        self.title = title
+        self.model = model
+        self.fk_name = fk_name
+        self.columns = columns
+        self.select_related = select_related
+        self.prefetch_related = prefetch_related
+        self.ordering = ordering or model._meta.ordering or ['pk']
+
+    def queryset(self, obj):
+        queryset = self.model.objects.filter(**{self.fk_name: obj}).order_by(*self.ordering, 'pk')
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        return queryset
+
+
+class LazyRelatedMixin:
+    """
+    Añade al formulario de cambio las listas de related_rows ({nombre: RelatedRows}), paginadas de related_per_page filas
+    y cargadas bajo demanda desde la vista related_view (ver admin/catalog/change_form_lazy_related.html y js/admin_related.js).
+    """
+    related_rows = {}
+    related_per_page = 25
+    change_form_template = 'admin/catalog/change_form_lazy_related.html'
+
+    class Media:
+        js = ['js/admin_related.js']
+
+    def get_urls(self):
+        opts = self.model._meta
+        return [
+            path('<path:object_id>/related/<str:name>/', self.admin_site.admin_view(self.related_view),
+                 name=f'{opts.app_label}_{opts.model_name}_related'),
+        ] + super().get_urls()
+
+    def related_url(self, obj, name):
+        opts = self.model._meta
+        return reverse(f'{self.admin_site.name}:{opts.app_label}_{opts.model_name}_related', args=[obj.pk, name])
+
+    def change_view(self, request, object_id, form_url='', extra_context=None):
+        extra_context = extra_context or {}
+        obj = self.get_object(request, unquote(object_id))
+        if obj is not None:
+            extra_context['related_lists'] = [(rows.title, self.related_url(obj, name)) for name, rows in self.related_rows.items()]
+        return super().change_view(request, object_id, form_url, extra_context)
+
+    def related_view(self, request, object_id, name):
+        """
+        Una página de filas relacionadas, como fragmento HTML. Consultas: el objeto, el COUNT del paginador, la página (y sus prefetch).
+        """
+        rows = self.related_rows.get(name)
+        obj = self.get_object(request, unquote(object_id))
+        if rows is None or obj is None or not self.has_view_or_change_permission(request, obj):
+            raise Http404
+        related_admin = self.admin_site._registry.get(rows.model)
+        if related_admin is None or not related_admin.has_view_or_change_permission(request):
+            raise Http404
+
+        page = Paginator(rows.queryset(obj), self.related_per_page).get_page(request.GET.get('page'))
+        opts = rows.model._meta
+        change_url = f'{self.admin_site.name}:{opts.app_label}_{opts.model_name}_change'
+        return TemplateResponse(request, 'admin/catalog/related_rows.html', {
+            'headers': [header for header, _ in rows.columns],
+            'rows': [(reverse(change_url, args=[row.pk]), [value(row) for _, value in rows.columns]) for row in page.object_list],
+            'page_obj': page,
+            'url': self.related_url(obj, name),
+            'add_url': reverse(f'{self.admin_site.name}:{opts.app_label}_{opts.model_name}_add') + f'?{rows.fk_name}={obj.pk}',
+            'can_add': related_admin.has_add_permission(request),
+        })
+
+
+# vamos a usar esto para añadir libros a un autor al final de la página de la vista detallada del autor (los que ya tiene se listan paginados)
+class BooksInLine(AddOnlyInlineMixin, admin.TabularInline):
     model = Book
     fields = ['title', 'summary', 'genre']
-    extra = 0
+    autocomplete_fields = ['genre'] # en lugar de un <select multiple> con todos los géneros en cada fila
 
-class AuthorAdmin(admin.ModelAdmin):
+class AuthorAdmin(CounterPaginationMixin, LazyRelatedMixin, admin.ModelAdmin):
+    counter_name = 'authors'
+    related_rows = {
+        'books': RelatedRows('Libros', Book, 'author', [
+            ('Título', lambda book: book.title),
+            ('ISBN', lambda book: book.isbn),
+            ('Géneros', lambda book: book.display_genre()),
+        ], prefetch_related=['genre']),
+    }
     # sin esto, nuestra locallibrary solo mostrara el titulo de los libros usando su metodo __str__. Pero esto puede traer duplicados en una lista grande
     # Para diferenciarlos, o simplemente para mostrar información más interesante sobre cada autor, se puede usar list_display para añadir otros campos que se vean al listarlos.
     # como se puede ver, los argumentos que necesita son los nombres de campos del modelo
@@ -33,30 +159,85 @@ class AuthorAdmin(admin.ModelAdmin):
     # Los campos se despliegan en vertical por defecto, pero se desplegarán en horizontal si los agrupas en una tupla
     fields = ['first_name', 'last_name', 'date_of_birth', 'date_of_death']
 
+    # search_fields permite buscar autores, y lo necesita el widget de autocompletado del campo author en BookAdmin
+    search_fields = ['last_name', 'first_name']
+
     inlines = [BooksInLine]
 
 # Register the admin class with the associated model
 admin.site.register(Author, AuthorAdmin)
 
-class BooksInstanceInline(admin.TabularInline):
+class BooksInstanceInline(AddOnlyInlineMixin, admin.TabularInline):
     model = BookInstance
-    extra = 0    # para que no se muestren instancias extras del libro vacías
+    # extra = 0 (en AddOnlyInlineMixin) para que no se muestren instancias extras del libro vacías
+    # sin esto cada copia del libro tendría un <select> con todos los usuarios (una consulta y una lista enorme por fila)
+    autocomplete_fields = ['borrower']
 
 @admin.register(Book) # la expresión @register registra los modelos (hace exactamente lo mismo que admin.site.register())
-class BookAdmin(admin.ModelAdmin):
+class BookAdmin(CounterPaginationMixin, LazyRelatedMixin, admin.ModelAdmin):
+    counter_name = 'books'
+    related_rows = {
+        'copies': RelatedRows('Copias', BookInstance, 'book', [
+            ('Imprenta', lambda copy: copy.imprint),
+            ('Estado', lambda copy: copy.get_status_display()),
+            ('Devolución', lambda copy: copy.due_back or ''),
+            ('Prestatario', lambda copy: copy.borrower or ''),
+            ('Id', lambda copy: copy.pk),
+        ], select_related=['borrower'], ordering=['status', 'due_back']),
+    }
     #no podemos especificar directamente el modelo del genero porque es un manytomanyfield y segun django esto seria muy costoso para acceder a la base de datos
     #por eso vamos a usar un método (el cual vamos a definir en el modelo de book)para obtener la información como una cadena
     list_display = ('title', 'author', 'display_genre')
     inlines = [BooksInstanceInline]
 
+    # cada fila muestra el autor y los géneros. list_select_related trae el autor en la misma consulta (JOIN) y get_queryset()
+    # trae los géneros de toda la página con una sola consulta más (prefetch_related); Book.display_genre los lee de ahí.
+    # Así la lista hace las mismas consultas con 10 libros que con 100, en lugar de dos más por libro.
+    list_select_related = ('author',)
+    search_fields = ['title', 'isbn'] # también lo usa el autocompletado del campo book en BookInstanceAdmin
+    autocomplete_fields = ['author'] # en lugar de un <select> con todos los autores
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('genre')
+
 @admin.register(BookInstance)
-class BookInstanceAdmin(admin.ModelAdmin):
+class BookInstanceAdmin(CounterPaginationMixin, admin.ModelAdmin):
+    counter_name = 'copies'
     list_display = ('book', 'status', 'borrower', 'due_back', 'id')
 
+    # el libro y el prestatario de cada fila vienen en la misma consulta que las copias (ver BookAdmin)
+    list_select_related = ('book', 'borrower')
+
+    # los campos book y borrower se eligen buscando (autocompletado) en lugar de con un <select> que carga todos los libros y usuarios
+    autocomplete_fields = ['book', 'borrower']
+
     # Podemos filtrar los ítems que se despliegan. Esto se hace listando campos del módelo en el atributo list_filter.
     # Entonces solo se mostraran los libros que cumplan los requisitos escogidos de ciertos campos
     list_filter = ('status', 'due_back')
 
+    # acciones sobre las copias marcadas en la lista (ver catalog/loans.py): un solo UPDATE para todas en vez de guardar una por una
+    actions = ['renew_copies', 'return_copies']
+
+    def report(self, request, results):
+        done = sum(result.ok for result in results)
+        self.message_user(request, f'{done} de {len(results)} copias actualizadas.', messages.SUCCESS if done else messages.WARNING)
+        for result in results:
+            if not result.ok:
+                self.message_user(request, f'{result.copy_id} ({result.title}): {result.message}', messages.WARNING)
+
+    @admin.action(description='Renovar las copias prestadas seleccionadas (3 semanas)', permissions=['change'])
+    def renew_copies(self, request, queryset):
+        # validamos la fecha con las mismas reglas que el formulario de renovación de los bibliotecarios
+        form = RenewBookForm({'renewal_date': datetime.date.today() + datetime.timedelta(weeks=3)})
+        if not form.is_valid():
+            self.message_user(request, form.errors['renewal_date'][0], messages.ERROR)
+            return
+        self.report(request, bulk_renew(queryset.values_list('pk', flat=True), form.cleaned_data['renewal_date']))
+
+    @admin.action(description='Marcar como devueltas las copias prestadas seleccionadas', permissions=['change'])
+    def return_copies(self, request, queryset):
+        self.report(request, bulk_return(queryset.values_list('pk', flat=True)))
+
     # Puedes añadir "secciones" para agrupar información relacionada del modelo dentro del formulario de detalle, usando el atributo fieldsets.
     # la forma en que la definimos hace que los campos esten separados en dos secciones. una sección sin nombre (none) que muestra el libro, su imprint y id
     # y la segunda sección que tiene el nombre de disponibilidad, muestra los campos  relacionados con esa información
@@ -69,3 +250,31 @@ class BookInstanceAdmin(admin.ModelAdmin):
             'fields': ('status', 'due_back', 'borrower') # el colocar un borrower en los campos a mostrar en la pagina de admin va a hacer que podamos asignar un user a un bookInstance
         }),
     )
+
+
+@admin.register(Hold)
+class HoldAdmin(admin.ModelAdmin):
+    """
+    Reservas. Los bibliotecarios entregan las copias apartadas (o cancelan reservas) con las acciones, que pasan por catalog/holds.py
+    para que la copia y la cola queden consistentes; por eso la reserva no se edita a mano.
+    """
+    list_display = ('book', 'user', 'status', 'copy', 'created_at', 'ready_at')
+    list_filter = ('status',)
+    list_select_related = ('book', 'user', 'copy__book')
+    show_full_result_count = False
+    readonly_fields = ('book', 'user', 'status', 'copy', 'created_at', 'ready_at')
+    actions = ['checkout_holds', 'cancel_holds']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Entregar las copias apartadas de las reservas seleccionadas (3 semanas)', permissions=['change'])
+    def checkout_holds(self, request, queryset):
+        due_back = datetime.date.today() + datetime.timedelta(weeks=3)
+        done = sum(checkout_hold(hold, due_back) for hold in queryset.filter(status='r'))
+        self.message_user(request, f'{done} copias entregadas.', messages.SUCCESS if done else messages.WARNING)
+
+    @admin.action(description='Cancelar las reservas seleccionadas', permissions=['change'])
+    def cancel_holds(self, request, queryset):
+        done = sum(cancel_hold(hold) for hold in queryset.filter(status__in=Hold.ACTIVE_STATUSES))
+        self.message_user(request, f'{done} reservas canceladas.', messages.SUCCESS if done else messages.WARNING)
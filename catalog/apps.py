@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CatalogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'catalog'
+
+    def ready(self):
+        # importar el módulo de señales conecta sus receptores (ver catalog/signals.py)
+        from . import signals  # noqa: F401
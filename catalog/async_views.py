@@ -0,0 +1,147 @@
+"""
+Versiones asíncronas (async def) de las vistas de lectura del catálogo, para servir el sitio con un servidor ASGI (uvicorn, daphne)
+a través de locallibrary/asgi.py. Se activan con CATALOG_ASYNC_VIEWS en settings.py (ver catalog/urls.py).
+
+Con un servidor ASGI una vista síncrona se ejecuta en un hilo aparte (sync_to_async) y la petición espera a ese hilo;
+una vista async def se ejecuta directamente en el bucle de eventos. Para la base de datos usamos el ORM asíncrono de Django
+(acount(), aget(), afirst() y "async for" para recorrer un queryset).
+
+Hay que tener en cuenta dos limitaciones de Django 5.0:
+- El ORM asíncrono todavía ejecuta cada consulta en el hilo de las operaciones síncronas (thread_sensitive), de una en una.
+  asyncio.gather() permite que el bucle atienda otras peticiones mientras tanto, pero las consultas de una misma petición no van en paralelo.
+- Las plantillas (y request.user, que carga la sesión) son síncronas, así que render() se ejecuta con sync_to_async. Por eso cargamos
+  antes todos los datos que usa la plantilla (select_related, prefetch_related, listas ya evaluadas): así no hace consultas al renderizar.
+
+Las listas y los detalles usan la misma caché de páginas para los visitantes anónimos y las mismas respuestas 304 que las vistas
+síncronas (cache_anonymous_page y conditional_page): los dos decoradores aceptan vistas async def y hacen sus consultas con sync_to_async.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.paginator import Paginator, InvalidPage
+from django.db.models import Count, Prefetch
+from django.http import Http404
+from django.shortcuts import render
+
+from .models import Book, Author, BookInstance
+from .caching import author_books_page, cache_anonymous_page, get_version, page_cache_timeout, PAGES_VERSION_NAME
+from .conditional import conditional_page, book_list_validators, book_detail_validators, author_list_validators, author_detail_validators
+from .pagination import CursorPaginator, InvalidCursor
+from .stats import get_catalog_stats
+from .visits import get_visit_counter
+from .views import BookListView, BookDetailView, AuthorListView, AuthorDetailView
+
+
+def render_page(request, template_name, context):
+    """
+    Renderiza la plantilla (síncrono: se llama con sync_to_async). Añade las variables de la caché de fragmentos que usan las listas.
+    """
+    context['catalog_cache_version'] = get_version(PAGES_VERSION_NAME)
+    context['catalog_cache_timeout'] = page_cache_timeout()
+    return render(request, template_name, context)
+
+
+arender = sync_to_async(render_page)
+
+
+async def paginate(request, queryset, per_page):
+    """
+    Versión asíncrona de la paginación de ListView. Devuelve (paginator, page, is_paginated) con page.object_list ya evaluada.
+    """
+    if getattr(settings, 'CATALOG_CURSOR_PAGINATION', False):
+        ordering = (queryset.query.order_by or queryset.model._meta.ordering)[0]
+        paginator = CursorPaginator(queryset, per_page, ordering)
+        try:
+            page = await sync_to_async(paginator.page)(request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404('Cursor de paginación no válido')
+        return paginator, page, page.has_other_pages()
+
+    paginator = Paginator(queryset, per_page)
+    # Paginator.count es una cached_property síncrona; la calculamos con acount() y la guardamos donde la buscaría
+    paginator.__dict__['count'] = await queryset.acount()
+    try:
+        page = paginator.page(request.GET.get('page') or 1)
+    except InvalidPage:
+        raise Http404('Página no válida')
+    page.object_list = [obj async for obj in page.object_list]
+    return paginator, page, page.has_other_pages()
+
+
+async def index(request):
+    """
+    Versión asíncrona de views.index. Los contadores salen de la caché (o de la tabla de contadores, una sola consulta; ver catalog/stats.py)
+    y el contador de visitas es independiente de ellos, así que pedimos las dos cosas a la vez.
+    """
+    visit_counter = get_visit_counter()
+    stats, num_visits = await asyncio.gather(
+        sync_to_async(get_catalog_stats)(),
+        sync_to_async(visit_counter.visit)(request),
+    )
+    response = await sync_to_async(render)(request, 'index.html', {**stats, 'num_visits': num_visits})
+    visit_counter.save(request, response)
+    return response
+
+
+@conditional_page(book_list_validators)
+@cache_anonymous_page('books')
+async def book_list(request):
+    queryset = Book.objects.select_related('author')
+    paginator, page, is_paginated = await paginate(request, queryset, BookListView.paginate_by)
+    return await arender(request, 'catalog/book_list.html', {
+        'book_list': page.object_list, 'object_list': page.object_list,
+        'paginator': paginator, 'page_obj': page, 'is_paginated': is_paginated,
+    })
+
+
+@conditional_page(book_detail_validators)
+@cache_anonymous_page('book-detail')
+async def book_detail(request, pk):
+    listed_copies = BookInstance.objects.all()[:BookDetailView.max_copies_listed]
+    books = Book.objects.select_related('author').prefetch_related(
+        'genre',
+        Prefetch('bookinstance_set', queryset=listed_copies, to_attr='listed_copies'),
+    )
+    try:
+        book = await books.aget(pk=pk)
+    except Book.DoesNotExist:
+        raise Http404('No se encontró el libro')
+
+    counts = {status: total async for status, total in book.bookinstance_set.order_by().values_list('status').annotate(total=Count('pk'))}
+    num_copies = sum(counts.values())
+    return await arender(request, 'catalog/book_detail.html', {
+        'book': book, 'object': book,
+        'copy_summary': [(status, label, counts.get(status, 0)) for status, label in BookInstance.LOAN_STATUS],
+        'num_copies': num_copies,
+        'num_copies_not_listed': num_copies - len(book.listed_copies),
+    })
+
+
+@conditional_page(author_list_validators)
+@cache_anonymous_page('authors')
+async def author_list(request):
+    paginator, page, is_paginated = await paginate(request, Author.objects.all(), AuthorListView.paginate_by)
+    return await arender(request, 'catalog/author_list.html', {
+        'author_list': page.object_list, 'object_list': page.object_list,
+        'paginator': paginator, 'page_obj': page, 'is_paginated': is_paginated,
+    })
+
+
+@conditional_page(author_detail_validators)
+@cache_anonymous_page('author-detail')
+async def author_detail(request, pk):
+    try:
+        author = await Author.objects.aget(pk=pk)
+    except Author.DoesNotExist:
+        raise Http404('No se encontró el autor')
+    try:
+        # la página de libros usa la caché por autor de catalog/caching.py, que es síncrona
+        page = await sync_to_async(author_books_page)(author, request.GET.get('page') or 1, AuthorDetailView.books_paginate_by)
+    except InvalidPage:
+        raise Http404('Página no válida')
+    return await arender(request, 'catalog/author_detail.html', {
+        'author': author, 'object': author,
+        'book_list': page.object_list,
+        'paginator': page.paginator, 'page_obj': page, 'is_paginated': page.has_other_pages(),
+    })
@@ -0,0 +1,204 @@
+"""
+Índice en memoria para el autocompletado de títulos y autores (lo usan los bibliotecarios en el mostrador).
+
+Un LIKE '%texto%' por cada tecla recorre la tabla entera. En su lugar cada proceso (worker) mantiene un índice de trigramas:
+cada título o nombre se parte en grupos de 3 letras ("hobbit" -> "  h", " ho", "hob", "obb", "bbi", "bit", "it ") y para cada trigrama
+guardamos en qué entradas aparece. Para buscar partimos el texto igual y contamos cuántos trigramas coinciden con cada entrada.
+
+Para que ocupe poca memoria las listas de entradas por trigrama (postings) son array('I') de enteros de 4 bytes, no listas de Python,
+y de cada entrada solo guardamos su tipo, su id y el texto a mostrar. Las entradas eliminadas se marcan y de vez en cuando se construye
+un índice compacto nuevo que reemplaza al anterior (las búsquedas no toman el candado: la que ya empezó termina con el índice viejo).
+
+El índice se construye la primera vez que se usa en cada proceso y las señales de catalog/signals.py lo actualizan al confirmar
+la transacción (un cambio que se revierte no debe aparecer en las sugerencias). Como los cambios
+hechos en otro worker no llegan por señales, también guardamos una versión en la caché compartida: si otro proceso cambió algo,
+este reconstruye su índice (como mucho una vez cada CATALOG_AUTOCOMPLETE_REFRESH segundos).
+"""
+import threading
+import time
+import unicodedata
+from array import array
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from .caching import get_version, bump_version
+from .models import Book, Author
+
+BOOK = 0
+AUTHOR = 1
+KINDS = {BOOK: 'book', AUTHOR: 'author'}
+
+VERSION_NAME = 'autocomplete'
+
+
+def normalize(text):
+    """
+    Minúsculas y sin acentos, para que "Garcia" encuentre "García".
+    """
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in text if not unicodedata.combining(char)).lower().strip()
+
+
+def trigrams(text):
+    """
+    Trigramas de cada palabra, con dos espacios delante y uno detrás (como pg_trgm) para que el comienzo de las palabras pese más.
+    """
+    grams = set()
+    for word in normalize(text).split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def query_trigrams(text):
+    """
+    Como trigrams(), pero sin el espacio final en la última palabra: mientras se escribe, la última palabra puede estar incompleta.
+    """
+    words = normalize(text).split()
+    grams = set()
+    for position, word in enumerate(words):
+        padded = f'  {word} ' if position < len(words) - 1 else f'  {word}'
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+
+    def __init__(self):
+        self.kinds = array('B')
+        self.ids = array('Q')
+        self.labels = []
+        self.postings = defaultdict(lambda: array('I'))
+        self.positions = {} # (tipo, id) -> posición de la entrada viva
+        self.removed = set()
+
+    def __len__(self):
+        return len(self.positions)
+
+    def add(self, kind, pk, label):
+        self.remove(kind, pk)
+        position = len(self.labels)
+        self.kinds.append(kind)
+        self.ids.append(pk)
+        self.labels.append(label)
+        self.positions[(kind, pk)] = position
+        for gram in trigrams(label):
+            self.postings[gram].append(position)
+
+    def remove(self, kind, pk):
+        position = self.positions.pop((kind, pk), None)
+        if position is None:
+            return
+        self.removed.add(position)
+
+    def needs_compaction(self):
+        # cuando más de la cuarta parte de las entradas están eliminadas conviene reconstruir los arrays sin ellas
+        return len(self.removed) > 1000 and len(self.removed) * 4 > len(self.labels)
+
+    def compacted(self):
+        """
+        Un índice nuevo solo con las entradas vivas. Este no se modifica, así que las búsquedas que lo estén usando no se enteran.
+        """
+        index = TrigramIndex()
+        for (kind, pk), position in sorted(self.positions.items(), key=lambda item: item[1]):
+            index.add(kind, pk, self.labels[position])
+        return index
+
+    def search(self, text, limit=10):
+        """
+        Devuelve hasta limit tuplas (tipo, id, texto) ordenadas por cuántos trigramas de la búsqueda contienen.
+        Exigimos que coincidan al menos dos tercios de los trigramas para tolerar alguna errata sin devolver cualquier cosa.
+        """
+        grams = query_trigrams(text)
+        if not grams:
+            return []
+        scores = defaultdict(int)
+        for gram in grams:
+            postings = self.postings.get(gram)
+            if postings is None:
+                continue
+            for position in postings:
+                scores[position] += 1
+
+        minimum = max(1, (len(grams) * 2 + 2) // 3)
+        matches = [(score, position) for position, score in scores.items() if score >= minimum and position not in self.removed]
+        # más trigramas coincidentes primero; a igualdad, el texto más corto (el más parecido a lo escrito)
+        matches.sort(key=lambda match: (-match[0], len(self.labels[match[1]]), self.labels[match[1]]))
+        return [(self.kinds[position], self.ids[position], self.labels[position]) for _, position in matches[:limit]]
+
+
+def author_label(last_name, first_name):
+    # mismo formato que Author.__str__
+    return f'{last_name} {first_name}'
+
+
+def build_index():
+    index = TrigramIndex()
+    for pk, title in Book.objects.order_by().values_list('pk', 'title').iterator(chunk_size=2000):
+        index.add(BOOK, pk, title)
+    for pk, first_name, last_name in Author.objects.order_by().values_list('pk', 'first_name', 'last_name').iterator(chunk_size=2000):
+        index.add(AUTHOR, pk, author_label(last_name, first_name))
+    return index
+
+
+_lock = threading.Lock()
+_index = None
+_index_version = None
+_checked_at = 0.0
+
+
+def get_index():
+    """
+    Índice de este proceso, construido la primera vez que se pide y reconstruido si otro proceso cambió el catálogo.
+    """
+    global _index, _index_version, _checked_at
+    now = time.monotonic()
+    if _index is not None and now - _checked_at < getattr(settings, 'CATALOG_AUTOCOMPLETE_REFRESH', 30):
+        return _index
+    with _lock:
+        version = get_version(VERSION_NAME)
+        if _index is None or version != _index_version:
+            _index = build_index()
+            _index_version = version
+        _checked_at = now
+        return _index
+
+
+def _apply(change):
+    """
+    Aplica un cambio al índice de este proceso (si ya existe) y avisa a los demás procesos subiendo la versión en la caché.
+    """
+    global _index, _index_version
+    with _lock:
+        if _index is not None:
+            change(_index)
+            if _index.needs_compaction():
+                _index = _index.compacted()
+        bump_version(VERSION_NAME)
+        if _index is not None and _index_version is not None:
+            # este proceso ya está al día; solo los otros tienen que reconstruir
+            _index_version = get_version(VERSION_NAME)
+
+
+def update_entry(kind, pk, label):
+    transaction.on_commit(lambda: _apply(lambda index: index.add(kind, pk, label)))
+
+
+def remove_entry(kind, pk):
+    transaction.on_commit(lambda: _apply(lambda index: index.remove(kind, pk)))
+
+
+def reset():
+    """
+    Descarta el índice de este proceso y avisa a los demás (p. ej. después de una carga masiva que no envía señales).
+    """
+    global _index
+    with _lock:
+        _index = None
+        bump_version(VERSION_NAME)
+
+
+def suggest(text, limit=10):
+    return [{'type': KINDS[kind], 'id': pk, 'label': label} for kind, pk, label in get_index().search(text, limit)]
@@ -0,0 +1,197 @@
+"""
+Benchmark de las páginas del catálogo (lo usa el comando "manage.py benchmark_catalog").
+
+Para cada tamaño de catálogo (número de libros) llenamos la base de datos con datos sintéticos (catalog/seeding.py) y pedimos cada URL de
+catalog/urls.py varias veces con el cliente de pruebas de Django, midiendo la latencia (p50, p95, p99) y el número de consultas SQL de cada petición.
+Los tamaños se recorren de menor a mayor y cada uno añade los libros que faltan, así que no hace falta vaciar la base de datos entre tamaños.
+
+El resultado es un diccionario que se guarda como JSON:
+
+    {"meta": {...}, "results": {"1000": {"books": {"url": "/catalog/books/", "p50_ms": 4.1, "p95_ms": 5.3, "p99_ms": 6.0, "queries": 3, ...}}}}
+
+compare_results() compara dos resultados y devuelve las regresiones (más latencia o más consultas), para detectarlas entre dos ejecuciones.
+
+Las peticiones pasan por el cliente de pruebas (sin servidor ni red), así que miden el tiempo de Django y de la base de datos.
+Para comparar servidores (gunicorn, uvicorn) está benchmarks/asgi_vs_wsgi.py.
+"""
+import datetime
+import platform
+import statistics
+import time
+
+import django
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse, URLPattern
+
+from .models import Book, Author, BookInstance
+from .seeding import seed_catalog
+from . import urls as catalog_urls
+
+# argumentos de las URL que los necesitan, a partir de un libro, un autor y una copia prestada de ejemplo
+URL_KWARGS = {
+    'book-detail': lambda sample: {'pk': sample['book']},
+    'book-update': lambda sample: {'pk': sample['book']},
+    'book-delete': lambda sample: {'pk': sample['book']},
+    'author-detail': lambda sample: {'pk': sample['author']},
+    'author-update': lambda sample: {'pk': sample['author']},
+    'author-delete': lambda sample: {'pk': sample['author']},
+    'renew-book-librarian': lambda sample: {'pk': sample['copy']},
+    'catalog-export': lambda sample: {'name': 'books'},
+}
+
+# parámetros GET de las URL que no muestran nada útil sin ellos
+URL_QUERY_STRINGS = {
+    'search': '?q=shadow',
+    'autocomplete': '?q=shad',
+}
+
+BENCHMARK_USERNAME = 'benchmark'
+
+
+def percentile(values, percent):
+    """
+    Percentil por el método del rango más cercano. values debe estar ordenada.
+    """
+    rank = max(1, -(-len(values) * percent // 100)) # techo de len * percent / 100
+    return values[int(rank) - 1]
+
+
+def sample_objects():
+    """
+    Un libro, un autor y una copia prestada de ejemplo (los del medio de cada tabla, para no medir siempre el primero).
+    """
+    def middle(queryset):
+        count = queryset.count()
+        return queryset.order_by('pk').values_list('pk', flat=True)[count // 2] if count else None
+
+    return {
+        'book': middle(Book.objects.all()),
+        'author': middle(Author.objects.all()),
+        'copy': middle(BookInstance.objects.filter(status='o')),
+    }
+
+
+def catalog_url_list(sample, names=None):
+    """
+    Devuelve [(nombre, url)] con las URL de catalog/urls.py, en orden. Se omiten las que necesitan argumentos que no sabemos rellenar
+    (o cuyo objeto de ejemplo no existe) y, si se indica names, las que no están en esa lista.
+    """
+    result = []
+    for pattern in catalog_urls.urlpatterns:
+        if not isinstance(pattern, URLPattern) or not pattern.name or (names and pattern.name not in names):
+            continue
+        if pattern.pattern.converters:
+            if pattern.name not in URL_KWARGS:
+                continue
+            kwargs = URL_KWARGS[pattern.name](sample)
+            if None in kwargs.values():
+                continue
+            url = reverse(pattern.name, kwargs=kwargs)
+        else:
+            url = reverse(pattern.name)
+        result.append((pattern.name, url + URL_QUERY_STRINGS.get(pattern.name, '')))
+    return result
+
+
+def measure(client, url, requests, warmup=3):
+    """
+    Pide url warmup veces sin medir (para llenar cachés) y luego requests veces midiendo la latencia y las consultas de cada petición.
+    """
+    for _ in range(warmup):
+        b''.join(client.get(url)) # join() consume también las respuestas en streaming
+
+    latencies, queries, statuses = [], [], set()
+    for _ in range(requests):
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            response = client.get(url)
+            b''.join(response)
+            latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(len(context.captured_queries))
+        statuses.add(response.status_code)
+
+    latencies.sort()
+    return {
+        'url': url,
+        'status': sorted(statuses),
+        'requests': requests,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'max_ms': round(latencies[-1], 3),
+        'queries': max(queries),
+    }
+
+
+def benchmark_client(anonymous=False):
+    """
+    Cliente de pruebas. Por defecto con la sesión de un superusuario, para poder medir también las páginas de los bibliotecarios;
+    con anonymous=True como visitante anónimo (que además pasa por la caché de páginas de catalog/caching.py).
+    """
+    client = Client()
+    if not anonymous:
+        user = User.objects.filter(username=BENCHMARK_USERNAME).first()
+        if user is None:
+            user = User.objects.create_superuser(BENCHMARK_USERNAME, 'benchmark@example.com', None)
+        client.force_login(user)
+    return client
+
+
+def run_benchmark(sizes, requests=50, warmup=3, copies_per_book=3, users_per_book=0.1, names=None, anonymous=False,
+                  seed=0, on_result=None):
+    """
+    Mide las URL del catálogo con cada tamaño de sizes (número de libros) y devuelve el resultado (ver el formato arriba).
+    on_result(tamaño, nombre, estadísticas) se llama después de medir cada URL, para informar del progreso.
+    """
+    results = {}
+    for size in sorted(set(sizes)):
+        missing = size - Book.objects.count()
+        if missing > 0:
+            seed_catalog(missing, copies_per_book, int(missing * users_per_book), seed=seed)
+
+        client = benchmark_client(anonymous)
+        results[str(size)] = {}
+        for name, url in catalog_url_list(sample_objects(), names):
+            stats = measure(client, url, requests, warmup)
+            results[str(size)][name] = stats
+            if on_result:
+                on_result(size, name, stats)
+
+    return {
+        'meta': {
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'requests': requests,
+            'warmup': warmup,
+            'copies_per_book': copies_per_book,
+            'anonymous': anonymous,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def compare_results(baseline, current, threshold=0.2, min_delta_ms=1.0):
+    """
+    Compara dos resultados de run_benchmark() y devuelve una lista de regresiones (textos). Es una regresión:
+    - que el p95 de una URL suba más de threshold (0.2 = 20%) y más de min_delta_ms (para ignorar el ruido en las páginas muy rápidas),
+    - que una URL haga más consultas que antes.
+    Solo se comparan los tamaños y URL que están en los dos resultados.
+    """
+    regressions = []
+    for size, pages in current['results'].items():
+        for name, stats in pages.items():
+            before = baseline['results'].get(size, {}).get(name)
+            if before is None:
+                continue
+            if stats['p95_ms'] > before['p95_ms'] * (1 + threshold) and stats['p95_ms'] - before['p95_ms'] > min_delta_ms:
+                regressions.append(f"{size} libros, {name}: p95 {before['p95_ms']} ms -> {stats['p95_ms']} ms")
+            if stats['queries'] > before['queries']:
+                regressions.append(f"{size} libros, {name}: {before['queries']} -> {stats['queries']} consultas")
+    return regressions
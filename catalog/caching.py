@@ -0,0 +1,202 @@
+"""
+Caché de datos del catálogo que se leen mucho y cambian poco.
+
+En vez de borrar cada entrada cuando algo cambia (no siempre sabemos qué claves existen, p. ej. una por página),
+usamos un número de versión guardado en la caché que forma parte de la clave. Al cambiar los datos subimos la versión
+y las entradas antiguas simplemente dejan de usarse hasta que expiran. Las señales de catalog/signals.py suben las versiones.
+
+También guardamos páginas completas para los visitantes anónimos (cache_anonymous_page) y fragmentos de plantilla para
+los usuarios con sesión iniciada (CatalogFragmentCacheMixin y la etiqueta {% cache %}), todos con la versión 'pages'.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator, PageNotAnInteger
+
+from .models import Book
+
+
+def get_version(name):
+    """
+    Versión actual de un grupo de entradas de la caché (empieza en 1).
+    """
+    return cache.get_or_set(f'catalog:version:{name}', 1, None)
+
+
+def bump_version(name):
+    """
+    Sube la versión de un grupo de entradas, invalidándolas todas de una vez.
+    """
+    key = f'catalog:version:{name}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        # la clave no existía (o expiró); cualquier valor nuevo sirve mientras sea distinto del anterior
+        cache.set(key, 2, None)
+
+
+def author_books_version_name(author_id):
+    return f'author:{author_id}:books'
+
+
+def author_books_page(author, page_number, per_page):
+    """
+    Devuelve la página page_number (un objeto Page de Django) de los libros del autor, cargando solo las columnas que muestra
+    la plantilla author_detail.html. El total de libros y los libros de la página se guardan en caché por autor;
+    la versión sube cuando se crea, edita o elimina un libro de ese autor (o cuando un libro cambia de autor).
+    Lanza InvalidPage si el número de página no es válido, igual que Paginator.page().
+    """
+    try:
+        page_number = int(page_number)
+    except (TypeError, ValueError):
+        raise PageNotAnInteger('El número de página no es un entero')
+
+    books = Book.objects.filter(author=author).only('title', 'summary', 'id')
+    version = get_version(author_books_version_name(author.pk))
+    key = f'catalog:author:{author.pk}:books:v{version}:{per_page}:{page_number}'
+
+    cached = cache.get(key)
+    if cached is not None:
+        count, object_list = cached
+        paginator = Paginator(books, per_page)
+        # el total ya lo conocemos: lo guardamos donde cached_property guarda Paginator.count para que no se vuelva a contar
+        paginator.__dict__['count'] = count
+        page = paginator.page(page_number)
+        page.object_list = object_list
+        return page
+
+    paginator = Paginator(books, per_page)
+    page = paginator.page(page_number)
+    page.object_list = list(page.object_list)
+    cache.set(key, (paginator.count, page.object_list), getattr(settings, 'CATALOG_CACHE_TIMEOUT', 600))
+    return page
+
+
+# Páginas del catálogo (listas y detalles de libros y autores). Cualquier cambio en Book, Author, BookInstance o Genre sube esta versión
+# (ver catalog_pages_changed en catalog/signals.py), así que no hace falta saber qué páginas muestran lo que cambió.
+PAGES_VERSION_NAME = 'pages'
+
+# nombres de las páginas que usan cache_anonymous_page, para page_cache_stats()
+CACHED_PAGES = []
+
+
+def invalidate_catalog_pages():
+    bump_version(PAGES_VERSION_NAME)
+
+
+def page_cache_timeout():
+    return getattr(settings, 'CATALOG_PAGE_CACHE_TIMEOUT', 300)
+
+
+def record_page_cache(name, outcome):
+    """
+    Suma uno al contador de aciertos ('hit') o fallos ('miss') de la caché de la página name.
+    """
+    key = f'catalog:pagecache:{outcome}:{name}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        # add() no sobrescribe si otro proceso la creó justo antes; en ese caso volvemos a intentar incr()
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def page_cache_stats():
+    """
+    Aciertos y fallos de la caché de páginas desde que se vació la caché: {nombre: {'hit': n, 'miss': n}}.
+    """
+    keys = {f'catalog:pagecache:{outcome}:{name}': (name, outcome) for name in CACHED_PAGES for outcome in ('hit', 'miss')}
+    values = cache.get_many(keys.keys())
+    stats = {name: {'hit': 0, 'miss': 0} for name in CACHED_PAGES}
+    for key, value in values.items():
+        name, outcome = keys[key]
+        stats[name][outcome] = value
+    return stats
+
+
+def page_cache_key(request):
+    # la ruta completa incluye ?page=N o ?cursor=..., así cada página de una lista tiene su propia entrada
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'catalog:page:v{get_version(PAGES_VERSION_NAME)}:{path}'
+
+
+def cache_anonymous_page(name):
+    """
+    Decorador para vistas del catálogo: guarda en caché la respuesta completa para los visitantes anónimos.
+
+    Solo se usa con usuarios anónimos porque la barra lateral de base_generic.html cambia con el usuario (su nombre, el formulario
+    de cerrar sesión con su token CSRF y los enlaces del personal); los usuarios con sesión siempre reciben la página generada para ellos.
+    La cabecera X-Catalog-Cache indica si la respuesta salió de la caché (HIT), se generó y guardó (MISS) o no se usa la caché (BYPASS).
+    """
+    if name not in CACHED_PAGES:
+        CACHED_PAGES.append(name)
+
+    def lookup(request):
+        """
+        Devuelve (clave, respuesta guardada o None). La clave es None si esta petición no usa la caché.
+        """
+        if request.method != 'GET' or request.user.is_authenticated:
+            return None, None
+        key = page_cache_key(request)
+        response = cache.get(key)
+        if response is not None:
+            record_page_cache(name, 'hit')
+            response['X-Catalog-Cache'] = 'HIT'
+        else:
+            record_page_cache(name, 'miss')
+        return key, response
+
+    def finish(key, response):
+        if key is None:
+            response['X-Catalog-Cache'] = 'BYPASS'
+            return response
+        response['X-Catalog-Cache'] = 'MISS'
+
+        def store(response):
+            # solo las respuestas correctas y sin cookies propias (p. ej. de sesión), que podrían ser de este visitante
+            if response.status_code == 200 and not response.cookies:
+                cache.set(key, response, page_cache_timeout())
+
+        if hasattr(response, 'render') and callable(response.render):
+            # TemplateResponse se genera después de salir de la vista; la guardamos cuando ya tiene el HTML
+            response.add_post_render_callback(store)
+        else:
+            store(response)
+        return response
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            # vistas async def (catalog/async_views.py): la sesión y la caché son síncronas, así que las consultamos con sync_to_async
+            @wraps(view)
+            async def async_wrapped(request, *args, **kwargs):
+                key, response = await sync_to_async(lookup)(request)
+                if response is not None:
+                    return response
+                response = await view(request, *args, **kwargs)
+                return await sync_to_async(finish)(key, response)
+            return async_wrapped
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            key, response = lookup(request)
+            if response is not None:
+                return response
+            return finish(key, view(request, *args, **kwargs))
+        return wrapped
+    return decorator
+
+
+class CatalogFragmentCacheMixin:
+    """
+    Mixin para vistas que añade al contexto la versión y el tiempo de la caché de páginas, para usarlos con la etiqueta {% cache %}:
+    {% cache catalog_cache_timeout nombre catalog_cache_version request.get_full_path %}. Así los fragmentos que no dependen
+    del usuario se guardan en caché también para los usuarios con sesión iniciada, y se invalidan junto con las páginas completas.
+    """
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['catalog_cache_version'] = get_version(PAGES_VERSION_NAME)
+        context['catalog_cache_timeout'] = page_cache_timeout()
+        return context
@@ -0,0 +1,116 @@
+"""
+Peticiones condicionales (ETag / Last-Modified) para las páginas del catálogo.
+
+Cuando una respuesta lleva las cabeceras ETag y Last-Modified, el navegador (o la CDN) guarda la página y en la siguiente visita pregunta
+"¿cambió desde entonces?" con If-None-Match / If-Modified-Since. Si no cambió, respondemos 304 Not Modified sin cuerpo:
+no se ejecuta la vista, no se consulta nada más y no se genera la plantilla.
+
+Para saber si algo cambió basta una consulta: la fecha de la última modificación (updated_at) de lo que muestra la página,
+más el número de filas cuando una eliminación podría no cambiar el MAX(). El decorador condition() de Django pide por separado
+el ETag y el Last-Modified; calculamos los dos de la misma consulta y la guardamos en la petición para no repetirla.
+
+Solo los visitantes anónimos reciben ETag / Last-Modified. Las páginas de un usuario con sesión llevan formularios con el token CSRF
+(cerrar sesión en base_generic.html, reservar en book_detail.html), que Django cambia en cada inicio de sesión, y enlaces que dependen
+de sus permisos: un 304 haría que el navegador mostrara la copia guardada con un token viejo (y el siguiente POST fallaría con 403)
+o con los enlaces de antes de cambiar sus permisos. Así, además, un usuario que inicia sesión nunca recibe un 304 para la página
+que tenía guardada como anónimo.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.db.models import Count, Max, Subquery
+from django.views.decorators.http import condition
+
+from .models import Book, Author, CatalogCounter
+
+
+def conditional_page(validators):
+    """
+    Decorador para vistas: validators(request, *args, **kwargs) devuelve (last_modified, partes_del_etag)
+    o None si el objeto no existe (en ese caso la vista se ejecuta normalmente y responde 404).
+    """
+    def get_validators(request, *args, **kwargs):
+        if not hasattr(request, '_catalog_validators'):
+            request._catalog_validators = validators(request, *args, **kwargs)
+        return request._catalog_validators
+
+    def etag(request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return None
+        result = get_validators(request, *args, **kwargs)
+        if result is None:
+            return None
+        last_modified, parts = result
+        return hashlib.md5(repr((request.path, last_modified, parts)).encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return None
+        result = get_validators(request, *args, **kwargs)
+        return result[0] if result else None
+
+    def prepare(request, *args, **kwargs):
+        # carga el usuario (la sesión) y, para los anónimos, los validadores; después etag() y last_modified() no consultan nada
+        if not request.user.is_authenticated:
+            get_validators(request, *args, **kwargs)
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag, last_modified_func=last_modified)(view)
+        if not iscoroutinefunction(view):
+            return conditional_view
+
+        # condition() llama a etag() y last_modified() directamente desde el bucle de eventos con las vistas async def
+        # (catalog/async_views.py), donde el ORM no se puede usar; hacemos antes esas consultas con sync_to_async
+        @wraps(view)
+        async def async_wrapped(request, *args, **kwargs):
+            await sync_to_async(prepare)(request, *args, **kwargs)
+            return await conditional_view(request, *args, **kwargs)
+        return async_wrapped
+
+    return decorator
+
+
+def newest(*dates):
+    dates = [date for date in dates if date is not None]
+    return max(dates) if dates else None
+
+
+def latest_update(model):
+    # ORDER BY updated_at DESC LIMIT 1 lee solo el final del índice de updated_at
+    return Subquery(model.objects.order_by('-updated_at').values('updated_at')[:1])
+
+
+# Cada función hace una sola consulta. Las modificaciones de las copias y de los géneros actualizan Book.updated_at (ver catalog/signals.py),
+# así que el detalle de un libro solo depende del libro y de su autor.
+
+def book_detail_validators(request, pk):
+    row = Book.objects.filter(pk=pk).values_list('updated_at', 'author__updated_at').first()
+    return None if row is None else (newest(*row), ())
+
+
+def author_detail_validators(request, pk):
+    # el número de libros cambia si se elimina uno de sus libros, aunque la fecha más reciente siga siendo la misma
+    row = Author.objects.filter(pk=pk).annotate(
+        books_updated_at=Max('book__updated_at'), num_books=Count('book'),
+    ).values_list('updated_at', 'books_updated_at', 'num_books').order_by('pk').first()
+    return None if row is None else (newest(row[0], row[1]), (row[2],))
+
+
+def list_validators(counter_name, *models):
+    """
+    Validadores de una lista completa: la modificación más reciente de los modelos que muestra y el contador de filas
+    (catalog/counters.py), que cambia cuando se elimina alguna. Todo sale de la fila del contador en una sola consulta.
+    """
+    annotations = {f'updated_{number}': latest_update(model) for number, model in enumerate(models)}
+    row = CatalogCounter.objects.filter(name=counter_name).annotate(**annotations).values_list('value', *annotations).first()
+    return None if row is None else (newest(*row[1:]), (row[0],))
+
+
+def book_list_validators(request):
+    # la lista muestra el título y el autor de cada libro
+    return list_validators('books', Book, Author)
+
+
+def author_list_validators(request):
+    return list_validators('authors', Author)
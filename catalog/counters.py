@@ -0,0 +1,153 @@
+"""
+Contadores desnormalizados del catálogo (modelo CatalogCounter).
+
+Contar las copias por estado con COUNT(*) recorre toda la tabla de BookInstance, lo cual es lento cuando hay millones de copias.
+En su lugar guardamos cada total en una fila de CatalogCounter y la actualizamos con UPDATE ... SET value = value + delta
+cada vez que se crea, elimina o cambia de estado una copia (y cuando se crea o elimina un libro, autor o género).
+Las señales de catalog/signals.py llaman a las funciones de este módulo dentro de la misma transacción que el cambio.
+
+OJO: QuerySet.update(), bulk_create() y las consultas SQL directas no envían señales, así que el código que las use
+debe llamar a bump_counters() por su cuenta. El comando "manage.py rebuild_catalog_counters" recalcula todo desde cero y muestra la diferencia.
+"""
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils.functional import cached_property
+
+from .models import Book, Author, BookInstance, Genre, CatalogCounter
+
+
+def copies_counter(status):
+    """
+    Nombre del contador de copias con un estado dado (p. ej. 'copies_a' para las disponibles).
+    """
+    return f'copies_{status}'
+
+
+def has_the(title):
+    """
+    Reproduce en Python el filtro title__icontains='the' que usa la página de inicio.
+    """
+    return 'the' in (title or '').lower()
+
+
+def counter_querysets():
+    """
+    Devuelve un diccionario con el nombre de cada contador y el queryset cuyo count() es su valor exacto.
+    """
+    querysets = {
+        'books': Book.objects.all(),
+        'books_with_the': Book.objects.filter(title__icontains='the'),
+        'copies': BookInstance.objects.all(),
+        'authors': Author.objects.all(),
+        'genres': Genre.objects.all(),
+    }
+    for status, _ in BookInstance.LOAN_STATUS:
+        querysets[copies_counter(status)] = BookInstance.objects.filter(status__exact=status)
+    return querysets
+
+
+def count_from_scratch():
+    """
+    Calcula el valor exacto de todos los contadores en un único viaje a la base de datos.
+    Compilamos cada queryset con el ORM (así los filtros como icontains se traducen bien para cada motor)
+    y los envolvemos en SELECT (SELECT COUNT(*) FROM (...)), (SELECT COUNT(*) FROM (...)), ...
+    """
+    querysets = counter_querysets()
+    alias = Book.objects.db
+    selects = []
+    params = []
+    for name, queryset in querysets.items():
+        sql, query_params = queryset.order_by().values('pk').query.get_compiler(using=alias).as_sql()
+        selects.append('(SELECT COUNT(*) FROM (%s) %s_q) AS %s' % (sql, name, name))
+        params.extend(query_params)
+
+    with connections[alias].cursor() as cursor:
+        cursor.execute('SELECT ' + ', '.join(selects), params)
+        row = cursor.fetchone()
+
+    return dict(zip(querysets.keys(), row))
+
+
+def read_counters():
+    """
+    Lee todos los contadores con una sola consulta. Los que aún no tienen fila valen 0.
+    """
+    values = dict.fromkeys(counter_querysets(), 0)
+    values.update(CatalogCounter.objects.values_list('name', 'value'))
+    return values
+
+
+def read_counter(name):
+    """
+    Lee un solo contador (0 si no existe).
+    """
+    return CatalogCounter.objects.filter(name=name).values_list('value', flat=True).first() or 0
+
+
+def bump_counters(deltas):
+    """
+    Suma cada delta a su contador. deltas es un diccionario {nombre: cantidad}, las cantidades pueden ser negativas.
+    Usamos F('value') + delta para que la suma la haga la base de datos y no se pierdan actualizaciones concurrentes.
+    """
+    with transaction.atomic():
+        for name, delta in deltas.items():
+            if not delta:
+                continue
+            if not CatalogCounter.objects.filter(name=name).update(value=F('value') + delta):
+                CatalogCounter.objects.get_or_create(name=name)
+                CatalogCounter.objects.filter(name=name).update(value=F('value') + delta)
+
+
+def status_change_deltas(old_status, new_status, count=1):
+    """
+    Deltas para 'count' copias que pasan de old_status a new_status (None significa que la copia no existía / ya no existe).
+    Los estados que no están en LOAN_STATUS (p. ej. el valor vacío que permite blank=True) solo cuentan en el total de copias.
+    """
+    statuses = dict(BookInstance.LOAN_STATUS)
+    deltas = {}
+    if old_status is None:
+        deltas['copies'] = count
+    elif old_status in statuses:
+        deltas[copies_counter(old_status)] = -count
+    if new_status is None:
+        deltas['copies'] = deltas.get('copies', 0) - count
+    elif new_status in statuses:
+        deltas[copies_counter(new_status)] = deltas.get(copies_counter(new_status), 0) + count
+    return deltas
+
+
+def rebuild_counters():
+    """
+    Recalcula todos los contadores desde cero y los guarda.
+    Devuelve un diccionario {nombre: (valor_guardado, valor_real)} solo con los contadores que tenían diferencias (drift).
+    """
+    with transaction.atomic():
+        # bloqueamos las filas existentes para que ningún cambio concurrente se cuele entre el conteo y la escritura
+        stored = dict(CatalogCounter.objects.select_for_update().values_list('name', 'value'))
+        actual = count_from_scratch()
+        drift = {}
+        for name, value in actual.items():
+            if stored.get(name) != value:
+                CatalogCounter.objects.update_or_create(name=name, defaults={'value': value})
+            if stored.get(name, 0) != value:
+                drift[name] = (stored.get(name, 0), value)
+    return drift
+
+
+class CounterPaginator(Paginator):
+    """
+    Paginator que toma el total de un contador en vez de hacer COUNT(*) cuando el queryset no tiene filtros.
+    Lo usan las listas del sitio de administración (ver CounterPaginationMixin en catalog/admin.py);
+    si se aplica una búsqueda o un filtro el total depende del filtro y se cuenta de forma normal.
+    """
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True, counter_name=None):
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page)
+        self.counter_name = counter_name
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if self.counter_name and query is not None and not query.has_filters():
+            return read_counter(self.counter_name)
+        return super().count
@@ -0,0 +1,151 @@
+"""
+Exportación del catálogo en CSV o JSONL sin cargar las tablas en memoria (la usan el comando "manage.py export_catalog"
+y la vista export_view, solo para el personal).
+
+dumpdata (y cualquier list(queryset)) crea un objeto por fila antes de escribir nada, así que la memoria crece con el tamaño de la tabla.
+Aquí recorremos cada tabla con values_list(...).iterator(chunk_size): la base de datos entrega las filas por bloques
+(en PostgreSQL con un cursor del lado del servidor) como tuplas, y cada fila se convierte en una línea y se entrega en cuanto está lista.
+
+Los géneros de los libros son una relación muchos a muchos: en vez de una consulta por libro hacemos una sola consulta por bloque
+con los géneros de todos los libros del bloque. La exportación de libros usa las mismas columnas que catalog/importer.py,
+así que su salida se puede volver a importar con "manage.py import_catalog".
+
+Con compress=True la salida se comprime con gzip a medida que se genera (zlib.compressobj), sin escribir primero el archivo entero.
+"""
+import csv
+import json
+import zlib
+from itertools import islice
+
+from .models import Book, Author, BookInstance
+
+EXPORT_CHUNK_SIZE = 2000
+
+# nombre de la exportación -> (modelo, [(columna de salida, campo para values_list)])
+EXPORTS = {
+    'books': (Book, [
+        ('id', 'id'),
+        ('isbn', 'isbn'),
+        ('title', 'title'),
+        ('summary', 'summary'),
+        ('language', 'language'),
+        ('author_id', 'author_id'),
+        ('author_first_name', 'author__first_name'),
+        ('author_last_name', 'author__last_name'),
+    ]),
+    'authors': (Author, [
+        ('id', 'id'),
+        ('first_name', 'first_name'),
+        ('last_name', 'last_name'),
+        ('language', 'language'),
+        ('date_of_birth', 'date_of_birth'),
+        ('date_of_death', 'date_of_death'),
+    ]),
+    'copies': (BookInstance, [
+        ('id', 'id'),
+        ('book_id', 'book_id'),
+        ('imprint', 'imprint'),
+        ('status', 'status'),
+        ('due_back', 'due_back'),
+        ('borrower_id', 'borrower_id'),
+    ]),
+}
+
+FORMATS = ('csv', 'jsonl')
+
+
+def book_genres(book_ids):
+    """
+    Nombres de los géneros de cada libro ({book_id: [nombres]}) con una sola consulta a la tabla intermedia.
+    """
+    genres = {}
+    through = Book.genre.through.objects.filter(book_id__in=book_ids).order_by('book_id', 'genre__name')
+    for book_id, name in through.values_list('book_id', 'genre__name'):
+        genres.setdefault(book_id, []).append(name)
+    return genres
+
+
+def export_columns(name):
+    model, fields = EXPORTS[name]
+    columns = [column for column, _ in fields]
+    if model is Book:
+        columns.append('genres')
+    return columns
+
+
+def export_rows(name, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Genera las filas (tuplas en el orden de export_columns()) de la exportación indicada, ordenadas por id.
+    """
+    model, fields = EXPORTS[name]
+    rows = model.objects.order_by('pk').values_list(*[field for _, field in fields]).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        if model is Book:
+            genres = book_genres([row[0] for row in chunk])
+            for row in chunk:
+                yield row + (genres.get(row[0], []),)
+        else:
+            yield from chunk
+
+
+class Echo:
+    """
+    Objeto con un método write() que devuelve lo que recibe en vez de guardarlo: así csv.writer nos da cada línea como texto
+    (es el ejemplo de la documentación de Django para CSV grandes con StreamingHttpResponse).
+    """
+    def write(self, value):
+        return value
+
+
+def plain(value):
+    # fechas y UUID como texto; None como cadena vacía en CSV
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def export_lines(name, format='csv', chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Genera las líneas de texto de la exportación, empezando por la cabecera en CSV.
+    En CSV los géneros van separados por ';'; en JSONL cada línea es un objeto y los géneros una lista.
+    """
+    if format not in FORMATS:
+        raise ValueError(f'Formato desconocido: {format}')
+    columns = export_columns(name)
+    if format == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(columns)
+        for row in export_rows(name, chunk_size):
+            yield writer.writerow([';'.join(value) if isinstance(value, list) else plain(value) for value in row])
+    else:
+        for row in export_rows(name, chunk_size):
+            yield json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=plain) + '\n'
+
+
+def encode(lines, compress=False):
+    """
+    Convierte las líneas en bytes UTF-8 y, si compress es True, las comprime en formato gzip sobre la marcha.
+    Para no entregar trozos diminutos juntamos el texto hasta tener unos 64 KB.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None # wbits=31: cabecera y cola de gzip
+    buffer, size = [], 0
+    for line in lines:
+        data = line.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= 65536:
+            data, buffer, size = b''.join(buffer), [], 0
+            if compressor:
+                data = compressor.compress(data)
+            if data:
+                yield data
+    data = b''.join(buffer)
+    if compressor:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
@@ -3,6 +3,8 @@ from django import forms
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 import datetime #for checking renewal date range.
+import uuid
+from django.contrib.auth.models import User
 
 # Para la página que permita a los bibilotecarios renovar los libros prestados introduciendo una fecha de renovación (renewal_date) usaremos un formulario
 # crearemos un formulario con la clase Form que permita a los usuarios introducir una fecha. Rellenaremos el campo con un valor inicial de 3 semanas desde la fecha actual 
@@ -32,6 +34,49 @@ class RenewBookForm(forms.Form):
         # y convertirlos al tipo estándar correcto para los datos (en este caso, un objeto Python datetime.datetime).
     
 
+
+class MultipleUUIDField(forms.Field):
+    """
+    Lista de ids (UUID) de copias, p. ej. las casillas marcadas en la lista de libros prestados (varios valores con el mismo nombre).
+    """
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        try:
+            return [uuid.UUID(str(item)) for item in value or []]
+        except ValueError:
+            raise ValidationError(_('Invalid copy id'))
+
+
+# Formulario para renovar, devolver o prestar muchas copias a la vez (ver catalog/loans.py). Hereda de RenewBookForm
+# para validar la fecha con las mismas reglas (no en el pasado, como mucho 4 semanas), aunque aquí la fecha solo es obligatoria al renovar o prestar.
+class BulkLoanForm(RenewBookForm):
+    ACTIONS = (
+        ('renew', 'Renew'),
+        ('return', 'Return'),
+        ('checkout', 'Check out'),
+    )
+
+    action = forms.ChoiceField(choices=ACTIONS)
+    copies = MultipleUUIDField()
+    renewal_date = forms.DateField(required=False, help_text="Enter a date between now and 4 weeks (default 3).")
+    borrower = forms.ModelChoiceField(queryset=User.objects.all(), required=False)
+
+    def clean_renewal_date(self):
+        if self.cleaned_data['renewal_date'] is None:
+            return None
+        return super().clean_renewal_date()
+
+    def clean(self):
+        cleaned_data = super().clean()
+        action = cleaned_data.get('action')
+        if action in ('renew', 'checkout') and not cleaned_data.get('renewal_date') and 'renewal_date' not in self.errors:
+            self.add_error('renewal_date', _('This field is required.'))
+        if action == 'checkout' and not cleaned_data.get('borrower'):
+            self.add_error('borrower', _('This field is required.'))
+        return cleaned_data
+
+
 # el código anterior sirve para validar una solicitud de formulario para renovar un bookinstance, pero no estamos relacionandolo directamente con el módelo
 # lo que hacemos es si se valida la fecha de renovación al ser envíada esta se guarda en la información del módelo en la vista. Claro que esto no es un problema porque es solo un campo, pero pueden ser varias líneas de código de ser más campos
 # si solo necesita un formulario para asignar los campos de un solo modelo, entonces su modelo ya definirá la mayor parte de la información que necesita en su formulario: campos, etiquetas, texto de ayuda, etc.
@@ -0,0 +1,224 @@
+"""
+Reservas (modelo Hold): una cola por libro, atendida por orden de llegada.
+
+Cuando una copia queda disponible (se devuelve, se cancela la reserva que la tenía apartada, o se añade una copia nueva) allocate_copies()
+la asigna a la primera reserva en espera del libro. Varios bibliotecarios (o varios workers) pueden estar devolviendo copias del mismo libro
+a la vez; para que dos procesos no aparten la misma copia ni atiendan la misma reserva:
+
+- En PostgreSQL, MySQL y Oracle bloqueamos la copia y la reserva con SELECT ... FOR UPDATE SKIP LOCKED: si otro proceso ya tiene bloqueada
+  la primera copia (o la primera reserva) tomamos la siguiente en lugar de esperarlo, así las asignaciones concurrentes avanzan en paralelo.
+- SQLite no tiene bloqueos por fila (select_for_update() no hace nada). Ahí, y como segunda barrera en todos los motores, cada cambio es un
+  UPDATE condicional (WHERE status = 'a' / WHERE status = 'w'): si otro proceso se adelantó no cambia ninguna fila, deshacemos el intento
+  y volvemos a empezar. Si SQLite responde "database is locked" (otro proceso está escribiendo) también reintentamos tras una pausa.
+- Además, la restricción única hold_one_ready_per_copy impide en la base de datos que una copia quede apartada para dos reservas.
+
+Una copia apartada se guarda hasta su fecha due_back (CATALOG_HOLD_PICKUP_DAYS días). expire_holds(), que ejecuta a diario el comando
+"manage.py expire_holds", cancela las reservas que no se recogieron a tiempo; la copia pasa a la siguiente reserva de la cola.
+
+Los cambios de estado de las copias se hacen con update(), que no envía señales, así que actualizamos a mano los contadores,
+la fecha de modificación del libro y las cachés, como en catalog/loans.py.
+"""
+import datetime
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, connections, transaction
+from django.utils import timezone
+
+from .models import Book, BookInstance, Hold
+from .counters import bump_counters, status_change_deltas
+from .stats import invalidate_catalog_stats
+from .caching import invalidate_catalog_pages
+
+# reintentos cuando SQLite está bloqueado por otro proceso que escribe
+LOCKED_RETRIES = 20
+LOCKED_PAUSE = 0.05
+
+
+class HoldConflict(Exception):
+    """
+    Otro proceso cambió la copia o la reserva entre que la leímos y la actualizamos.
+    """
+
+
+def pickup_deadline():
+    """
+    Fecha hasta la que se guarda una copia apartada (se guarda en due_back de la copia reservada).
+    """
+    return datetime.date.today() + datetime.timedelta(days=getattr(settings, 'CATALOG_HOLD_PICKUP_DAYS', 3))
+
+
+def lock_first(queryset):
+    """
+    Primera fila del queryset, bloqueada con FOR UPDATE SKIP LOCKED si el motor lo admite. Hay que llamarla dentro de una transacción.
+    """
+    if connections[queryset.db].features.has_select_for_update_skip_locked:
+        queryset = queryset.select_for_update(skip_locked=True)
+    return queryset.first()
+
+
+def copy_status_changed(book_id, old_status, new_status, count=1):
+    """
+    Lo que haría la señal post_save de BookInstance para count copias de book_id que cambiaron de estado con update().
+    """
+    bump_counters(status_change_deltas(old_status, new_status, count))
+    Book.objects.filter(pk=book_id).update(updated_at=timezone.now())
+    transaction.on_commit(invalidate_catalog_stats)
+    transaction.on_commit(invalidate_catalog_pages)
+
+
+def retry_when_locked(operation):
+    """
+    Ejecuta operation() y la repite si otro proceso se adelantó (HoldConflict) o si SQLite está bloqueado.
+    """
+    attempts = 0
+    while True:
+        try:
+            return operation()
+        except HoldConflict:
+            continue # el otro proceso avanzó, así que esto termina
+        except OperationalError as error:
+            attempts += 1
+            if connections[Hold.objects.db].vendor != 'sqlite' or 'locked' not in str(error) or attempts > LOCKED_RETRIES:
+                raise
+            time.sleep(LOCKED_PAUSE * attempts)
+
+
+def allocate_next(book_id):
+    """
+    Aparta una copia disponible de book_id para la primera reserva en espera, en una transacción.
+    Devuelve la reserva atendida, o None si no hay copias disponibles o no hay nadie esperando.
+    """
+    with transaction.atomic():
+        copy = lock_first(BookInstance.objects.filter(book_id=book_id, status__exact='a').order_by('pk'))
+        if copy is None:
+            return None
+        hold = lock_first(Hold.objects.filter(book_id=book_id, status='w').order_by('pk'))
+        if hold is None:
+            return None
+
+        now = timezone.now()
+        taken = BookInstance.objects.filter(pk=copy.pk, status__exact='a').update(
+            status='r', borrower=hold.user_id, due_back=pickup_deadline(), updated_at=now)
+        if not taken:
+            raise HoldConflict # la excepción deshace la transacción
+        served = Hold.objects.filter(pk=hold.pk, status='w').update(status='r', copy=copy.pk, ready_at=now)
+        if not served:
+            raise HoldConflict # deshace también el cambio de la copia
+        copy_status_changed(book_id, 'a', 'r')
+
+    hold.status, hold.copy_id, hold.ready_at = 'r', copy.pk, now
+    return hold
+
+
+def allocate_copies(book_id):
+    """
+    Asigna todas las copias disponibles de book_id que pueda a las reservas en espera, por orden de llegada.
+    Cada asignación es su propia transacción corta. Devuelve la lista de reservas atendidas.
+    """
+    allocated = []
+    while True:
+        hold = retry_when_locked(lambda: allocate_next(book_id))
+        if hold is None:
+            return allocated
+        allocated.append(hold)
+
+
+def allocate_copies_on_commit(book_ids):
+    """
+    Asigna las copias de los libros cuando se confirme la transacción en curso (o ahora mismo si no hay ninguna).
+    """
+    for book_id in set(book_ids) - {None}:
+        transaction.on_commit(lambda book_id=book_id: allocate_copies(book_id))
+
+
+def place_hold(book, user):
+    """
+    Pone al lector en la cola del libro (si no estaba ya) e intenta atenderla enseguida si hay una copia disponible.
+    Devuelve (reserva, creada).
+    """
+    hold = Hold.objects.filter(book=book, user=user, status__in=Hold.ACTIVE_STATUSES).first()
+    if hold is not None:
+        return hold, False
+    try:
+        with transaction.atomic():
+            hold = Hold.objects.create(book=book, user=user)
+    except IntegrityError:
+        # la misma reserva se creó al mismo tiempo (p. ej. un doble clic); la restricción hold_one_active_per_user la rechazó
+        return Hold.objects.get(book=book, user=user, status__in=Hold.ACTIVE_STATUSES), False
+
+    allocate_copies(book.pk)
+    hold.refresh_from_db()
+    return hold, True
+
+
+def cancel_hold(hold):
+    """
+    Cancela una reserva en espera o lista. Si tenía una copia apartada, la copia vuelve a estar disponible y pasa a la siguiente reserva.
+    Devuelve False si la reserva ya no estaba activa.
+    """
+    def cancel():
+        with transaction.atomic():
+            current = Hold.objects.filter(pk=hold.pk, status__in=Hold.ACTIVE_STATUSES).values('status', 'copy').first()
+            if current is None:
+                return False
+            if not Hold.objects.filter(pk=hold.pk, status=current['status']).update(status='c'):
+                raise HoldConflict
+            if current['status'] == 'r' and current['copy'] is not None:
+                released = BookInstance.objects.filter(pk=current['copy'], status__exact='r').update(
+                    status='a', borrower=None, due_back=None, updated_at=timezone.now())
+                if released:
+                    copy_status_changed(hold.book_id, 'r', 'a')
+            return True
+
+    cancelled = retry_when_locked(cancel)
+    if cancelled:
+        hold.status = 'c'
+        allocate_copies(hold.book_id)
+    return cancelled
+
+
+def expire_holds(today=None):
+    """
+    Cancela las reservas listas cuya copia apartada no se recogió antes de su fecha límite (due_back de la copia, ya pasada el día today).
+    Cada copia liberada se asigna a la siguiente reserva en espera, como al cancelar a mano. Devuelve las reservas canceladas.
+    """
+    today = today or datetime.date.today()
+    expired = []
+    for hold in Hold.objects.filter(status='r', copy__status__exact='r', copy__due_back__lt=today).order_by('pk'):
+        if cancel_hold(hold): # otro proceso pudo recogerla o cancelarla mientras tanto
+            expired.append(hold)
+    return expired
+
+
+def checkout_hold(hold, due_back):
+    """
+    El lector recoge la copia apartada: la copia pasa a 'On loan' hasta due_back y la reserva se da por cumplida.
+    Devuelve False si la reserva no estaba lista.
+    """
+    def checkout():
+        with transaction.atomic():
+            if not Hold.objects.filter(pk=hold.pk, status='r', copy__isnull=False).update(status='f'):
+                return False
+            copy_id = Hold.objects.filter(pk=hold.pk).values_list('copy', flat=True).get()
+            if not BookInstance.objects.filter(pk=copy_id, status__exact='r').update(
+                    status='o', borrower=hold.user_id, due_back=due_back, updated_at=timezone.now()):
+                # alguien cambió a mano el estado de la copia apartada; no la prestamos y dejamos la reserva como estaba
+                transaction.set_rollback(True)
+                return False
+            copy_status_changed(hold.book_id, 'r', 'o')
+            return True
+
+    done = retry_when_locked(checkout)
+    if done:
+        hold.status = 'f'
+    return done
+
+
+def queue_position(hold):
+    """
+    Posición de la reserva en la cola de su libro (1 es la siguiente en ser atendida), o None si no está esperando.
+    """
+    if hold.status != 'w':
+        return None
+    return Hold.objects.filter(book_id=hold.book_id, status='w', pk__lte=hold.pk).count()
@@ -0,0 +1,245 @@
+"""
+Importación masiva del catálogo desde archivos CSV o JSONL (la usa el comando "manage.py import_catalog").
+
+Cada fila describe un libro y, opcionalmente, una copia de ese libro:
+
+    isbn, title, summary, language, author_first_name, author_last_name, genres, imprint, status, due_back
+
+- genres: nombres separados por ';' en CSV, o una lista en JSONL.
+- Si la fila trae imprint se crea una copia (BookInstance) con ese imprint, status (por defecto 'm', uno de los códigos de
+  BookInstance.LOAN_STATUS) y due_back (AAAA-MM-DD).
+  Para varias copias del mismo libro basta repetir la fila con el mismo ISBN; en JSONL también se puede dar una lista "copies"
+  de objetos {imprint, status, due_back}.
+
+Las filas se leen de una en una (sin cargar el archivo en memoria) y se comprueban al leerlas: un estado o una fecha no válidos
+detienen la importación con el número de línea, antes de llegar a la base de datos. Después se procesan por lotes de batch_size filas. Cada lote es una transacción:
+se resuelven los autores y géneros (con un diccionario en memoria para no repetir consultas), los ISBN ya existentes se actualizan con
+bulk_update() y los nuevos se crean con bulk_create(), igual que las filas de la tabla intermedia Book.genre y las copias.
+
+bulk_create() y bulk_update() no envían señales, así que al final de cada lote actualizamos a mano lo que mantienen las señales:
+los contadores, el índice de búsqueda, y las cachés de estadísticas, de autores, de páginas y de autocompletado.
+"""
+import csv
+import datetime
+import json
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Book, Author, BookInstance, Genre
+from .counters import bump_counters, status_change_deltas, has_the
+from .caching import bump_version, author_books_version_name, invalidate_catalog_pages
+from .stats import invalidate_catalog_stats
+from . import search, autocomplete
+
+BOOK_FIELDS = ('title', 'summary', 'language')
+STATUS_CODES = [code for code, label in BookInstance.LOAN_STATUS]
+
+
+class CatalogImportError(Exception):
+    pass
+
+
+def read_rows(path):
+    """
+    Genera las filas del archivo como diccionarios. El formato se deduce de la extensión (.jsonl/.ndjson o .csv).
+    """
+    if path.endswith(('.jsonl', '.ndjson')):
+        with open(path, encoding='utf-8') as source:
+            for line_number, line in enumerate(source, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as error:
+                    raise CatalogImportError(f'línea {line_number}: JSON no válido ({error})')
+                yield checked_row(row, line_number)
+    else:
+        with open(path, encoding='utf-8', newline='') as source:
+            reader = csv.DictReader(source)
+            for row in reader:
+                yield checked_row(row, reader.line_num)
+
+
+def checked_row(row, line_number):
+    # las copias se comprueban aquí para indicar la línea; import_batch() las vuelve a leer con row_copies()
+    try:
+        row_copies(row)
+    except CatalogImportError as error:
+        raise CatalogImportError(f'línea {line_number}: {error}')
+    return row
+
+
+def clean(value):
+    return '' if value is None else str(value).strip()
+
+
+def row_genres(row):
+    genres = row.get('genres') or []
+    if isinstance(genres, str):
+        genres = genres.split(';')
+    return [name.strip() for name in genres if name and name.strip()]
+
+
+def row_copies(row):
+    copies = row.get('copies')
+    if copies is None:
+        copies = [row] if clean(row.get('imprint')) else []
+    result = []
+    for copy in copies:
+        # bulk_create() no valida los choices: un código desconocido se guardaría (y descuadraría los contadores)
+        status = clean(copy.get('status')) or 'm'
+        if status not in STATUS_CODES:
+            raise CatalogImportError(f"estado de copia no válido: {status!r} (debe ser uno de {', '.join(STATUS_CODES)})")
+        due_back = clean(copy.get('due_back'))
+        try:
+            due_back = datetime.date.fromisoformat(due_back) if due_back else None
+        except ValueError:
+            raise CatalogImportError(f'fecha de devolución no válida: {due_back!r} (formato AAAA-MM-DD)')
+        result.append({'imprint': clean(copy.get('imprint')), 'status': status, 'due_back': due_back})
+    return result
+
+
+class CatalogImporter:
+    """
+    Importa lotes de filas. Guarda entre lotes los autores y géneros ya resueltos para no volver a buscarlos.
+    """
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.authors = {} # (first_name, last_name) -> id
+        self.genres = {} # nombre -> id
+        self.totals = dict.fromkeys(('rows', 'books_created', 'books_updated', 'copies', 'authors', 'genres'), 0)
+
+    # autores y géneros: primero el diccionario en memoria, luego una consulta por lote para los que falten, y bulk_create para los nuevos
+
+    def resolve_authors(self, rows):
+        missing = {(clean(row.get('author_first_name')), clean(row.get('author_last_name'))) for row in rows}
+        missing = {key for key in missing if key[1] and key not in self.authors}
+        if not missing:
+            return
+        for pk, first_name, last_name in Author.objects.filter(last_name__in={key[1] for key in missing}).values_list('pk', 'first_name', 'last_name'):
+            self.authors.setdefault((first_name, last_name), pk)
+        new = [Author(first_name=first, last_name=last) for first, last in sorted(missing) if (first, last) not in self.authors]
+        for author in Author.objects.bulk_create(new, batch_size=self.batch_size):
+            self.authors[(author.first_name, author.last_name)] = author.pk
+        self.totals['authors'] += len(new)
+        if new:
+            bump_counters({'authors': len(new)})
+
+    def resolve_genres(self, rows):
+        missing = {name for row in rows for name in row_genres(row) if name not in self.genres}
+        if not missing:
+            return
+        self.genres.update({name: pk for pk, name in Genre.objects.filter(name__in=missing).values_list('pk', 'name')})
+        new = [Genre(name=name) for name in sorted(missing) if name not in self.genres]
+        for genre in Genre.objects.bulk_create(new, batch_size=self.batch_size):
+            self.genres[genre.name] = genre.pk
+        self.totals['genres'] += len(new)
+        if new:
+            bump_counters({'genres': len(new)})
+
+    def import_batch(self, rows):
+        with transaction.atomic():
+            self.resolve_authors(rows)
+            self.resolve_genres(rows)
+
+            # un mismo ISBN puede repetirse en el lote (una fila por copia); los datos del libro son los de la última fila
+            by_isbn = {}
+            without_isbn = []
+            for row in rows:
+                isbn = clean(row.get('isbn'))
+                if isbn:
+                    by_isbn.setdefault(isbn, []).append(row)
+                else:
+                    without_isbn.append([row])
+
+            existing = {}
+            for book in Book.objects.filter(isbn__in=by_isbn.keys()).order_by('-pk'):
+                existing[book.isbn] = book # ordenamos por -pk para quedarnos con el primero si el ISBN está repetido
+
+            to_create, to_update, groups = [], [], []
+            deltas = {'books': 0, 'books_with_the': 0}
+            affected_authors = set()
+            now = timezone.now() # bulk_update() no actualiza los campos auto_now
+            for isbn, group in list(by_isbn.items()) + [(None, group) for group in without_isbn]:
+                row = group[-1]
+                first_name, last_name = clean(row.get('author_first_name')), clean(row.get('author_last_name'))
+                author_id = self.authors.get((first_name, last_name)) if last_name else None
+                values = {field: clean(row.get(field)) for field in BOOK_FIELDS}
+                book = existing.get(isbn) if isbn else None
+                if book is None:
+                    book = Book(isbn=isbn or '', author_id=author_id, **values)
+                    to_create.append(book)
+                    deltas['books'] += 1
+                    deltas['books_with_the'] += int(has_the(book.title))
+                else:
+                    affected_authors.add(book.author_id)
+                    deltas['books_with_the'] += int(has_the(values['title'])) - int(has_the(book.title))
+                    for field, value in values.items():
+                        setattr(book, field, value)
+                    book.author_id = author_id
+                    book.updated_at = now
+                    to_update.append(book)
+                affected_authors.add(author_id)
+                groups.append((book, group))
+
+            Book.objects.bulk_create(to_create, batch_size=self.batch_size)
+            Book.objects.bulk_update(to_update, ['title', 'summary', 'language', 'author', 'updated_at'], batch_size=self.batch_size)
+
+            through = [
+                Book.genre.through(book_id=book.pk, genre_id=self.genres[name])
+                for book, group in groups for row in group for name in row_genres(row)
+            ]
+            Book.genre.through.objects.bulk_create(through, batch_size=self.batch_size, ignore_conflicts=True)
+
+            copies = [
+                BookInstance(book_id=book.pk, **copy)
+                for book, group in groups for row in group for copy in row_copies(row)
+            ]
+            BookInstance.objects.bulk_create(copies, batch_size=self.batch_size)
+            for copy in copies:
+                for name, delta in status_change_deltas(None, copy.status).items():
+                    deltas[name] = deltas.get(name, 0) + delta
+
+            bump_counters(deltas)
+            search.index_books([book.pk for book, group in groups])
+            # las listas en caché se invalidan al confirmar el lote; antes otra petición podría volver a guardar la lista sin los cambios
+            for author_id in affected_authors - {None}:
+                transaction.on_commit(lambda author_id=author_id: bump_version(author_books_version_name(author_id)))
+
+        self.totals['rows'] += len(rows)
+        self.totals['books_created'] += len(to_create)
+        self.totals['books_updated'] += len(to_update)
+        self.totals['copies'] += len(copies)
+
+    def run(self, rows, skip=0, on_batch=None):
+        """
+        Importa todas las filas (saltándose las primeras skip, para reanudar). Después de confirmar cada lote llama a
+        on_batch(filas_procesadas, filas_por_segundo), que el comando usa para guardar el progreso e informar.
+        """
+        started = time.monotonic()
+        processed = skip
+        batch = []
+        try:
+            for position, row in enumerate(rows):
+                if position < skip:
+                    continue
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    self.import_batch(batch)
+                    processed += len(batch)
+                    batch = []
+                    if on_batch:
+                        on_batch(processed, self.totals['rows'] / max(time.monotonic() - started, 1e-9))
+            if batch:
+                self.import_batch(batch)
+                processed += len(batch)
+                if on_batch:
+                    on_batch(processed, self.totals['rows'] / max(time.monotonic() - started, 1e-9))
+        finally:
+            invalidate_catalog_stats()
+            invalidate_catalog_pages()
+            autocomplete.reset()
+        return processed, time.monotonic() - started
@@ -0,0 +1,90 @@
+"""
+Operaciones de préstamo sobre muchas copias a la vez (renovar, devolver y prestar), para el principio del semestre
+cuando los bibliotecarios tienen que renovar cientos de copias.
+
+renew_book_librarian trabaja con una copia por petición: get_object_or_404() y save(), dos consultas por copia.
+Aquí, dentro de una sola transacción, bloqueamos las copias elegidas con select_for_update() (una consulta), comprobamos el estado
+de cada una y aplicamos el cambio a todas las que lo admiten con un único UPDATE ... WHERE id IN (...).
+El resultado es una lista con lo que pasó con cada copia, en el orden en que se pidieron.
+
+update() no envía señales, así que actualizamos a mano los contadores por estado (catalog/counters.py), la caché de estadísticas
+y la de las páginas del catálogo.
+"""
+from collections import namedtuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Book, BookInstance
+from .counters import bump_counters, status_change_deltas
+from .stats import invalidate_catalog_stats
+from .caching import invalidate_catalog_pages
+from .holds import allocate_copies_on_commit
+
+# resultado de la operación para una copia: ok es False si la copia no existe o su estado no permite la operación
+LoanResult = namedtuple('LoanResult', ['copy_id', 'title', 'ok', 'message'])
+
+
+def _bulk_update(copy_ids, required_status, changes, done_message):
+    """
+    Aplica changes (campos para update()) a las copias de copy_ids cuyo estado es required_status. Devuelve una lista de LoanResult.
+    """
+    copy_ids = list(dict.fromkeys(copy_ids)) # sin repetidos, conservando el orden
+    status_label = dict(BookInstance.LOAN_STATUS)
+
+    with transaction.atomic():
+        # ordenamos por pk para que dos operaciones simultáneas bloqueen las filas en el mismo orden y no se bloqueen mutuamente.
+        # of=('self',) bloquea solo las copias y no los libros (en PostgreSQL no se puede bloquear el lado opcional de un LEFT JOIN)
+        copies = (BookInstance.objects.select_for_update(of=('self',)).select_related('book')
+                  .filter(pk__in=copy_ids).order_by('pk'))
+        copies = {copy.pk: copy for copy in copies}
+
+        eligible = [pk for pk, copy in copies.items() if copy.status == required_status]
+        if eligible:
+            now = timezone.now()
+            BookInstance.objects.filter(pk__in=eligible).update(updated_at=now, **changes)
+            # los detalles de los libros muestran el estado y la fecha de devolución de las copias (ver catalog/conditional.py)
+            Book.objects.filter(pk__in={copies[pk].book_id for pk in eligible}).update(updated_at=now)
+            invalidate_catalog_pages()
+            transaction.on_commit(invalidate_catalog_pages)
+            new_status = changes.get('status', required_status)
+            if new_status != required_status:
+                bump_counters(status_change_deltas(required_status, new_status, len(eligible)))
+                invalidate_catalog_stats()
+                transaction.on_commit(invalidate_catalog_stats)
+            if new_status == 'a':
+                # las copias devueltas pasan a la primera reserva en espera de su libro (ver catalog/holds.py)
+                allocate_copies_on_commit(copies[pk].book_id for pk in eligible)
+
+    results = []
+    for copy_id in copy_ids:
+        copy = copies.get(copy_id)
+        if copy is None:
+            results.append(LoanResult(copy_id, None, False, 'La copia no existe'))
+        elif copy.status != required_status:
+            title = copy.book.title if copy.book else None
+            results.append(LoanResult(copy_id, title, False, f'Estado actual: {status_label.get(copy.status, copy.status)}'))
+        else:
+            results.append(LoanResult(copy_id, copy.book.title if copy.book else None, True, done_message))
+    return results
+
+
+def bulk_renew(copy_ids, due_back):
+    """
+    Cambia la fecha de devolución de las copias prestadas. La fecha ya debe estar validada (p. ej. con RenewBookForm).
+    """
+    return _bulk_update(copy_ids, 'o', {'due_back': due_back}, f'Renovada hasta {due_back}')
+
+
+def bulk_return(copy_ids):
+    """
+    Marca como devueltas (disponibles, sin prestatario ni fecha) las copias prestadas.
+    """
+    return _bulk_update(copy_ids, 'o', {'status': 'a', 'borrower': None, 'due_back': None}, 'Devuelta')
+
+
+def bulk_checkout(copy_ids, borrower, due_back):
+    """
+    Presta a borrower las copias disponibles, con fecha de devolución due_back.
+    """
+    return _bulk_update(copy_ids, 'a', {'status': 'o', 'borrower': borrower, 'due_back': due_back}, f'Prestada hasta {due_back}')
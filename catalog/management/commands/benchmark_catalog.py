@@ -0,0 +1,68 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from catalog.benchmark import run_benchmark, compare_results
+
+
+class Command(BaseCommand):
+    """
+    Mide la latencia (p50/p95/p99) y las consultas por petición de cada URL del catálogo con varios tamaños de datos (ver catalog/benchmark.py).
+
+    uso: python manage.py benchmark_catalog --sizes 100 1000 10000 --requests 50 --output actual.json --compare base.json
+
+    Trabaja en una base de datos de pruebas nueva (como "manage.py test"), que se llena con datos sintéticos y se elimina al terminar;
+    la base de datos real no se toca. Con --compare termina con error si hay regresiones respecto a un resultado anterior.
+    """
+    help = 'Mide la latencia y las consultas SQL de las páginas del catálogo con distintos tamaños de datos y guarda el resultado en JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000], help='Tamaños del catálogo en libros (por defecto 100 1000)')
+        parser.add_argument('--requests', type=int, default=50, help='Peticiones medidas por URL (por defecto 50)')
+        parser.add_argument('--warmup', type=int, default=3, help='Peticiones sin medir antes de cada URL (por defecto 3)')
+        parser.add_argument('--copies-per-book', type=int, default=3, help='Copias de cada libro (por defecto 3)')
+        parser.add_argument('--urls', nargs='+', help='Nombres de las URL a medir (por defecto todas)')
+        parser.add_argument('--anonymous', action='store_true', help='Medir como visitante anónimo en lugar de como superusuario')
+        parser.add_argument('--seed', type=int, default=0, help='Semilla de los datos sintéticos')
+        parser.add_argument('--output', help='Archivo JSON donde guardar el resultado (por defecto la salida estándar)')
+        parser.add_argument('--compare', help='Resultado anterior (JSON) con el que comparar')
+        parser.add_argument('--threshold', type=float, default=0.2, help='Aumento del p95 que se considera regresión (por defecto 0.2 = 20%%)')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or min(options['sizes']) < 1:
+            raise CommandError('--requests y --sizes deben ser mayores que 0')
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as source:
+                baseline = json.load(source)
+
+        def on_result(size, name, stats):
+            self.stderr.write(f"{size:>8} {name:<24} p50 {stats['p50_ms']:>8} ms  p95 {stats['p95_ms']:>8} ms  "
+                              f"p99 {stats['p99_ms']:>8} ms  {stats['queries']:>3} consultas  {stats['status']}")
+
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            result = run_benchmark(options['sizes'], options['requests'], options['warmup'], options['copies_per_book'],
+                                   names=options['urls'], anonymous=options['anonymous'], seed=options['seed'], on_result=on_result)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        content = json.dumps(result, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as target:
+                target.write(content)
+        else:
+            self.stdout.write(content)
+
+        if baseline is not None:
+            regressions = compare_results(baseline, result, options['threshold'])
+            for regression in regressions:
+                self.stderr.write(regression)
+            if regressions:
+                raise CommandError(f'{len(regressions)} regresiones respecto a {options["compare"]}')
+            self.stderr.write(self.style.SUCCESS(f'Sin regresiones respecto a {options["compare"]}'))
@@ -0,0 +1,27 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.holds import expire_holds
+
+
+class Command(BaseCommand):
+    """
+    Cancela las reservas cuya copia apartada no se recogió a tiempo y pasa esas copias a la siguiente reserva de la cola
+    (ver expire_holds en catalog/holds.py). Pensado para ejecutarse una vez al día, p. ej. desde cron:
+
+        10 0 * * * cd /ruta/al/proyecto && python manage.py expire_holds
+    """
+    help = 'Cancela las reservas listas que no se recogieron antes de la fecha límite.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Fecha de hoy (AAAA-MM-DD); vencen las reservas con fecha límite anterior. Por defecto hoy')
+
+    def handle(self, *args, **options):
+        try:
+            today = datetime.date.fromisoformat(options['date']) if options['date'] else None
+        except ValueError:
+            raise CommandError('--date debe tener el formato AAAA-MM-DD')
+
+        expired = expire_holds(today)
+        self.stdout.write(self.style.SUCCESS(f'{len(expired)} reservas vencidas canceladas.'))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.export import EXPORTS, FORMATS, EXPORT_CHUNK_SIZE, export_lines, encode
+
+
+class Command(BaseCommand):
+    """
+    Exporta los libros, autores o copias del catálogo en CSV o JSONL, fila a fila, sin cargar la tabla en memoria (ver catalog/export.py).
+
+    uso: python manage.py export_catalog books --format jsonl --gzip --output books.jsonl.gz
+
+    Sin --output se escribe en la salida estándar (sin comprimir).
+    """
+    help = 'Exporta el catálogo (libros, autores o copias) en CSV o JSONL, opcionalmente comprimido con gzip.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('export', choices=sorted(EXPORTS), help='Qué exportar')
+        parser.add_argument('--format', choices=FORMATS, default='csv', help='Formato de salida (por defecto csv)')
+        parser.add_argument('--gzip', action='store_true', help='Comprimir la salida con gzip (requiere --output)')
+        parser.add_argument('--output', help='Archivo de salida (por defecto la salida estándar)')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+                            help=f'Filas que se leen de la base de datos por bloque (por defecto {EXPORT_CHUNK_SIZE})')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size debe ser mayor que 0')
+        lines = export_lines(options['export'], options['format'], options['chunk_size'])
+
+        if not options['output']:
+            if options['gzip']:
+                raise CommandError('--gzip requiere --output')
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+
+        written = 0
+        with open(options['output'], 'wb') as output:
+            for data in encode(lines, compress=options['gzip']):
+                output.write(data)
+                written += len(data)
+        self.stderr.write(f"{options['export']}: {written} bytes escritos en {options['output']}")
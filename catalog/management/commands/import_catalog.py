@@ -0,0 +1,57 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.importer import CatalogImporter, CatalogImportError, read_rows
+
+
+class Command(BaseCommand):
+    """
+    Importa libros, autores, géneros y copias desde archivos CSV o JSONL por lotes (ver el formato en catalog/importer.py).
+
+    uso: python manage.py import_catalog libros.csv copias.jsonl --batch-size 2000
+
+    Después de confirmar cada lote se guarda el número de filas importadas en <archivo>.progress. Si la importación falla,
+    volver a ejecutar el comando con --resume continúa desde el último lote confirmado. Al terminar un archivo se borra su .progress.
+    """
+    help = 'Importa el catálogo desde archivos CSV o JSONL con inserciones por lotes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Archivos .csv o .jsonl a importar')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Filas por lote / transacción (por defecto 1000)')
+        parser.add_argument('--resume', action='store_true', help='Continuar desde el último lote confirmado (<archivo>.progress)')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size debe ser mayor que 0')
+        importer = CatalogImporter(batch_size=options['batch_size'])
+
+        for path in options['paths']:
+            if not os.path.exists(path):
+                raise CommandError(f'No existe el archivo {path}')
+            progress_path = path + '.progress'
+            skip = 0
+            if options['resume'] and os.path.exists(progress_path):
+                with open(progress_path) as progress:
+                    skip = int(progress.read().strip() or 0)
+                self.stdout.write(f'{path}: reanudando después de la fila {skip}')
+
+            def on_batch(processed, rows_per_second, path=path, progress_path=progress_path):
+                with open(progress_path, 'w') as progress:
+                    progress.write(str(processed))
+                self.stdout.write(f'{path}: {processed} filas ({rows_per_second:.0f} filas/s)')
+
+            try:
+                processed, elapsed = importer.run(read_rows(path), skip=skip, on_batch=on_batch)
+            except (CatalogImportError, ValueError, KeyError) as error:
+                raise CommandError(f'{path}: {error}. Use --resume para continuar desde el último lote confirmado.')
+
+            if os.path.exists(progress_path):
+                os.remove(progress_path)
+            self.stdout.write(f'{path}: {processed - skip} filas importadas en {elapsed:.1f} s')
+
+        totals = importer.totals
+        self.stdout.write(self.style.SUCCESS(
+            f"Libros creados: {totals['books_created']}, actualizados: {totals['books_updated']}, copias: {totals['copies']}, "
+            f"autores nuevos: {totals['authors']}, géneros nuevos: {totals['genres']}."
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from catalog.caching import page_cache_stats
+
+
+class Command(BaseCommand):
+    """
+    Muestra los aciertos y fallos de la caché de páginas del catálogo para visitantes anónimos (ver cache_anonymous_page en catalog/caching.py).
+    Los contadores viven en la caché, así que se reinician cuando la caché se vacía o se reinicia.
+
+    uso: python manage.py page_cache_stats
+    """
+    help = 'Muestra los aciertos y fallos de la caché de páginas del catálogo.'
+
+    def handle(self, *args, **options):
+        # importar las vistas registra las páginas que usan la caché
+        import catalog.views  # noqa: F401
+
+        for name, counts in page_cache_stats().items():
+            total = counts['hit'] + counts['miss']
+            ratio = counts['hit'] / total if total else 0
+            self.stdout.write(f"{name}: {counts['hit']} aciertos, {counts['miss']} fallos ({ratio:.0%})")
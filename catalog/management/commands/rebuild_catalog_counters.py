@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from catalog.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    """
+    Recalcula desde cero los contadores desnormalizados del catálogo (CatalogCounter) e informa de las diferencias encontradas.
+    Útil después de cargas masivas con bulk_create()/update(), que no envían señales, o para vigilar periódicamente que no haya drift.
+
+    uso: python manage.py rebuild_catalog_counters
+    """
+    help = 'Recalcula los contadores del catálogo desde cero e informa de las diferencias (drift).'
+
+    def handle(self, *args, **options):
+        drift = rebuild_counters()
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Los contadores estaban al día.'))
+            return
+
+        for name, (stored, actual) in sorted(drift.items()):
+            self.stdout.write(f'{name}: {stored} -> {actual} ({actual - stored:+d})')
+        self.stdout.write(self.style.WARNING(f'Se corrigieron {len(drift)} contadores.'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from catalog.search import rebuild_index
+
+
+class Command(BaseCommand):
+    """
+    Vuelve a generar el índice de búsqueda de texto completo de todos los libros (ver catalog/search.py).
+    Hace falta después de cargar datos con bulk_create()/update() o SQL directo, que no envían señales.
+
+    uso: python manage.py rebuild_search_index
+    """
+    help = 'Vuelve a generar el índice de búsqueda de texto completo del catálogo.'
+
+    def handle(self, *args, **options):
+        total = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Se indexaron {total} libros.'))
@@ -0,0 +1,35 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.overdue import take_snapshot
+
+
+class Command(BaseCommand):
+    """
+    Guarda el resumen de préstamos atrasados del día (modelo OverdueSnapshot, ver catalog/overdue.py). Pensado para ejecutarse una vez al día,
+    p. ej. desde cron:
+
+        5 0 * * * cd /ruta/al/proyecto && python manage.py snapshot_overdue_loans
+
+    Si se ejecuta dos veces el mismo día reemplaza el resumen de ese día.
+    """
+    help = 'Guarda el número de préstamos atrasados, prestados y por vencer del día.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Fecha del resumen (AAAA-MM-DD); por defecto hoy')
+        parser.add_argument('--due-soon-days', type=int, default=7, help='Días para contar las copias que vencen pronto (por defecto 7)')
+
+    def handle(self, *args, **options):
+        try:
+            today = datetime.date.fromisoformat(options['date']) if options['date'] else None
+        except ValueError:
+            raise CommandError('--date debe tener el formato AAAA-MM-DD')
+        if options['due_soon_days'] < 0:
+            raise CommandError('--due-soon-days no puede ser negativo')
+
+        snapshot = take_snapshot(today, options['due_soon_days'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{snapshot.date}: {snapshot.overdue} copias atrasadas de {snapshot.on_loan} prestadas, '
+            f'{snapshot.borrowers_overdue} lectores con atrasos, {snapshot.due_soon} vencen en {snapshot.due_soon_days} días.'
+        ))
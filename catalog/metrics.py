@@ -0,0 +1,376 @@
+"""
+Métricas de rendimiento por vista: cuántas consultas SQL hace cada petición, cuánto tiempo pasa en la base de datos, en las plantillas y en total.
+
+- QueryMetricsMiddleware (en MIDDLEWARE de settings.py) mide cada petición. Las consultas se cuentan con connection.execute_wrapper(),
+  que envuelve cada ejecución de SQL de la petición (no hace falta DEBUG=True, que además guardaría todas las consultas en memoria).
+- InstrumentedDjangoTemplates (el BACKEND de TEMPLATES en settings.py) es el motor de plantillas de Django que además mide lo que tarda render().
+- Los valores se agrupan por el nombre de la URL resuelta (books, book-detail, all-borrowed, admin:index, ...). Se exportan como histogramas
+  de Prometheus, cuyas cuentas solo crecen desde que arrancó el proceso (Prometheus calcula lo reciente con rate()), y además, como gauges
+  (<métrica>_recent con quantile="0.5", "0.95" y "0.99", y <métrica>_recent_count), los percentiles de las peticiones de los últimos
+  CATALOG_METRICS_WINDOW segundos, para mirar el estado actual sin Prometheus.
+- metrics_text() los devuelve en el formato de texto de Prometheus; lo sirve la vista metrics_view en /catalog/metrics/ (solo para el personal
+  o con el token CATALOG_METRICS_TOKEN en la cabecera Authorization: Bearer).
+- Con CATALOG_SLOW_QUERY_MS se registran en el log (logger "catalog.metrics") las consultas más lentas que ese umbral, con la línea
+  de nuestro código que las originó.
+
+El costo por petición es un par de llamadas a perf_counter() por consulta y un lock al final de la petición; la pila solo se recorre
+para las consultas lentas. Cada proceso (cada worker de gunicorn) tiene sus propias métricas.
+Las consultas que se hacen después de que la vista devuelve la respuesta (p. ej. mientras se envía un StreamingHttpResponse) no se cuentan.
+"""
+import contextvars
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template.exceptions import TemplateDoesNotExist
+
+from locallibrary.db.pool import pool_stats
+
+from .caching import page_cache_stats
+
+logger = logging.getLogger(__name__)
+
+# límites superiores de los buckets: segundos para los tiempos y número de consultas para las consultas
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, math.inf)
+
+# percentiles de la ventana reciente que se exportan como gauges
+QUANTILES = (0.5, 0.95, 0.99)
+
+# nombre de la métrica -> (descripción, buckets)
+METRICS = {
+    'catalog_request_duration_seconds': ('Tiempo total de la petición', TIME_BUCKETS),
+    'catalog_request_db_seconds': ('Tiempo en consultas SQL por petición', TIME_BUCKETS),
+    'catalog_request_template_seconds': ('Tiempo generando plantillas por petición', TIME_BUCKETS),
+    'catalog_request_queries': ('Consultas SQL por petición', QUERY_BUCKETS),
+}
+
+# contadores del pool de conexiones (ver locallibrary/db/pool.py): (nombre, tipo, descripción)
+POOL_METRICS = (
+    ('max_size', 'gauge', 'Conexiones como máximo en el pool'),
+    ('open', 'gauge', 'Conexiones abiertas (libres y en uso)'),
+    ('in_use', 'gauge', 'Conexiones en uso por una petición'),
+    ('idle', 'gauge', 'Conexiones libres'),
+    ('acquired_total', 'counter', 'Conexiones entregadas a una petición'),
+    ('created_total', 'counter', 'Conexiones nuevas abiertas'),
+    ('discarded_total', 'counter', 'Conexiones cerradas por viejas, rotas o con una transacción a medias'),
+    ('health_check_failures_total', 'counter', 'Conexiones libres que no respondieron a la comprobación'),
+    ('waits_total', 'counter', 'Peticiones que esperaron una conexión libre'),
+    ('wait_seconds_total', 'counter', 'Tiempo total esperando una conexión libre'),
+    ('timeouts_total', 'counter', 'Peticiones que no consiguieron conexión a tiempo'),
+)
+
+# las mediciones de la petición en curso (las usan el wrapper de las consultas y las plantillas)
+_current = contextvars.ContextVar('catalog_request_metrics', default=None)
+
+PROJECT_DIR = str(settings.BASE_DIR)
+
+
+class RollingHistogram:
+    """
+    Histograma de las observaciones de los últimos window segundos. El intervalo se divide en slots partes; cada parte guarda sus propios
+    buckets y se vacía cuando vuelve a usarse (después de window segundos), así que las observaciones viejas salen sin recorrerlas una a una.
+    También lleva las cuentas de todas las observaciones, que nunca bajan (totals()), porque es lo que Prometheus espera de un histograma.
+    """
+    def __init__(self, buckets, window=300, slots=10):
+        self.buckets = buckets
+        self.slot_seconds = window / slots
+        self.slots = [(None, [0] * len(buckets), [0.0]) for _ in range(slots)] # (época del slot, cuentas por bucket, suma)
+        self.total_counts = [0] * len(buckets)
+        self.total_sum = 0.0
+
+    def _slot(self, now):
+        epoch = int(now // self.slot_seconds)
+        index = epoch % len(self.slots)
+        if self.slots[index][0] != epoch:
+            self.slots[index] = (epoch, [0] * len(self.buckets), [0.0])
+        return self.slots[index]
+
+    def observe(self, value, now=None):
+        _, counts, total = self._slot(time.monotonic() if now is None else now)
+        for position, limit in enumerate(self.buckets):
+            if value <= limit:
+                counts[position] += 1
+                self.total_counts[position] += 1
+                break
+        total[0] += value
+        self.total_sum += value
+
+    def totals(self):
+        """
+        Como snapshot(), pero con todas las observaciones desde que se creó el histograma.
+        """
+        return cumulate(self.total_counts), self.total_sum, sum(self.total_counts)
+
+    def snapshot(self, now=None):
+        """
+        Devuelve (cuentas acumuladas por bucket, suma, número de observaciones) de la ventana actual, como los espera Prometheus.
+        """
+        epoch = int((time.monotonic() if now is None else now) // self.slot_seconds)
+        counts = [0] * len(self.buckets)
+        total = 0.0
+        for slot_epoch, slot_counts, slot_total in self.slots:
+            if slot_epoch is not None and epoch - slot_epoch < len(self.slots):
+                counts = [a + b for a, b in zip(counts, slot_counts)]
+                total += slot_total[0]
+        return cumulate(counts), total, sum(counts)
+
+    def quantile(self, fraction, now=None):
+        """
+        Estimación del percentil de la ventana actual: el límite del primer bucket que alcanza esa fracción de las observaciones.
+        None si no hay observaciones.
+        """
+        cumulative, _, count = self.snapshot(now)
+        if not count:
+            return None
+        for limit, value in zip(self.buckets, cumulative):
+            if value >= fraction * count:
+                return limit
+        return self.buckets[-1]
+
+
+def cumulate(counts):
+    cumulative, running = [], 0
+    for count in counts:
+        running += count
+        cumulative.append(running)
+    return cumulative
+
+
+class MetricsRegistry:
+    """
+    Histogramas por (métrica, vista) y contador de consultas lentas por vista.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.slow_queries = {}
+
+    def observe(self, view, values, slow_queries=0):
+        window = getattr(settings, 'CATALOG_METRICS_WINDOW', 300)
+        now = time.monotonic()
+        with self.lock:
+            for metric, value in values.items():
+                key = (metric, view)
+                if key not in self.histograms:
+                    self.histograms[key] = RollingHistogram(METRICS[metric][1], window)
+                self.histograms[key].observe(value, now)
+            if slow_queries:
+                self.slow_queries[view] = self.slow_queries.get(view, 0) + slow_queries
+
+    def snapshot(self):
+        """
+        ({(métrica, vista): (totals(), snapshot(), {percentil: valor})}, {vista: consultas lentas}).
+        """
+        with self.lock:
+            histograms = {
+                key: (histogram.totals(), histogram.snapshot(), {fraction: histogram.quantile(fraction) for fraction in QUANTILES})
+                for key, histogram in self.histograms.items()
+            }
+            return histograms, dict(self.slow_queries)
+
+
+registry = MetricsRegistry()
+
+
+def query_origin():
+    """
+    Primera línea de la pila que pertenece al proyecto (y no a Django ni a este módulo): "catalog/views.py:120 in get_queryset".
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(PROJECT_DIR) and filename != __file__ and 'site-packages' not in filename:
+            return f'{os.path.relpath(filename, PROJECT_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return 'desconocido'
+
+
+class RequestMetrics:
+    """
+    Mediciones de una petición. Es también el wrapper que se pasa a connection.execute_wrapper().
+    """
+    def __init__(self, slow_query_seconds=None):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.slow_queries = 0
+        self.slow_query_seconds = slow_query_seconds
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_seconds += elapsed
+            if self.slow_query_seconds is not None and elapsed >= self.slow_query_seconds:
+                self.slow_queries += 1
+                logger.warning('Consulta lenta (%.1f ms) en %s: %s', elapsed * 1000, query_origin(), sql[:1000])
+
+
+class QueryMetricsMiddleware:
+    """
+    Mide cada petición y guarda el resultado en registry. Conviene ponerlo el primero en MIDDLEWARE para que el tiempo total
+    incluya el resto de middlewares (sesiones, autenticación, ...). Se desactiva con CATALOG_METRICS = False.
+
+    Funciona con WSGI y con ASGI. En una petición asíncrona las consultas se ejecutan en el hilo de sync_to_async (las conexiones
+    de Django son de cada hilo), así que los wrappers de las consultas se instalan y se quitan en ese hilo.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'CATALOG_METRICS', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def start(self):
+        slow_query_ms = getattr(settings, 'CATALOG_SLOW_QUERY_MS', None)
+        return RequestMetrics(slow_query_ms / 1000 if slow_query_ms else None), time.perf_counter()
+
+    @staticmethod
+    def wrap_connections(metrics):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(metrics))
+        return stack
+
+    def finish(self, request, metrics, started):
+        match = request.resolver_match
+        view = match.view_name if match is not None and match.url_name else 'unresolved'
+        registry.observe(view, {
+            'catalog_request_duration_seconds': time.perf_counter() - started,
+            'catalog_request_db_seconds': metrics.db_seconds,
+            'catalog_request_template_seconds': metrics.template_seconds,
+            'catalog_request_queries': metrics.queries,
+        }, metrics.slow_queries)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics, started = self.start()
+        token = _current.set(metrics)
+        try:
+            with self.wrap_connections(metrics):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, metrics, started)
+        return response
+
+    async def __acall__(self, request):
+        metrics, started = self.start()
+        token = _current.set(metrics)
+        try:
+            stack = await sync_to_async(self.wrap_connections)(metrics)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        finally:
+            _current.reset(token)
+        self.finish(request, metrics, started)
+        return response
+
+
+class InstrumentedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_seconds += time.perf_counter() - started
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """
+    El motor de plantillas de Django, pero con plantillas que suman su tiempo de render() a la petición en curso.
+    Mide igual las vistas que usan render() y las que devuelven un TemplateResponse (que se genera después de salir de la vista).
+    """
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return InstrumentedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def metrics_text():
+    """
+    Las métricas en el formato de texto de Prometheus (text/plain; version=0.0.4).
+    """
+    histograms, slow_queries = registry.snapshot()
+    window = getattr(settings, 'CATALOG_METRICS_WINDOW', 300)
+    lines = []
+    for metric, (description, buckets) in METRICS.items():
+        views = sorted((view, values) for (name, view), values in histograms.items() if name == metric)
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} histogram')
+        for view, ((cumulative, total, count), _, _) in views:
+            for limit, value in zip(buckets, cumulative):
+                lines.append(f'{metric}_bucket{{view="{view}",le="{format_value(limit)}"}} {value}')
+            lines.append(f'{metric}_sum{{view="{view}"}} {format_value(total)}')
+            lines.append(f'{metric}_count{{view="{view}"}} {count}')
+
+        # la ventana reciente sube y baja, así que va en gauges y no en el histograma
+        lines.append(f'# HELP {metric}_recent {description}: percentil (límite de su bucket) en los últimos {window} s')
+        lines.append(f'# TYPE {metric}_recent gauge')
+        for view, (_, _, quantiles) in views:
+            for fraction, value in quantiles.items():
+                if value is not None:
+                    lines.append(f'{metric}_recent{{view="{view}",quantile="{fraction}"}} {format_value(value)}')
+        lines.append(f'# HELP {metric}_recent_count Peticiones en los últimos {window} s')
+        lines.append(f'# TYPE {metric}_recent_count gauge')
+        for view, (_, (_, _, count), _) in views:
+            lines.append(f'{metric}_recent_count{{view="{view}"}} {count}')
+
+    lines.append('# HELP catalog_slow_queries_total Consultas más lentas que CATALOG_SLOW_QUERY_MS')
+    lines.append('# TYPE catalog_slow_queries_total counter')
+    for view, count in sorted(slow_queries.items()):
+        lines.append(f'catalog_slow_queries_total{{view="{view}"}} {count}')
+
+    # los aciertos y fallos de la caché de páginas (catalog/caching.py) se guardan en la caché, así que son los de todos los procesos
+    lines.append('# HELP catalog_page_cache_requests_total Peticiones anónimas servidas desde la caché de páginas (hit) o generadas (miss)')
+    lines.append('# TYPE catalog_page_cache_requests_total counter')
+    for page, outcomes in sorted(page_cache_stats().items()):
+        for outcome, count in sorted(outcomes.items()):
+            lines.append(f'catalog_page_cache_requests_total{{page="{page}",outcome="{outcome}"}} {count}')
+
+    # el pool de conexiones de este proceso, si la base de datos usa locallibrary.db.postgresql_pool (DATABASE_POOL=1)
+    pools = sorted(pool_stats().items())
+    for metric, kind, description in POOL_METRICS if pools else ():
+        lines.append(f'# HELP catalog_db_pool_{metric} {description}')
+        lines.append(f'# TYPE catalog_db_pool_{metric} {kind}')
+        for (alias, database), stats in pools:
+            value = stats[metric.removesuffix('_total')]
+            lines.append(f'catalog_db_pool_{metric}{{alias="{alias}",database="{database}"}} {format_value(value)}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.1 on 2026-10-18 05:18
+
+from django.db import migrations, models
+
+
+def populate_counters(apps, schema_editor):
+    """
+    Llena los contadores con los totales actuales (en una base de datos nueva todos valen 0).
+    """
+    Book = apps.get_model('catalog', 'Book')
+    BookInstance = apps.get_model('catalog', 'BookInstance')
+    Author = apps.get_model('catalog', 'Author')
+    Genre = apps.get_model('catalog', 'Genre')
+    CatalogCounter = apps.get_model('catalog', 'CatalogCounter')
+    db = schema_editor.connection.alias
+
+    values = {
+        'books': Book.objects.using(db).count(),
+        'books_with_the': Book.objects.using(db).filter(title__icontains='the').count(),
+        'copies': BookInstance.objects.using(db).count(),
+        'authors': Author.objects.using(db).count(),
+        'genres': Genre.objects.using(db).count(),
+    }
+    for status in ('m', 'o', 'a', 'r'):
+        values[f'copies_{status}'] = BookInstance.objects.using(db).filter(status=status).count()
+
+    CatalogCounter.objects.using(db).bulk_create([CatalogCounter(name=name, value=value) for name, value in values.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_alter_book_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogCounter',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.0.1 on 2026-10-18 05:26
+
+from django.db import migrations
+
+# La migración no importa catalog.search: el código de la aplicación puede cambiar después, y la migración debe seguir creando
+# exactamente estas tablas. Por eso el SQL está aquí y los modelos vienen de apps.get_model (su estado en este punto del historial).
+
+SQLITE_TABLE = 'catalog_book_fts'
+POSTGRES_TABLE = 'catalog_book_search'
+
+
+def create_and_populate(apps, schema_editor):
+    """
+    Crea la tabla de búsqueda de texto completo (FTS5 en SQLite, tsvector + GIN en PostgreSQL) e indexa los libros existentes.
+    """
+    Book = apps.get_model('catalog', 'Book')
+    connection = schema_editor.connection
+    if connection.vendor not in ('sqlite', 'postgresql'):
+        return
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_TABLE} USING fts5(title, summary, isbn, author, genres, tokenize="unicode61 remove_diacritics 2")'
+            )
+        else:
+            cursor.execute(f'CREATE TABLE IF NOT EXISTS {POSTGRES_TABLE} (book_id bigint PRIMARY KEY, document tsvector NOT NULL)')
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {POSTGRES_TABLE}_gin ON {POSTGRES_TABLE} USING GIN (document)')
+
+    documents = []
+    for book in Book.objects.using(connection.alias).select_related('author').prefetch_related('genre').iterator(chunk_size=500):
+        author = f'{book.author.first_name} {book.author.last_name}' if book.author else ''
+        genres = ' '.join(genre.name for genre in book.genre.all())
+        documents.append((book.pk, book.title, book.summary, book.isbn, author, genres))
+    if not documents:
+        return
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.executemany(
+                f'INSERT INTO {SQLITE_TABLE} (rowid, title, summary, isbn, author, genres) VALUES (%s, %s, %s, %s, %s, %s)',
+                documents,
+            )
+        else:
+            cursor.executemany(
+                f"INSERT INTO {POSTGRES_TABLE} (book_id, document) VALUES (%s, "
+                "setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'C') || "
+                "setweight(to_tsvector('simple', %s), 'C') || setweight(to_tsvector('simple', %s), 'B') || "
+                "setweight(to_tsvector('simple', %s), 'B')) "
+                "ON CONFLICT (book_id) DO UPDATE SET document = EXCLUDED.document",
+                documents,
+            )
+
+
+def drop(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'DROP TABLE IF EXISTS {SQLITE_TABLE}')
+        elif connection.vendor == 'postgresql':
+            cursor.execute(f'DROP TABLE IF EXISTS {POSTGRES_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0009_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_and_populate, drop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.1 on 2026-10-18 05:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitCount',
+            fields=[
+                ('visitor', models.CharField(max_length=60, primary_key=True, serialize=False)),
+                ('visits', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
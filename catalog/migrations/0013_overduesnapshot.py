@@ -0,0 +1,29 @@
+# Generated by Django 5.0.1 on 2026-10-18 05:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0012_visitcount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OverdueSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('on_loan', models.PositiveIntegerField(default=0)),
+                ('overdue', models.PositiveIntegerField(default=0)),
+                ('due_soon', models.PositiveIntegerField(default=0)),
+                ('due_soon_days', models.PositiveSmallIntegerField(default=7)),
+                ('borrowers_overdue', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-date'],
+            },
+        ),
+    ]
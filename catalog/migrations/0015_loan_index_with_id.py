@@ -0,0 +1,27 @@
+# Generated by Django 5.0.1 on 2026-10-18 07:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0014_hold'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='bookinstance',
+            name='bookinstance_due_back_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='bookinstance',
+            name='bookinstance_status_due_idx',
+        ),
+        migrations.AddIndex(
+            model_name='bookinstance',
+            index=models.Index(fields=['status', 'due_back', 'id'], name='bookinstance_status_due_idx'),
+        ),
+    ]
@@ -1,8 +1,8 @@
-from django.db import models
+from django.db import models, transaction
 from django.urls import reverse #Used to generate URLs by reversing the URL patterns
 from django.contrib.auth.models import User
 import uuid # Requerida para las instancias de libros únicos
-from datetime import date
+from datetime import date, timedelta
 
 # Las aplicaciones web de Django acceden y administran los datos a través de objetos de Python a los que se hace referencia como modelos. 
 # Los modelos definen la estructura de los datos almacenados, incluidos los tipos de campo y los atributos de cada campo, como su tamaño máximo, 
@@ -13,7 +13,21 @@ from datetime import date
 
 # Create your models here.
 
-class Genre(models.Model):
+class AtomicSaveModel(models.Model):
+    """
+    Modelo abstracto que guarda cada instancia dentro de una transacción.
+    Así los receptores de post_save (p. ej. los contadores de catalog/counters.py) se ejecutan en la misma transacción que el INSERT/UPDATE
+    y si alguno falla no queda la fila guardada con los contadores desactualizados.
+    """
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+    class Meta:
+        abstract = True
+
+
+class Genre(AtomicSaveModel):
     """
     Modelo que representa un género literario (p. ej. ciencia ficción, poesía, etc.).
     """
@@ -28,7 +42,7 @@ class Genre(models.Model):
         return self.name
     
 
-class Book(models.Model):
+class Book(AtomicSaveModel):
     """
     Modelo que representa un libro (pero no un Ejemplar específico).
     """
@@ -51,6 +65,11 @@ class Book(models.Model):
     # ManyToManyField, porque un género puede contener muchos libros y un libro puede cubrir varios géneros.
     # La clase Genre ya ha sido definida, entonces podemos especificar el objeto arriba, y no una string.
 
+    # fecha de la última modificación (auto_now la actualiza en cada save()). La usan las vistas para responder 304 Not Modified
+    # (ver catalog/conditional.py); el índice permite obtener MAX(updated_at) de toda la tabla sin recorrerla.
+    # Las señales de catalog/signals.py también la actualizan cuando cambian las copias o los géneros del libro.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
     #métodos
 
     def __str__(self):
@@ -73,6 +92,7 @@ class Book(models.Model):
         Creates a string for the Genre. This is required to display genre in Admin.
         Esto crea una cadena con los tres primeros valores del campo genre (si existen) y crea una short_description
         """
+        # con prefetch_related('genre') (p. ej. en BookAdmin) self.genre.all() ya está en memoria y cortarla no hace otra consulta
         return ', '.join([ genre.name for genre in self.genre.all()[:3] ])
     
     display_genre.short_description = 'Genre'
@@ -80,6 +100,12 @@ class Book(models.Model):
     class Meta:
         ordering = ["title"]
 
+        # índices para las consultas más frecuentes. Sin ellos la base de datos tiene que ordenar toda la tabla cada vez que listamos los libros por título.
+        # Incluimos el id porque la paginación por cursor (catalog/pagination.py) ordena por (title, id)
+        indexes = [
+            models.Index(fields=['title', 'id'], name='book_title_idx'),
+        ]
+
         # así se específican los permisos asociados a un módelo. Puedes especificar tantos permisos como necesites en una tupla, 
         # cada permiso está definido a sí mismo en una tupla anidada que contiene el nombre del permiso y el valor mostrado del mismo. 
         # Por ejemplo, podríamos definir un permiso para permitir a un usuario marcar un libro que ya ha sido devuelto, como se muestra abajo.
@@ -92,7 +118,40 @@ class Book(models.Model):
         # ej. {{ perms.catalog.can_mark_returned }} será True (cierto) si el usuario tiene el permiso, y False (falso) en otro caso.
 
 
-class BookInstance(models.Model):
+class BookInstanceQuerySet(models.QuerySet):
+    """
+    Consultas de préstamos que se resuelven en la base de datos (con los índices de BookInstance sobre status y due_back)
+    en lugar de cargar todas las copias y preguntar a cada una por is_overdue en Python.
+    today se puede indicar para las pruebas o para calcular el estado de otro día; por defecto es hoy.
+    """
+    def on_loan(self):
+        return self.filter(status__exact='o')
+
+    def overdue(self, today=None):
+        """
+        Copias prestadas cuya fecha de devolución ya pasó.
+        """
+        return self.on_loan().filter(due_back__lt=today or date.today())
+
+    def due_within(self, days, today=None):
+        """
+        Copias prestadas que hay que devolver en los próximos days días (incluido hoy), pero que aún no están atrasadas.
+        """
+        today = today or date.today()
+        return self.on_loan().filter(due_back__gte=today, due_back__lte=today + timedelta(days=days))
+
+    def with_overdue(self, today=None):
+        """
+        Añade a cada copia el campo overdue calculado en SQL (due_back < hoy), que usa la propiedad is_overdue en lugar de calcularlo.
+        """
+        return self.annotate(overdue=models.Case(
+            models.When(due_back__lt=today or date.today(), then=models.Value(True)),
+            default=models.Value(False),
+            output_field=models.BooleanField(),
+        ))
+
+
+class BookInstance(AtomicSaveModel):
     """
     Modelo que representa una copia específica de un libro (i.e. que puede ser prestado por la biblioteca). No representa al libro original, pues ese está definido por Book 
     """
@@ -117,9 +176,24 @@ class BookInstance(models.Model):
 
     borrower = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True) # vamos a hacer posible para los usuarios tener una BookInstance en alquiler (prestado). como podemos ver esto asocia al modelo con un usuario
 
+    updated_at = models.DateTimeField(auto_now=True) # fecha de la última modificación
+
+    # BookInstance.objects.overdue(), .due_within(7), .with_overdue(), ... (ver BookInstanceQuerySet)
+    objects = BookInstanceQuerySet.as_manager()
+
     class Meta:
         ordering = ["due_back"]
 
+        # las listas de préstamos filtran por status='o' (y por borrower en "mis libros prestados") y ordenan por due_back.
+        # El índice parcial (condition) solo contiene las copias prestadas, que suelen ser una parte pequeña de la tabla.
+        # id va al final de los índices porque la paginación por cursor ordena por (due_back, id): sin él cada página ordenaría todas
+        # las copias prestadas.
+        indexes = [
+            models.Index(fields=['status', 'due_back', 'id'], name='bookinstance_status_due_idx'),
+            models.Index(fields=['borrower', 'status', 'due_back'], name='bookinstance_borrower_idx'),
+            models.Index(fields=['due_back', 'id'], condition=models.Q(status='o'), name='bookinstance_on_loan_idx'),
+        ]
+
 
     def __str__(self):
         """
@@ -131,14 +205,17 @@ class BookInstance(models.Model):
     # vamos a añadir una propiedad que podamos llamar desde nuestras plantillas para decir si una instancia particular de un libro está atrasada.
     # Primeramente verificamos si la fecha due_back está vacía antes de realizar una comparación. 
     # Un campo vacío due_back provocaría a Django arrojar un error en lugar de mostrar la página: los valores vacíos no son comparables.
+    # Si la copia viene de BookInstance.objects.with_overdue() usamos el valor que ya calculó la base de datos.
     @property
     def is_overdue(self):
+        if 'overdue' in self.__dict__:
+            return self.overdue
         if self.due_back and date.today() > self.due_back:
             return True
         return False
 
     
-class Author(models.Model):
+class Author(AtomicSaveModel):
     """
     Modelo que representa un autor
     """
@@ -147,6 +224,7 @@ class Author(models.Model):
     language = models.CharField(max_length=30)
     date_of_birth = models.DateField(null=True, blank=True)
     date_of_death = models.DateField('Died', null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True) # fecha de la última modificación (ver Book.updated_at)
 
     def get_absolute_url(self):
         """
@@ -163,9 +241,97 @@ class Author(models.Model):
     
     class Meta:
         ordering = ['last_name']
+        indexes = [
+            models.Index(fields=['last_name', 'id'], name='author_last_name_idx'),
+        ]
         permissions = (("can_modify", "Create, Update and Delete authors"),)
 
 
+class CatalogCounter(models.Model):
+    """
+    Contador desnormalizado del catálogo (total de libros, de copias, de copias por estado, de autores y de géneros).
+    Cada contador es una fila (name, value); se mantienen al día con las señales de catalog/signals.py (ver catalog/counters.py)
+    para que la página de inicio y el sitio de administración lean los totales en O(1) en lugar de contar tablas enteras.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
+
+
+class Hold(models.Model):
+    """
+    Reserva de un libro por un lector. Las reservas de cada libro forman una cola por orden de llegada (el id, que crece con cada reserva).
+    Cuando una copia del libro queda disponible se asigna a la primera reserva en espera: la copia pasa a 'Reserved' y la reserva a 'ready'
+    hasta que el lector la recoge (la copia pasa a 'On loan') o la reserva se cancela (la copia vuelve a quedar disponible para la siguiente).
+    Las operaciones están en catalog/holds.py.
+    """
+    HOLD_STATUS = (
+        ('w', 'Waiting'), # en la cola
+        ('r', 'Ready'), # con una copia apartada, esperando a que el lector la recoja
+        ('f', 'Fulfilled'), # el lector se llevó la copia
+        ('c', 'Cancelled'),
+    )
+    ACTIVE_STATUSES = ('w', 'r')
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    status = models.CharField(max_length=1, choices=HOLD_STATUS, default='w')
+    copy = models.ForeignKey(BookInstance, on_delete=models.SET_NULL, null=True, blank=True) # la copia apartada (status 'r' y 'f')
+    created_at = models.DateTimeField(auto_now_add=True)
+    ready_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            # la siguiente reserva en espera de un libro: WHERE book_id = ... AND status = 'w' ORDER BY id LIMIT 1
+            models.Index(fields=['book', 'status', 'id'], name='hold_queue_idx'),
+            models.Index(fields=['user', 'status'], name='hold_user_idx'),
+        ]
+        constraints = [
+            # un lector no puede estar dos veces en la cola del mismo libro
+            models.UniqueConstraint(fields=['book', 'user'], condition=models.Q(status__in=('w', 'r')), name='hold_one_active_per_user'),
+            # y la base de datos garantiza que una copia no se aparte para dos reservas a la vez
+            models.UniqueConstraint(fields=['copy'], condition=models.Q(status='r'), name='hold_one_ready_per_copy'),
+        ]
+
+    def __str__(self):
+        return f'{self.book} - {self.user} ({self.get_status_display()})'
+
+
+class OverdueSnapshot(models.Model):
+    """
+    Foto diaria de los préstamos atrasados (la guarda el comando "manage.py snapshot_overdue_loans", ver catalog/overdue.py),
+    para poder ver cómo evolucionan sin recalcular el pasado.
+    """
+    date = models.DateField(unique=True)
+    on_loan = models.PositiveIntegerField(default=0) # copias prestadas
+    overdue = models.PositiveIntegerField(default=0) # copias prestadas con la fecha de devolución vencida
+    due_soon = models.PositiveIntegerField(default=0) # copias que vencen en los próximos due_soon_days días
+    due_soon_days = models.PositiveSmallIntegerField(default=7)
+    borrowers_overdue = models.PositiveIntegerField(default=0) # lectores con al menos una copia atrasada
+    created_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-date']
+
+    def __str__(self):
+        return f'{self.date}: {self.overdue} atrasadas de {self.on_loan} prestadas'
+
+
+class VisitCount(models.Model):
+    """
+    Visitas a la página de inicio por visitante ('user:<id>' o 'anonymous:<id de la cookie>').
+    Solo la usa BufferedVisitCounter (catalog/visits.py), que escribe aquí las visitas por lotes.
+    """
+    visitor = models.CharField(max_length=60, primary_key=True)
+    visits = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.visitor}: {self.visits}'
+
+
     
 
 
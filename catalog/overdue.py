@@ -0,0 +1,88 @@
+"""
+Préstamos atrasados: el resumen diario (OverdueSnapshot) y la lista de copias atrasadas agrupadas por lector para los bibliotecarios.
+
+Todo se calcula con BookInstance.objects.overdue() / due_within() (ver BookInstanceQuerySet en catalog/models.py), es decir en la base
+de datos y con los índices sobre (status, due_back), sin cargar todos los préstamos.
+"""
+import datetime
+
+from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+from django.db.models import Count, F, Min, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import BookInstance, OverdueSnapshot
+
+
+def overdue_summary(today=None, due_soon_days=7):
+    """
+    Totales de préstamos de un día en una sola consulta: prestadas, atrasadas, que vencen pronto y lectores con atrasos.
+    """
+    today = today or datetime.date.today()
+    # los mismos filtros que overdue() y due_within(), como filtros de cada COUNT para recorrer las copias prestadas una sola vez
+    return BookInstance.objects.on_loan().aggregate(
+        on_loan=Count('pk'),
+        overdue=Count('pk', filter=Q(due_back__lt=today)),
+        due_soon=Count('pk', filter=Q(due_back__gte=today, due_back__lte=today + datetime.timedelta(days=due_soon_days))),
+        borrowers_overdue=Count('borrower', filter=Q(due_back__lt=today), distinct=True),
+    )
+
+
+def take_snapshot(today=None, due_soon_days=7):
+    """
+    Guarda (o reemplaza, si el comando se ejecuta dos veces el mismo día) el OverdueSnapshot del día.
+    """
+    today = today or datetime.date.today()
+    totals = overdue_summary(today, due_soon_days)
+    snapshot, _ = OverdueSnapshot.objects.update_or_create(date=today, defaults={**totals, 'due_soon_days': due_soon_days})
+    return snapshot
+
+
+class BorrowerOverdue:
+    """
+    Un lector (None para las copias atrasadas sin prestatario) con el total de sus copias atrasadas y las primeras de ellas.
+    """
+    def __init__(self, borrower, count, oldest_due_back, copies, today):
+        self.borrower = borrower
+        self.count = count
+        self.oldest_due_back = oldest_due_back
+        self.days_overdue = (today - oldest_due_back).days
+        self.copies = copies
+        self.copies_not_listed = count - len(copies)
+
+
+def overdue_by_borrower(page_number, per_page=20, copies_per_borrower=10, today=None):
+    """
+    Página de lectores con copias atrasadas, de los que tienen el atraso más antiguo a los más recientes.
+    Devuelve (page, [BorrowerOverdue]). Siempre son cuatro consultas, sin importar cuántos lectores o copias haya:
+    el total de lectores (COUNT del paginador), los lectores de la página con sus totales (GROUP BY borrower), sus usuarios y
+    sus primeras copias_per_borrower copias atrasadas (con ROW_NUMBER() por lector, para no traer cientos de copias de un mismo lector).
+    Lanza InvalidPage si la página no existe.
+    """
+    today = today or datetime.date.today()
+    overdue = BookInstance.objects.overdue(today)
+    groups = (overdue.order_by().values('borrower')
+              .annotate(count=Count('pk'), oldest_due_back=Min('due_back'))
+              .order_by('oldest_due_back', 'borrower'))
+    page = Paginator(groups, per_page).page(page_number)
+    groups = list(page.object_list)
+
+    borrower_ids = [group['borrower'] for group in groups if group['borrower'] is not None]
+    users = User.objects.in_bulk(borrower_ids)
+
+    copies = {}
+    if groups:
+        borrower_filter = Q(borrower__in=borrower_ids)
+        if len(borrower_ids) < len(groups):
+            borrower_filter |= Q(borrower__isnull=True)
+        first_copies = (overdue.filter(borrower_filter).select_related('book')
+                        .annotate(position=Window(RowNumber(), partition_by=F('borrower'), order_by=[F('due_back').asc(), F('pk').asc()]))
+                        .filter(position__lte=copies_per_borrower)
+                        .order_by('borrower', 'due_back', 'pk'))
+        for copy in first_copies:
+            copies.setdefault(copy.borrower_id, []).append(copy)
+
+    return page, [
+        BorrowerOverdue(users.get(group['borrower']), group['count'], group['oldest_due_back'], copies.get(group['borrower'], []), today)
+        for group in groups
+    ]
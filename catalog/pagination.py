@@ -0,0 +1,188 @@
+"""
+Paginación por cursor (keyset pagination) para las vistas de lista del catálogo.
+
+El Paginator de Django usa OFFSET: para mostrar la página 1000 la base de datos tiene que recorrer y descartar todas las filas anteriores,
+y además cada página hace un COUNT(*) para saber cuántas páginas hay. Con la paginación por cursor recordamos el valor de la columna
+de orden (y la clave primaria, para desempatar) de la última fila mostrada, y la página siguiente se pide con
+WHERE columna >= último_valor AND (columna > último_valor OR (columna = último_valor AND pk > último_pk)) ORDER BY columna, pk LIMIT n
+(la primera condición, redundante, es la que permite a la base de datos saltar directamente a ese punto del índice). Así todas las páginas cuestan lo mismo y no hay COUNT.
+A cambio no se puede saltar a una página concreta ni mostrar el total de páginas: solo hay enlaces "anterior" y "siguiente".
+
+Los cursores que viajan en la URL (?cursor=...) van firmados con django.core.signing, así que son opacos y no se pueden manipular.
+Es opcional: las vistas que usan CursorPaginationMixin solo lo activan si CATALOG_CURSOR_PAGINATION es True en settings.py.
+"""
+from django.conf import settings
+from django.core import signing
+from django.db.models import F, Q
+from django.http import Http404
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPage:
+    """
+    Una página de resultados. Ofrece lo mismo que usa la plantilla de un objeto Page normal (has_next, has_previous, iterar la lista)
+    más los cursores para los enlaces anterior/siguiente.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+
+class CursorPaginator:
+    """
+    Pagina un queryset ordenado por un campo (ordering_field, p. ej. 'title' o '-due_back') más la clave primaria como desempate.
+    Si el campo admite NULL, las filas con NULL van siempre al final.
+    """
+    salt = 'catalog.pagination.cursor'
+
+    def __init__(self, queryset, per_page, ordering_field):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.descending = ordering_field.startswith('-')
+        self.field_name = ordering_field.lstrip('-')
+        self.field = queryset.model._meta.get_field(self.field_name)
+        self.pk_field = queryset.model._meta.pk
+
+    def ordering(self, reverse=False):
+        descending = self.descending != reverse
+        field = F(self.field_name)
+        # nulls_last en el sentido normal; al recorrer hacia atrás se invierte todo, así que los NULL quedan primero
+        nulls = {'nulls_first': True} if reverse else {'nulls_last': True}
+        field = field.desc(**nulls) if descending else field.asc(**nulls)
+        return [field, '-pk' if reverse else 'pk']
+
+    def after(self, value, pk):
+        """
+        Filtros de las filas que van después de (value, pk) en el orden normal, uno por tramo y en el orden en que se recorren.
+        Las filas con NULL (que van al final) son un tramo aparte: unidas con OR a la condición de rango, la base de datos ya no
+        podría usar el índice para saltar al cursor.
+        """
+        if value is None:
+            return [Q(**{f'{self.field_name}__isnull': True, 'pk__gt': pk})]
+        lookup = 'lt' if self.descending else 'gt'
+        conditions = [self.bound(lookup, value) & (Q(**{f'{self.field_name}__{lookup}': value}) | Q(**{self.field_name: value, 'pk__gt': pk}))]
+        if self.field.null:
+            conditions.append(Q(**{f'{self.field_name}__isnull': True}))
+        return conditions
+
+    def before(self, value, pk):
+        """
+        Como after(), pero con las filas que van antes de (value, pk), en el orden en que se recorren hacia atrás.
+        """
+        if value is None:
+            return [Q(**{f'{self.field_name}__isnull': True, 'pk__lt': pk}), Q(**{f'{self.field_name}__isnull': False})]
+        lookup = 'gt' if self.descending else 'lt'
+        return [self.bound(lookup, value) & (Q(**{f'{self.field_name}__{lookup}': value}) | Q(**{self.field_name: value, 'pk__lt': pk}))]
+
+    def bound(self, lookup, value):
+        """
+        Cota no estricta de la columna (columna >= valor o <= valor). Es redundante con el OR que la sigue, pero sin ella ni SQLite
+        ni PostgreSQL convierten "columna > v OR (columna = v AND pk > p)" en una búsqueda por rango en el índice: recorrerían el índice
+        desde el principio en cada página. Con ella el plan es SEARCH ... USING INDEX (columna>?) y todas las páginas cuestan lo mismo.
+        """
+        return Q(**{f'{self.field_name}__{lookup}e': value})
+
+    def encode_cursor(self, obj, direction):
+        value = getattr(obj, self.field_name)
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        return signing.dumps({'v': value, 'pk': str(obj.pk), 'd': direction}, salt=self.salt, compress=True)
+
+    def decode_cursor(self, cursor):
+        try:
+            data = signing.loads(cursor, salt=self.salt)
+            value = None if data['v'] is None else self.field.to_python(data['v'])
+            return value, self.pk_field.to_python(data['pk']), data['d']
+        except (signing.BadSignature, KeyError, TypeError, ValueError) as error:
+            raise InvalidCursor(str(error))
+
+    def fetch(self, conditions, reverse=False):
+        """
+        Hasta per_page + 1 filas recorriendo los tramos en orden; el siguiente tramo solo se consulta si el anterior no llenó la página.
+        """
+        rows = []
+        for condition in conditions:
+            queryset = self.queryset.filter(condition).order_by(*self.ordering(reverse))
+            rows += list(queryset[:self.per_page + 1 - len(rows)])
+            if len(rows) > self.per_page:
+                break
+        return rows
+
+    def page(self, cursor=None):
+        """
+        Devuelve la página que empieza después del cursor (o la primera si no hay cursor).
+        Pedimos per_page + 1 filas y la fila de más nos dice si hay otra página en ese sentido. Normalmente es una sola consulta;
+        son dos cuando la página pasa de las filas con valor a las filas con NULL.
+        """
+        if not cursor:
+            rows = list(self.queryset.order_by(*self.ordering())[:self.per_page + 1])
+            has_more, rows = len(rows) > self.per_page, rows[:self.per_page]
+            return CursorPage(rows, next_cursor=self.encode_cursor(rows[-1], 'next') if has_more else None)
+
+        value, pk, direction = self.decode_cursor(cursor)
+        if direction == 'prev':
+            rows = self.fetch(self.before(value, pk), reverse=True)
+            has_more, rows = len(rows) > self.per_page, rows[:self.per_page][::-1]
+            has_previous, has_next = has_more, True
+        else:
+            rows = self.fetch(self.after(value, pk))
+            has_more, rows = len(rows) > self.per_page, rows[:self.per_page]
+            has_previous, has_next = True, has_more
+
+        if not rows:
+            return CursorPage(rows)
+        return CursorPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1], 'next') if has_next else None,
+            previous_cursor=self.encode_cursor(rows[0], 'prev') if has_previous else None,
+        )
+
+
+class CursorPaginationMixin:
+    """
+    Mixin para vistas ListView. Si CATALOG_CURSOR_PAGINATION está activado reemplaza la paginación por OFFSET de Django
+    por la paginación por cursor. La columna de orden es cursor_ordering o, si no se indica, la primera del order_by()
+    del queryset o de Meta.ordering del modelo ('title' para Book, 'last_name' para Author, 'due_back' para BookInstance).
+    """
+    cursor_ordering = None
+
+    def use_cursor_pagination(self):
+        return getattr(settings, 'CATALOG_CURSOR_PAGINATION', False)
+
+    def get_cursor_ordering(self, queryset):
+        return self.cursor_ordering or (queryset.query.order_by or queryset.model._meta.ordering)[0]
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_cursor_pagination():
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = CursorPaginator(queryset, page_size, self.get_cursor_ordering(queryset))
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404('Cursor de paginación no válido')
+        return (paginator, page, page.object_list, page.has_other_pages())
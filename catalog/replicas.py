@@ -0,0 +1,206 @@
+"""
+Lecturas del catálogo en réplicas de la base de datos (ver DATABASE_REPLICA_URLS en settings.py).
+
+- ReplicaRoutingMiddleware decide, para cada petición, si sus lecturas pueden ir a una réplica: solo las peticiones GET/HEAD a las vistas de
+  lectura del catálogo (CATALOG_REPLICA_VIEWS: inicio, listas, detalles, búsqueda) y solo si el visitante no escribió nada hace poco.
+  Elige una réplica para toda la petición (así todas sus consultas ven el mismo estado de los datos), por turnos (round_robin) o la que
+  respondió más rápido en las últimas consultas (least_latency), según CATALOG_REPLICA_STRATEGY.
+- ReplicaRouter (en DATABASE_ROUTERS) envía a esa réplica las lecturas de los modelos del catálogo y no deja migrar las réplicas.
+  Todo lo demás va a 'default': las escrituras, las sesiones y los usuarios (son lecturas por clave primaria, baratas, y tienen que ver enseguida el inicio de sesión)
+  y las lecturas de cualquier otra vista (renovar, crear, editar, borrar, el admin, ...).
+- Lectura de lo propio: las réplicas van unos instantes por detrás de la principal. Cuando una petición escribe en la base de datos, la
+  respuesta deja la cookie CATALOG_REPLICA_STICKY_COOKIE durante CATALOG_REPLICA_STICKY_SECONDS segundos, y mientras exista las lecturas
+  de ese visitante van a la principal; así, p. ej., quien acaba de crear un libro lo ve en la lista aunque la réplica aún no lo tenga.
+
+Sin réplicas configuradas el middleware se desactiva (MiddlewareNotUsed) y el router siempre responde 'default'.
+"""
+import contextvars
+import itertools
+import threading
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# las aplicaciones cuyos modelos se leen de las réplicas
+REPLICA_APPS = {'catalog'}
+
+# peso de la última consulta en la media de latencia de cada réplica (media móvil exponencial)
+LATENCY_WEIGHT = 0.2
+
+# la base de datos de lectura de la petición en curso, o None si lee de la principal
+_current = contextvars.ContextVar('catalog_replica_state', default=None)
+
+
+class RoutingState:
+    """
+    Lo que el router necesita saber de la petición en curso: de qué réplica leer (None: de la principal) y si ya escribió algo.
+    """
+    def __init__(self):
+        self.read_alias = None
+        self.wrote = False
+
+
+class LatencyTracker:
+    """
+    Media móvil del tiempo de las consultas de cada réplica en este proceso, para la estrategia least_latency.
+    wrapper(alias) devuelve el wrapper que se pasa a connection.execute_wrapper() en la conexión de esa réplica para medirla.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = {}
+
+    def observe(self, alias, seconds):
+        with self.lock:
+            previous = self.latency.get(alias)
+            self.latency[alias] = seconds if previous is None else previous + LATENCY_WEIGHT * (seconds - previous)
+
+    def fastest(self, aliases):
+        with self.lock:
+            # una réplica sin mediciones cuenta como la más rápida, así todas reciben consultas y se miden
+            return min(aliases, key=lambda alias: self.latency.get(alias, 0.0))
+
+    def wrapper(self, alias):
+        def measure(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                self.observe(alias, time.perf_counter() - started)
+        return measure
+
+
+latency = LatencyTracker()
+
+_turns = {}
+_turns_lock = threading.Lock()
+
+
+def replica_aliases():
+    return list(getattr(settings, 'CATALOG_REPLICAS', []))
+
+
+def sticky_cookie_name():
+    return getattr(settings, 'CATALOG_REPLICA_STICKY_COOKIE', 'primary_until')
+
+
+def choose_replica(aliases=None):
+    """
+    La réplica de la que leerá la siguiente petición según CATALOG_REPLICA_STRATEGY, o None si no hay réplicas.
+    """
+    aliases = replica_aliases() if aliases is None else aliases
+    if not aliases:
+        return None
+    if getattr(settings, 'CATALOG_REPLICA_STRATEGY', 'round_robin') == 'least_latency':
+        return latency.fastest(aliases)
+    with _turns_lock:
+        key = tuple(aliases)
+        if key not in _turns:
+            _turns[key] = itertools.cycle(aliases)
+        return next(_turns[key])
+
+
+class ReplicaRouter:
+    """
+    Lecturas de los modelos del catálogo a la réplica elegida para la petición; todo lo demás a la base de datos principal.
+    """
+    def db_for_read(self, model, **hints):
+        state = _current.get()
+        if state is None or state.read_alias is None or model._meta.app_label not in REPLICA_APPS:
+            return DEFAULT_DB_ALIAS
+        return state.read_alias
+
+    def db_for_write(self, model, **hints):
+        state = _current.get()
+        if state is not None:
+            # a partir de aquí la petición lee de la principal (para ver lo que escribió) y el visitante queda "pegado" a ella un rato
+            state.wrote = True
+            state.read_alias = None
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # las réplicas tienen los mismos datos que la principal, así que los objetos leídos de cualquiera de ellas se pueden relacionar
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # las réplicas reciben las tablas de la principal por replicación; "migrate --database=<réplica>" no debe tocarlas
+        if db in replica_aliases():
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Elige de dónde lee cada petición y deja la cookie de lectura de lo propio cuando la petición escribe.
+    Funciona con WSGI y con ASGI; en una petición asíncrona los wrappers que miden las réplicas se instalan con sync_to_async,
+    en el hilo donde se ejecutan las consultas (las conexiones de Django son de cada hilo).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replica_aliases():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def measure_replicas():
+        stack = ExitStack()
+        if getattr(settings, 'CATALOG_REPLICA_STRATEGY', 'round_robin') == 'least_latency':
+            for alias in replica_aliases():
+                stack.enter_context(connections[alias].execute_wrapper(latency.wrapper(alias)))
+        return stack
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RoutingState()
+        token = _current.set(state)
+        try:
+            with self.measure_replicas():
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        state = RoutingState()
+        token = _current.set(state)
+        try:
+            stack = await sync_to_async(self.measure_replicas)()
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, state)
+
+    def finish(self, request, response, state):
+        if state.wrote or request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE'):
+            seconds = getattr(settings, 'CATALOG_REPLICA_STICKY_SECONDS', 10)
+            response.set_cookie(sticky_cookie_name(), str(int(time.time()) + seconds),
+                                max_age=seconds, httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _current.get()
+        if state is None or request.method not in ('GET', 'HEAD') or self.sticky(request):
+            return None
+        match = request.resolver_match
+        if match is not None and match.view_name in getattr(settings, 'CATALOG_REPLICA_VIEWS', ()):
+            state.read_alias = choose_replica()
+        return None
+
+    @staticmethod
+    def sticky(request):
+        value = request.COOKIES.get(sticky_cookie_name())
+        try:
+            return value is not None and int(value) > time.time()
+        except ValueError:
+            return False
@@ -0,0 +1,184 @@
+"""
+Búsqueda de texto completo en el catálogo (título, resumen, ISBN, nombre del autor y nombres de los géneros de cada libro).
+
+Un filtro como title__icontains nunca puede usar un índice (LIKE '%texto%'), así que guardamos un "documento" por libro en una tabla
+de búsqueda propia de cada motor de base de datos:
+
+- SQLite: una tabla virtual FTS5 (catalog_book_fts) cuyo rowid es el id del libro. Ordenamos por bm25(), la relevancia que calcula FTS5.
+- PostgreSQL: una tabla catalog_book_search con una columna tsvector y un índice GIN. El título pesa más (A) que el autor y los géneros (B)
+  y que el resumen y el ISBN (C); ordenamos por ts_rank_cd().
+- Cualquier otro motor: no hay índice, se usa icontains sobre los mismos campos y se ordena por título.
+
+El documento mezcla datos de Book, Author y Genre, por eso no basta un índice sobre la tabla de libros: lo mantenemos nosotros desde
+las señales de catalog/signals.py (al guardar/eliminar un libro, al cambiar sus géneros o al renombrar un autor o un género).
+El comando "manage.py rebuild_search_index" vuelve a generar todos los documentos. Las tablas las crea la migración 0010.
+"""
+import re
+
+from django.db import connections
+from django.db.models import Q
+
+from .models import Book
+
+SQLITE_TABLE = 'catalog_book_fts'
+POSTGRES_TABLE = 'catalog_book_search'
+
+# cuántos libros se indexan por consulta al reconstruir el índice o al reindexar todos los libros de un autor
+INDEX_CHUNK_SIZE = 500
+
+
+def write_documents(connection, documents):
+    """
+    Guarda (o reemplaza) los documentos de búsqueda. documents es una lista de tuplas (book_id, title, summary, isbn, author, genres).
+    """
+    if not documents:
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.executemany(f'DELETE FROM {SQLITE_TABLE} WHERE rowid = %s', [(doc[0],) for doc in documents])
+            cursor.executemany(
+                f'INSERT INTO {SQLITE_TABLE} (rowid, title, summary, isbn, author, genres) VALUES (%s, %s, %s, %s, %s, %s)',
+                documents,
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.executemany(
+                f"INSERT INTO {POSTGRES_TABLE} (book_id, document) VALUES (%s, "
+                "setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'C') || "
+                "setweight(to_tsvector('simple', %s), 'C') || setweight(to_tsvector('simple', %s), 'B') || "
+                "setweight(to_tsvector('simple', %s), 'B')) "
+                "ON CONFLICT (book_id) DO UPDATE SET document = EXCLUDED.document",
+                documents,
+            )
+
+
+def delete_documents(connection, book_ids):
+    if not book_ids:
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.executemany(f'DELETE FROM {SQLITE_TABLE} WHERE rowid = %s', [(book_id,) for book_id in book_ids])
+        elif connection.vendor == 'postgresql':
+            cursor.executemany(f'DELETE FROM {POSTGRES_TABLE} WHERE book_id = %s', [(book_id,) for book_id in book_ids])
+
+
+def book_document(book):
+    """
+    Documento de búsqueda de un libro (con su autor y géneros ya cargados).
+    """
+    author = f'{book.author.first_name} {book.author.last_name}' if book.author else ''
+    genres = ' '.join(genre.name for genre in book.genre.all())
+    return (book.pk, book.title, book.summary, book.isbn, author, genres)
+
+
+def index_books(book_ids):
+    """
+    Vuelve a generar los documentos de los libros indicados. Los ids que ya no existen se quitan del índice.
+    """
+    book_ids = list(book_ids)
+    connection = connections[Book.objects.db]
+    for start in range(0, len(book_ids), INDEX_CHUNK_SIZE):
+        chunk = book_ids[start:start + INDEX_CHUNK_SIZE]
+        books = Book.objects.filter(pk__in=chunk).select_related('author').prefetch_related('genre')
+        documents = [book_document(book) for book in books]
+        delete_documents(connection, set(chunk) - {doc[0] for doc in documents})
+        write_documents(connection, documents)
+
+
+def remove_books(book_ids):
+    delete_documents(connections[Book.objects.db], list(book_ids))
+
+
+def rebuild_index():
+    """
+    Vacía la tabla de búsqueda y vuelve a indexar todos los libros. Devuelve cuántos se indexaron.
+    """
+    connection = connections[Book.objects.db]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM {SQLITE_TABLE}')
+        elif connection.vendor == 'postgresql':
+            cursor.execute(f'DELETE FROM {POSTGRES_TABLE}')
+    book_ids = list(Book.objects.order_by('pk').values_list('pk', flat=True))
+    index_books(book_ids)
+    return len(book_ids)
+
+
+def fts5_query(text):
+    """
+    Convierte lo que escribió el usuario en una consulta FTS5 segura: cada palabra entre comillas (así los caracteres especiales
+    de FTS5 no se interpretan) y con * para que también coincidan las palabras que empiezan así. Todas las palabras deben aparecer.
+    """
+    words = re.findall(r'\w+', text)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+class SearchResults:
+    """
+    Resultados de una búsqueda, ordenados por relevancia. Se comporta lo suficiente como un queryset para que el Paginator de Django
+    (y por tanto ListView) lo pueda paginar: count() cuenta las coincidencias y al pedir una porción [inicio:fin] solo se consultan
+    los ids de esa página en la tabla de búsqueda y luego esos libros (con su autor) en una segunda consulta.
+    """
+    model = Book
+
+    def __init__(self, text):
+        self.text = text.strip()
+        self.connection = connections[Book.objects.db]
+
+    def _fallback_queryset(self):
+        condition = Q()
+        for word in self.text.split():
+            condition &= (
+                Q(title__icontains=word) | Q(summary__icontains=word) | Q(isbn__icontains=word)
+                | Q(author__first_name__icontains=word) | Q(author__last_name__icontains=word) | Q(genre__name__icontains=word)
+            )
+        return Book.objects.filter(condition).distinct()
+
+    def count(self):
+        if not self.text:
+            return 0
+        vendor = self.connection.vendor
+        if vendor == 'sqlite':
+            query = fts5_query(self.text)
+            if not query:
+                return 0
+            sql, params = f'SELECT COUNT(*) FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s', [query]
+        elif vendor == 'postgresql':
+            sql, params = f"SELECT COUNT(*) FROM {POSTGRES_TABLE} WHERE document @@ websearch_to_tsquery('simple', %s)", [self.text]
+        else:
+            return self._fallback_queryset().count()
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchone()[0]
+
+    def ids(self, offset, limit):
+        """
+        Ids de los libros de la porción pedida, en orden de relevancia.
+        """
+        vendor = self.connection.vendor
+        if vendor == 'sqlite':
+            query = fts5_query(self.text)
+            if not query:
+                return []
+            # los pesos de bm25 van en el orden de las columnas: title, summary, isbn, author, genres
+            sql = (f'SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s '
+                   f'ORDER BY bm25({SQLITE_TABLE}, 10.0, 1.0, 5.0, 4.0, 2.0), rowid LIMIT %s OFFSET %s')
+            params = [query, limit, offset]
+        elif vendor == 'postgresql':
+            sql = (f"SELECT book_id FROM {POSTGRES_TABLE}, websearch_to_tsquery('simple', %s) AS query "
+                   "WHERE document @@ query ORDER BY ts_rank_cd(document, query) DESC, book_id LIMIT %s OFFSET %s")
+            params = [self.text, limit, offset]
+        else:
+            return list(self._fallback_queryset().order_by('title', 'pk').values_list('pk', flat=True)[offset:offset + limit])
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        offset = index.start or 0
+        if not self.text or index.stop is None or index.stop <= offset:
+            return []
+        ids = self.ids(offset, index.stop - offset)
+        books = Book.objects.select_related('author').in_bulk(ids)
+        return [books[book_id] for book_id in ids if book_id in books]
@@ -0,0 +1,152 @@
+"""
+Datos sintéticos para pruebas de carga y de rendimiento (los usan los comandos "manage.py seed_catalog" y "manage.py benchmark_catalog").
+
+Generamos filas con el mismo formato que el importador (catalog/importer.py) y las cargamos con CatalogImporter, que ya hace las inserciones
+por lotes con bulk_create() y actualiza a mano los contadores, el índice de búsqueda y las cachés (bulk_create() no envía señales).
+Después creamos los usuarios lectores con bulk_create(), asignamos un prestatario a las copias prestadas con bulk_update() y creamos
+una reserva lista (Hold con status 'r') para cada copia reservada, como haría catalog/holds.py. Las copias reservadas que no pueden
+tener una reserva (sin lectores, o con menos lectores que copias reservadas del libro) quedan disponibles.
+
+Con la misma semilla (seed) se generan siempre los mismos datos, para que dos mediciones sean comparables.
+Se puede llamar varias veces: los ISBN y los nombres de usuario continúan a partir de lo que ya hay.
+"""
+import datetime
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Book, BookInstance, Hold
+from .importer import CatalogImporter
+from .counters import bump_counters, status_change_deltas
+from .stats import invalidate_catalog_stats
+from .caching import invalidate_catalog_pages
+
+WORDS = ('the', 'shadow', 'river', 'night', 'garden', 'empire', 'stone', 'winter', 'secret', 'city', 'fire', 'glass',
+         'silent', 'ocean', 'king', 'memory', 'road', 'light', 'storm', 'house', 'last', 'lost', 'golden', 'wind')
+FIRST_NAMES = ('Ana', 'John', 'María', 'Frank', 'Ursula', 'Jorge', 'Isabel', 'Gabriel', 'Octavia', 'Terry', 'Julio', 'Mary')
+LANGUAGES = ('English', 'Spanish', 'French', 'German')
+GENRES = ('Fantasy', 'Science Fiction', 'Mystery', 'Romance', 'History', 'Poetry', 'Horror', 'Biography')
+
+# proporción de copias en cada estado: la mitad disponibles, un 30% prestadas, el resto en mantenimiento o reservadas
+STATUS_WEIGHTS = (('a', 50), ('o', 30), ('m', 10), ('r', 10))
+
+USERNAME_PREFIX = 'reader'
+
+
+def generate_rows(books, copies_per_book, first_isbn=0, seed=0):
+    """
+    Genera las filas de books libros (en el formato JSONL del importador, con la lista "copies"). Hay un autor por cada 10 libros.
+    Alrededor del 10% de las copias prestadas ya pasaron su fecha de devolución, y parte de las reservadas su fecha límite de recogida.
+    """
+    rng = random.Random(f'{seed}:{first_isbn}') # otra tanda con la misma semilla no repite los mismos libros
+    statuses, weights = zip(*STATUS_WEIGHTS)
+    num_authors = max(1, books // 10)
+    today = datetime.date.today()
+    for number in range(first_isbn, first_isbn + books):
+        author = rng.randrange(num_authors)
+        copies = []
+        for status in rng.choices(statuses, weights, k=copies_per_book):
+            due_back = None
+            if status == 'o':
+                due_back = (today + datetime.timedelta(days=rng.randint(-3, 27))).isoformat()
+            elif status == 'r':
+                # la fecha límite para recoger la copia apartada (ver holds.pickup_deadline())
+                due_back = (today + datetime.timedelta(days=rng.randint(-1, 3))).isoformat()
+            copies.append({'imprint': f'{rng.choice(WORDS).capitalize()} Press, {rng.randint(1950, 2024)}', 'status': status, 'due_back': due_back})
+        yield {
+            'isbn': f'978{number:010d}',
+            'title': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))).capitalize(),
+            'summary': ' '.join(rng.choice(WORDS) for _ in range(40)),
+            'language': rng.choice(LANGUAGES),
+            'author_first_name': FIRST_NAMES[author % len(FIRST_NAMES)],
+            'author_last_name': f'Author{author}',
+            'genres': rng.sample(GENRES, rng.randint(1, 3)),
+            'copies': copies,
+        }
+
+
+def create_readers(count, batch_size=1000):
+    """
+    Crea count usuarios lectores con bulk_create() (sin contraseña utilizable; no hace falta calcular un hash por usuario).
+    Devuelve la lista de sus ids.
+    """
+    first = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+    password = make_password(None)
+    users = [User(username=f'{USERNAME_PREFIX}{number}', password=password) for number in range(first, first + count)]
+    User.objects.bulk_create(users, batch_size=batch_size)
+    return list(User.objects.filter(username__in=[user.username for user in users]).values_list('pk', flat=True))
+
+
+def assign_borrowers(book_id_after, reader_ids, seed=0, batch_size=1000):
+    """
+    Asigna un lector al azar a las copias prestadas sin prestatario de los libros con id mayor que book_id_after (los recién creados).
+    No cambia el estado, así que los contadores no se alteran.
+    """
+    rng = random.Random(seed)
+    copies = (BookInstance.objects.filter(book_id__gt=book_id_after, status='o', borrower__isnull=True)
+              .only('pk').order_by('pk').iterator(chunk_size=batch_size))
+    batch = []
+    for copy in copies:
+        copy.borrower_id = rng.choice(reader_ids)
+        batch.append(copy)
+        if len(batch) >= batch_size:
+            BookInstance.objects.bulk_update(batch, ['borrower'])
+            batch = []
+    if batch:
+        BookInstance.objects.bulk_update(batch, ['borrower'])
+
+
+def assign_holds(book_id_after, reader_ids, seed=0, batch_size=1000):
+    """
+    Crea una reserva lista para cada copia reservada de los libros con id mayor que book_id_after, con un lector al azar distinto
+    para cada copia del mismo libro (un lector solo puede tener una reserva activa por libro). Sin esa reserva expire_holds()
+    y cancel_hold() nunca liberarían la copia, así que las que no tienen lector posible pasan a disponibles.
+    """
+    rng = random.Random(seed)
+    copies = (BookInstance.objects.filter(book_id__gt=book_id_after, status='r')
+              .only('pk', 'book_id').order_by('book_id', 'pk').iterator(chunk_size=batch_size))
+    ready_at = timezone.now()
+    holds, released = [], []
+    book_id, readers = None, []
+    for copy in copies:
+        if copy.book_id != book_id:
+            book_id, readers = copy.book_id, rng.sample(reader_ids, len(reader_ids))
+        if not readers:
+            released.append(copy.pk)
+            continue
+        holds.append(Hold(book_id=copy.book_id, user_id=readers.pop(), status='r', copy_id=copy.pk, ready_at=ready_at))
+        if len(holds) >= batch_size:
+            Hold.objects.bulk_create(holds)
+            holds = []
+    if holds:
+        Hold.objects.bulk_create(holds)
+
+    if released:
+        # update() no envía señales: actualizamos los contadores y las cachés como en catalog/holds.py
+        for start in range(0, len(released), batch_size):
+            BookInstance.objects.filter(pk__in=released[start:start + batch_size]).update(status='a', due_back=None, updated_at=timezone.now())
+        bump_counters(status_change_deltas('r', 'a', len(released)))
+        invalidate_catalog_stats()
+        invalidate_catalog_pages()
+    return len(released)
+
+
+def seed_catalog(books, copies_per_book=3, users=0, seed=0, batch_size=1000, on_batch=None):
+    """
+    Añade al catálogo books libros con copies_per_book copias cada uno, y users usuarios lectores que tienen prestadas las copias prestadas
+    y reservadas las reservadas.
+    Devuelve los totales del importador más 'users'.
+    """
+    last_book_id = Book.objects.aggregate(last=Max('pk'))['last'] or 0
+    first_isbn = Book.objects.count()
+    importer = CatalogImporter(batch_size=batch_size)
+    importer.run(generate_rows(books, copies_per_book, first_isbn=first_isbn, seed=seed), on_batch=on_batch)
+
+    reader_ids = create_readers(users, batch_size=batch_size) if users else []
+    if reader_ids:
+        assign_borrowers(last_book_id, reader_ids, seed=seed, batch_size=batch_size)
+    assign_holds(last_book_id, reader_ids, seed=seed, batch_size=batch_size)
+    return {**importer.totals, 'users': len(reader_ids)}
@@ -0,0 +1,274 @@
+"""
+Receptores de señales del catálogo.
+
+Django envía las señales post_save y post_delete cada vez que se guarda o elimina una instancia de un modelo.
+Las usamos para mantener al día los datos derivados: los contadores desnormalizados (catalog/counters.py)
+y las estadísticas en caché de la página de inicio (catalog/stats.py).
+Estos receptores se conectan en CatalogConfig.ready() (catalog/apps.py), al importar este módulo.
+"""
+from django.db import transaction
+from django.utils import timezone
+from django.db.models.signals import post_init, pre_save, post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import Book, Author, BookInstance, Genre
+from .counters import bump_counters, status_change_deltas, has_the
+from .stats import invalidate_catalog_stats
+from .caching import bump_version, author_books_version_name, invalidate_catalog_pages
+from . import search, autocomplete
+from .holds import allocate_copies_on_commit
+
+
+# Para saber si cambió el estado de una copia (o el título de un libro) necesitamos el valor que tenía al cargarse de la base de datos.
+# post_init se envía al construir cada instancia; leemos de __dict__ para no disparar una consulta si el campo fue diferido con only()/defer().
+# Si el campo estaba diferido no sabemos su valor anterior (NOT_LOADED): pre_save lo lee de la base de datos justo antes de guardar,
+# porque en post_save la fila ya tiene el valor nuevo.
+
+NOT_LOADED = object()
+
+
+def stored_values(instance, fields):
+    """
+    Los valores de fields guardados en la base de datos para instance, o None para todos si la fila todavía no existe.
+    """
+    if instance._state.adding:
+        return dict.fromkeys(fields)
+    stored = type(instance)._base_manager.using(instance._state.db).filter(pk=instance.pk).values(*fields).first()
+    return stored or dict.fromkeys(fields)
+
+
+@receiver(post_init, sender=BookInstance)
+def remember_bookinstance_status(sender, instance, **kwargs):
+    instance._counted_status = instance.__dict__.get('status', NOT_LOADED)
+    instance._original_status = instance._counted_status
+
+
+@receiver(post_init, sender=Book)
+def remember_book_title(sender, instance, **kwargs):
+    instance._counted_title = instance.__dict__.get('title', NOT_LOADED)
+    instance._original_author_id = instance.__dict__.get('author_id', NOT_LOADED)
+
+
+@receiver(pre_save, sender=BookInstance)
+def load_deferred_status(sender, instance, **kwargs):
+    if instance._counted_status is NOT_LOADED or instance._original_status is NOT_LOADED:
+        status = stored_values(instance, ['status'])['status']
+        if instance._counted_status is NOT_LOADED:
+            instance._counted_status = status
+        if instance._original_status is NOT_LOADED:
+            instance._original_status = status
+
+
+@receiver(pre_save, sender=Book)
+def load_deferred_title(sender, instance, **kwargs):
+    fields = [field for field, value in (('title', instance._counted_title), ('author_id', instance._original_author_id))
+              if value is NOT_LOADED]
+    if fields:
+        stored = stored_values(instance, fields)
+        if 'title' in stored:
+            instance._counted_title = stored['title']
+        if 'author_id' in stored:
+            instance._original_author_id = stored['author_id']
+
+
+@receiver(post_save, sender=BookInstance)
+def count_bookinstance_saved(sender, instance, created, **kwargs):
+    old_status = None if created else instance._counted_status
+    if created or old_status != instance.status:
+        bump_counters(status_change_deltas(old_status, instance.status))
+    instance._counted_status = instance.status
+
+
+@receiver(post_delete, sender=BookInstance)
+def count_bookinstance_deleted(sender, instance, **kwargs):
+    bump_counters(status_change_deltas(instance.status, None))
+
+
+@receiver(post_save, sender=Book)
+def count_book_saved(sender, instance, created, **kwargs):
+    deltas = {'books': 1 if created else 0}
+    if created:
+        deltas['books_with_the'] = int(has_the(instance.title))
+    elif 'title' in instance.__dict__:
+        deltas['books_with_the'] = int(has_the(instance.title)) - int(has_the(instance._counted_title))
+    bump_counters(deltas)
+    instance._counted_title = instance.__dict__.get('title', NOT_LOADED)
+
+
+@receiver(post_delete, sender=Book)
+def count_book_deleted(sender, instance, **kwargs):
+    bump_counters({'books': -1, 'books_with_the': -int(has_the(instance.title))})
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Genre)
+def count_created(sender, instance, created, **kwargs):
+    if created:
+        bump_counters({'authors' if sender is Author else 'genres': 1})
+
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Genre)
+def count_deleted(sender, instance, **kwargs):
+    bump_counters({'authors' if sender is Author else 'genres': -1})
+
+
+@receiver([post_save, post_delete], sender=Book)
+@receiver([post_save, post_delete], sender=BookInstance)
+@receiver([post_save, post_delete], sender=Author)
+@receiver([post_save, post_delete], sender=Genre)
+def catalog_stats_changed(sender, **kwargs):
+    """
+    Cualquier alta, cambio o baja de estos modelos puede alterar los contadores de la página de inicio.
+    Borramos la caché ahora y otra vez al confirmar la transacción, por si otra petición la volvió a llenar con los valores anteriores mientras tanto.
+    """
+    invalidate_catalog_stats()
+    transaction.on_commit(invalidate_catalog_stats)
+
+
+@receiver([post_save, post_delete], sender=Book)
+@receiver([post_save, post_delete], sender=BookInstance)
+@receiver([post_save, post_delete], sender=Author)
+@receiver([post_save, post_delete], sender=Genre)
+@receiver(m2m_changed, sender=Book.genre.through)
+def catalog_pages_changed(sender, **kwargs):
+    """
+    Invalida las páginas y fragmentos del catálogo guardados en caché (ver cache_anonymous_page en catalog/caching.py).
+    Igual que con las estadísticas, otra vez al confirmar la transacción por si otra petición guardó la página anterior mientras tanto.
+    """
+    if kwargs.get('action', 'post_').startswith('post_'):
+        invalidate_catalog_pages()
+        transaction.on_commit(invalidate_catalog_pages)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def author_books_changed(sender, instance, **kwargs):
+    """
+    Invalida la lista de libros en caché del autor del libro y, si el libro cambió de autor, también la del autor anterior.
+    Se invalida al confirmar la transacción: antes, otra petición podría volver a guardar en caché la lista sin el cambio.
+    """
+    for author_id in {instance._original_author_id, instance.__dict__.get('author_id', NOT_LOADED)}:
+        if author_id is not None and author_id is not NOT_LOADED:
+            transaction.on_commit(lambda author_id=author_id: bump_version(author_books_version_name(author_id)))
+    instance._original_author_id = instance.__dict__.get('author_id', NOT_LOADED)
+
+
+# Índice de búsqueda de texto completo (catalog/search.py). El documento de cada libro incluye el nombre de su autor y de sus géneros,
+# así que también hay que reindexar los libros afectados cuando cambian esos modelos.
+
+@receiver(post_save, sender=Book)
+def search_index_book_saved(sender, instance, **kwargs):
+    search.index_books([instance.pk])
+
+
+@receiver(post_delete, sender=Book)
+def search_index_book_deleted(sender, instance, **kwargs):
+    search.remove_books([instance.pk])
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def search_index_genres_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        search.index_books([instance.pk])
+    elif pk_set:
+        search.index_books(pk_set)
+    else:
+        # genre.book_set.clear(): en post_clear ya no sabemos qué libros tenía, los guardamos en pre_clear
+        search.index_books(getattr(instance, '_search_book_ids', []))
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def search_remember_cleared_books(sender, instance, action, reverse, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._search_book_ids = list(instance.book_set.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Author)
+@receiver(pre_delete, sender=Genre)
+def search_remember_related_books(sender, instance, **kwargs):
+    # al eliminar un autor o un género sus libros pierden la relación sin enviar señales, así que guardamos antes qué libros reindexar
+    instance._search_book_ids = list(instance.book_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Genre)
+def search_index_related_books(sender, instance, created=False, **kwargs):
+    if created:
+        return # un autor o género nuevo todavía no tiene libros
+    book_ids = getattr(instance, '_search_book_ids', None)
+    if book_ids is None:
+        book_ids = instance.book_set.values_list('pk', flat=True)
+    search.index_books(book_ids)
+
+
+# Fecha de modificación de los libros (Book.updated_at), que usan las respuestas condicionales de catalog/conditional.py.
+# El detalle de un libro también muestra sus copias, sus géneros y el nombre de su autor: cuando cambian, marcamos el libro como modificado
+# con un UPDATE (que no envía señales, así que no vuelve a disparar los receptores de Book).
+
+def touch_books(book_ids):
+    book_ids = [book_id for book_id in book_ids if book_id is not None]
+    if book_ids:
+        Book.objects.filter(pk__in=book_ids).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=BookInstance)
+@receiver(post_delete, sender=BookInstance)
+def touch_book_of_copy(sender, instance, **kwargs):
+    touch_books([instance.book_id])
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def touch_books_genres_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        touch_books([instance.pk])
+    else:
+        # instance es un género; en post_clear los libros que tenía los guardó search_remember_cleared_books
+        touch_books(pk_set or getattr(instance, '_search_book_ids', []))
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Genre)
+def touch_books_of_related(sender, instance, created=False, **kwargs):
+    # un género renombrado, o un autor o género eliminado (los libros lo pierden sin enviar señales; los guardó search_remember_related_books)
+    if created:
+        return
+    book_ids = getattr(instance, '_search_book_ids', None)
+    if book_ids is None:
+        book_ids = instance.book_set.values_list('pk', flat=True)
+    touch_books(book_ids)
+
+
+# Índice en memoria del autocompletado (catalog/autocomplete.py)
+
+@receiver(post_save, sender=Book)
+def autocomplete_book_saved(sender, instance, **kwargs):
+    autocomplete.update_entry(autocomplete.BOOK, instance.pk, instance.title)
+
+
+@receiver(post_save, sender=Author)
+def autocomplete_author_saved(sender, instance, **kwargs):
+    autocomplete.update_entry(autocomplete.AUTHOR, instance.pk, autocomplete.author_label(instance.last_name, instance.first_name))
+
+
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Author)
+def autocomplete_entry_deleted(sender, instance, **kwargs):
+    autocomplete.remove_entry(autocomplete.BOOK if sender is Book else autocomplete.AUTHOR, instance.pk)
+
+
+# Reservas (catalog/holds.py): cuando una copia queda disponible (nueva, devuelta o de vuelta de mantenimiento) se la damos
+# a la primera reserva en espera de su libro, después de confirmar la transacción que la dejó disponible.
+
+@receiver(post_save, sender=BookInstance)
+def allocate_available_copy(sender, instance, created, **kwargs):
+    if instance.status == 'a' and (created or instance._original_status != 'a'):
+        allocate_copies_on_commit([instance.book_id])
+    instance._original_status = instance.status
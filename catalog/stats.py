@@ -0,0 +1,47 @@
+"""
+Estadísticas del catálogo que se muestran en la página de inicio (vista index).
+
+Antes la vista index hacía seis consultas COUNT separadas en cada visita. Ahora los totales se leen de la tabla de contadores
+desnormalizados (CatalogCounter, ver catalog/counters.py) con una sola consulta que no depende del tamaño del catálogo, y el resultado
+se guarda en la caché de Django durante CATALOG_STATS_TIMEOUT segundos. Las señales de catalog/signals.py borran la entrada de la caché
+cuando cambia un Book, BookInstance, Author o Genre, así que los números nunca quedan desactualizados por mucho tiempo.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .counters import read_counters, copies_counter
+
+STATS_CACHE_KEY = 'catalog:stats'
+
+
+def compute_catalog_stats():
+    """
+    Devuelve los contadores con los nombres que usa la plantilla index.html.
+    """
+    counters = read_counters()
+    return {
+        'num_books': counters['books'],
+        'num_instances': counters['copies'],
+        'num_instances_available': counters[copies_counter('a')],
+        'num_authors': counters['authors'],
+        'num_genres': counters['genres'],
+        'num_books_with_the': counters['books_with_the'],
+    }
+
+
+def get_catalog_stats():
+    """
+    Devuelve los contadores desde la caché, leyéndolos de la base de datos solo si no están (o si expiró el TTL).
+    """
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        stats = compute_catalog_stats()
+        cache.set(STATS_CACHE_KEY, stats, getattr(settings, 'CATALOG_STATS_TIMEOUT', 300))
+    return stats
+
+
+def invalidate_catalog_stats():
+    """
+    Borra los contadores de la caché, la próxima visita a index los volverá a leer.
+    """
+    cache.delete(STATS_CACHE_KEY)
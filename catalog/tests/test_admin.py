@@ -0,0 +1,159 @@
+from django.test import TestCase
+
+import datetime
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog.models import Author, Book, BookInstance, Genre
+
+# Pruebas del sitio de administración: las listas (changelists) deben hacer el mismo número de consultas sin importar cuántas filas muestran,
+# y los formularios no deben cargar todas las filas de otra tabla en un <select>.
+
+class AdminQueryCountTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='1X<ISRUkw+tuK')
+        cls.genres = [Genre.objects.create(name=name) for name in ('Fantasy', 'Adventure', 'Poetry', 'Horror')]
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.number = 0
+
+    def add_books(self, count):
+        for _ in range(count):
+            self.number += 1
+            author = Author.objects.create(first_name='John', last_name=f'Author {self.number}')
+            book = Book.objects.create(title=f'Book {self.number}', summary='Summary', isbn=f'{self.number}', author=author)
+            book.genre.set(self.genres)
+            borrower = User.objects.create_user(username=f'reader{self.number}')
+            BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=borrower,
+                                        due_back=datetime.date.today() + datetime.timedelta(days=self.number))
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def assertConstantQueries(self, url, rows):
+        self.add_books(2)
+        few, _ = self.count_queries(url)
+        self.add_books(20)
+        many, response = self.count_queries(url)
+        self.assertEqual(many, few)
+        self.assertEqual(len(response.context['cl'].result_list), rows(22))
+        return response
+
+    def test_book_changelist(self):
+        response = self.assertConstantQueries(reverse('admin:catalog_book_changelist'), lambda total: total)
+        # los géneros salen del prefetch (solo los tres primeros, como antes)
+        self.assertContains(response, 'Fantasy, Adventure, Poetry')
+
+    def test_bookinstance_changelist(self):
+        self.assertConstantQueries(reverse('admin:catalog_bookinstance_changelist'), lambda total: total)
+        # con un filtro tampoco se cuenta la tabla entera para mostrar el total
+        self.assertConstantQueries(reverse('admin:catalog_bookinstance_changelist') + '?status__exact=o', lambda total: 22 + total)
+
+    def test_author_changelist(self):
+        self.assertConstantQueries(reverse('admin:catalog_author_changelist'), lambda total: total)
+
+    def test_no_full_result_count(self):
+        self.add_books(3)
+        response = self.client.get(reverse('admin:catalog_bookinstance_changelist') + '?q=x&status__exact=o')
+        self.assertFalse(response.context['cl'].show_full_result_count)
+
+    def test_foreign_keys_use_autocomplete(self):
+        self.add_books(5)
+        copy = BookInstance.objects.first()
+        response = self.client.get(reverse('admin:catalog_bookinstance_change', args=[copy.pk]))
+        content = response.content.decode()
+        # el <select> solo tiene la opción elegida; las demás se buscan con el autocompletado
+        self.assertIn('admin-autocomplete', content)
+        self.assertNotIn('Book 5</option>', content)
+        self.assertNotIn('reader5</option>', content)
+
+        response = self.client.get(reverse('admin:catalog_book_change', args=[copy.book.pk]))
+        self.assertNotIn('reader5</option>', response.content.decode())
+
+        # el autocompletado de libros busca por título
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'catalog', 'model_name': 'bookinstance', 'field_name': 'book', 'term': 'Book 3'})
+        self.assertEqual([result['text'] for result in response.json()['results']], ['Book 3'])
+
+
+class AdminRelatedRowsTest(TestCase):
+    """
+    Las copias de un libro y los libros de un autor no se dibujan en el formulario de cambio, sino en páginas que se cargan aparte.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='1X<ISRUkw+tuK')
+        cls.genre = Genre.objects.create(name='Fantasy')
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='Book 0', summary='Summary', isbn='0', author=cls.author)
+        for number in range(1, 31):
+            book = Book.objects.create(title=f'Book {number}', summary='Summary', isbn=f'{number}', author=cls.author)
+            book.genre.set([cls.genre])
+        cls.readers = [User.objects.create_user(username=f'reader{number}') for number in range(60)]
+        for number, reader in enumerate(cls.readers):
+            BookInstance.objects.create(book=cls.book, imprint=f'Imprint {number}', status='o', borrower=reader,
+                                        due_back=datetime.date.today() + datetime.timedelta(days=number))
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def related_url(self, model, obj, name):
+        return reverse(f'admin:catalog_{model}_related', args=[obj.pk, name])
+
+    def test_change_form_does_not_render_related_rows(self):
+        response = self.client.get(reverse('admin:catalog_book_change', args=[self.book.pk]))
+        content = response.content.decode()
+        self.assertNotIn('Imprint 5', content)
+        self.assertIn(f'data-related-url="{self.related_url("book", self.book, "copies")}"', content)
+        self.assertIn('js/admin_related.', content)
+
+        response = self.client.get(reverse('admin:catalog_author_change', args=[self.author.pk]))
+        self.assertNotIn('Book 7', response.content.decode())
+
+    def test_related_pages(self):
+        url = self.related_url('book', self.book, 'copies')
+        with CaptureQueriesContext(connection) as first:
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['rows']), 25)
+        self.assertContains(response, 'reader0')
+        self.assertContains(response, f'{url}?page=2')
+        self.assertContains(response, f"?book={self.book.pk}")
+
+        with CaptureQueriesContext(connection) as last:
+            response = self.client.get(url, {'page': 3})
+        self.assertEqual(len(response.context['rows']), 10)
+        self.assertContains(response, 'reader59')
+        self.assertNotContains(response, 'reader0<')
+        # los prestatarios vienen con select_related: las mismas consultas para 25 filas que para 10
+        self.assertEqual(len(first.captured_queries), len(last.captured_queries))
+
+        url = self.related_url('author', self.author, 'books')
+        with CaptureQueriesContext(connection) as first:
+            self.client.get(url)
+        with CaptureQueriesContext(connection) as last:
+            response = self.client.get(url, {'page': 2})
+        self.assertEqual(len(response.context['rows']), 6)
+        self.assertContains(response, 'Fantasy')
+        self.assertEqual(len(first.captured_queries), len(last.captured_queries))
+
+    def test_related_view_errors(self):
+        self.assertEqual(self.client.get(self.related_url('book', self.book, 'unknown')).status_code, 404)
+        self.assertEqual(self.client.get(reverse('admin:catalog_book_related', args=[12345, 'copies'])).status_code, 404)
+
+        # sin permiso para ver las copias
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(self.related_url('book', self.book, 'copies')).status_code, 404)
+
+        self.client.logout()
+        response = self.client.get(self.related_url('book', self.book, 'copies'))
+        self.assertEqual(response.status_code, 302)
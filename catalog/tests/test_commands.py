@@ -0,0 +1,256 @@
+from django.test import TestCase
+
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from catalog.models import Author, Book, BookInstance, Genre, Hold
+from catalog.counters import read_counters, count_from_scratch
+from catalog.search import SearchResults
+from catalog.caching import get_version, author_books_version_name
+
+# Pruebas de los comandos de administración del catálogo (python manage.py <comando>). Los llamamos con call_command()
+# y comprobamos lo que quedó en la base de datos y lo que escribieron en la salida.
+
+class ImportCatalogCommandTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        Author.objects.create(first_name='John', last_name='Tolkien')
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as target:
+            target.write(content)
+        return path
+
+    def test_import_csv(self):
+        path = self.write('catalog.csv',
+            'isbn,title,summary,language,author_first_name,author_last_name,genres,imprint,status,due_back\n'
+            '111,The Hobbit,Summary,English,John,Tolkien,Fantasy;Adventure,First edition,a,\n'
+            '111,The Hobbit,Summary,English,John,Tolkien,Fantasy,Second edition,o,2030-01-01\n'
+            '222,Dune,Summary,English,Frank,Herbert,Science Fiction,,,\n')
+        out = StringIO()
+        call_command('import_catalog', path, '--batch-size', '2', stdout=out)
+
+        self.assertEqual(Book.objects.count(), 2)
+        self.assertEqual(Author.objects.count(), 2) # Tolkien ya existía
+        hobbit = Book.objects.get(isbn='111')
+        self.assertEqual(hobbit.author.last_name, 'Tolkien')
+        self.assertEqual(sorted(hobbit.genre.values_list('name', flat=True)), ['Adventure', 'Fantasy'])
+        self.assertEqual(hobbit.bookinstance_set.count(), 2)
+        self.assertIn('filas/s', out.getvalue())
+
+        # lo que mantienen las señales también se actualizó
+        self.assertEqual(read_counters(), count_from_scratch())
+        self.assertEqual(SearchResults('herbert').count(), 1)
+        self.assertFalse(os.path.exists(path + '.progress'))
+
+    def test_import_jsonl_updates_existing_isbn(self):
+        Book.objects.create(title='Old title', summary='Old', isbn='111')
+        path = self.write('catalog.jsonl', '\n'.join(json.dumps(row) for row in [
+            {'isbn': '111', 'title': 'New title', 'summary': 'New', 'language': 'English', 'genres': ['Fantasy'],
+             'copies': [{'imprint': 'A', 'status': 'a'}, {'imprint': 'B', 'status': 'm'}]},
+        ]))
+        call_command('import_catalog', path, stdout=StringIO())
+
+        book = Book.objects.get(isbn='111')
+        self.assertEqual(book.title, 'New title')
+        self.assertEqual(Book.objects.count(), 1)
+        self.assertEqual(book.bookinstance_set.count(), 2)
+        self.assertEqual(read_counters(), count_from_scratch())
+
+    def test_author_book_lists_invalidated_on_commit(self):
+        tolkien = Author.objects.get(last_name='Tolkien')
+        name = author_books_version_name(tolkien.pk)
+        version = get_version(name)
+        path = self.write('catalog.csv', 'isbn,title,summary,language,author_first_name,author_last_name,genres,imprint,status,due_back\n'
+                                         '111,The Hobbit,Summary,English,John,Tolkien,,,,\n')
+        with self.captureOnCommitCallbacks() as callbacks:
+            call_command('import_catalog', path, stdout=StringIO())
+        # la prueba corre dentro de una transacción: hasta confirmarla la versión no cambia
+        self.assertEqual(get_version(name), version)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(get_version(name), version + 1)
+
+    def test_resume_after_failure(self):
+        rows = ''.join(f'{n},Book {n},Summary,English,John,Tolkien,,Imprint,a,\n' for n in range(6))
+        path = self.write('catalog.csv', 'isbn,title,summary,language,author_first_name,author_last_name,genres,imprint,status,due_back\n' + rows)
+
+        # el segundo lote falla: el primero ya está confirmado y guardado en el archivo .progress
+        from catalog.importer import CatalogImporter
+        original = CatalogImporter.import_batch
+        calls = []
+        def failing_batch(importer, batch):
+            calls.append(batch)
+            if len(calls) == 2:
+                raise ValueError('fallo simulado')
+            return original(importer, batch)
+
+        with mock.patch.object(CatalogImporter, 'import_batch', failing_batch):
+            with self.assertRaises(CommandError):
+                call_command('import_catalog', path, '--batch-size', '2', stdout=StringIO())
+        self.assertEqual(Book.objects.count(), 2)
+
+        call_command('import_catalog', path, '--batch-size', '2', '--resume', stdout=StringIO())
+        self.assertEqual(Book.objects.count(), 6)
+        self.assertEqual(BookInstance.objects.count(), 6)
+
+    def test_invalid_copy_status(self):
+        header = 'isbn,title,summary,language,author_first_name,author_last_name,genres,imprint,status,due_back\n'
+        path = self.write('catalog.csv', header + '1,Book 1,Summary,English,John,Tolkien,,Imprint,a,\n2,Book 2,Summary,English,John,Tolkien,,Imprint,x,\n')
+        with self.assertRaisesMessage(CommandError, "línea 3: estado de copia no válido: 'x'"):
+            call_command('import_catalog', path, stdout=StringIO())
+
+        # un valor más largo que el campo tampoco llega a la base de datos (daría DataError en vez de un error del comando)
+        path = self.write('catalog.jsonl', '{"isbn": "3", "title": "Book 3", "imprint": "Imprint", "status": "available"}\n')
+        with self.assertRaisesMessage(CommandError, "línea 1: estado de copia no válido: 'available'"):
+            call_command('import_catalog', path, stdout=StringIO())
+
+        self.assertFalse(BookInstance.objects.exists())
+        self.assertEqual(read_counters(), count_from_scratch())
+
+
+from catalog.export import export_rows
+
+class ExportCatalogCommandTest(TestCase):
+
+    def setUp(self):
+        author = Author.objects.create(first_name='John', last_name='Tolkien')
+        fantasy = Genre.objects.create(name='Fantasy')
+        for number in range(5):
+            book = Book.objects.create(title=f'Book {number}', summary='Summary', isbn=f'{number}', author=author, language='English')
+            book.genre.add(fantasy)
+            BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+
+    def test_one_genre_query_per_chunk(self):
+        # una consulta para los libros y una por cada bloque de 2 libros para sus géneros, no una por libro
+        with self.assertNumQueries(1 + 3):
+            rows = list(export_rows('books', chunk_size=2))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0][-1], ['Fantasy'])
+
+    def test_export_to_stdout(self):
+        out = StringIO()
+        call_command('export_catalog', 'copies', '--format', 'jsonl', stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['status'], 'a')
+
+    def test_export_gzip_file(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'books.csv.gz')
+        call_command('export_catalog', 'books', '--gzip', '--output', path, stderr=StringIO())
+        with gzip.open(path, 'rt', encoding='utf-8') as source:
+            content = source.read()
+        self.assertIn('Book 4', content)
+
+        with self.assertRaises(CommandError):
+            call_command('export_catalog', 'books', '--gzip')
+
+
+from django.contrib.auth.models import User
+
+class SeedCatalogCommandTest(TestCase):
+
+    def test_seed_catalog(self):
+        out = StringIO()
+        call_command('seed_catalog', '--books', '30', '--copies-per-book', '2', '--users', '5', '--batch-size', '10', stdout=out)
+
+        self.assertEqual(Book.objects.count(), 30)
+        self.assertEqual(BookInstance.objects.count(), 60)
+        self.assertEqual(User.objects.filter(username__startswith='reader').count(), 5)
+        self.assertFalse(BookInstance.objects.filter(status='o', borrower__isnull=True).exists())
+        # cada copia reservada tiene su reserva lista, así expire_holds() y cancel_hold() la pueden liberar
+        self.assertTrue(BookInstance.objects.filter(status='r').exists())
+        self.assertFalse(BookInstance.objects.filter(status='r').exclude(hold__status='r').exists())
+        self.assertEqual(Hold.objects.filter(status='r').count(), BookInstance.objects.filter(status='r').count())
+        # bulk_create() no envía señales: el importador mantiene los contadores
+        self.assertEqual(read_counters(), count_from_scratch())
+        self.assertIn('Libros: 30', out.getvalue())
+
+        # una segunda tanda añade libros nuevos (ISBN y lectores distintos) en lugar de actualizar los anteriores
+        call_command('seed_catalog', '--books', '10', '--users', '2', stdout=StringIO())
+        self.assertEqual(Book.objects.count(), 40)
+        self.assertEqual(Book.objects.values('isbn').distinct().count(), 40)
+        self.assertEqual(User.objects.filter(username__startswith='reader').count(), 7)
+
+        # sin lectores no puede haber reservas, así que las copias reservadas quedan disponibles
+        call_command('seed_catalog', '--books', '20', stdout=StringIO())
+        self.assertFalse(BookInstance.objects.filter(status='r', book__isbn__gte='978%010d' % 40).exists())
+        self.assertFalse(BookInstance.objects.filter(status='r').exclude(hold__status='r').exists())
+        self.assertEqual(read_counters(), count_from_scratch())
+
+
+from catalog.benchmark import run_benchmark, compare_results, percentile
+
+class BenchmarkTest(TestCase):
+
+    def test_run_benchmark(self):
+        result = run_benchmark([5, 10], requests=3, warmup=0, names=['index', 'books', 'book-detail', 'search'])
+
+        self.assertEqual(Book.objects.count(), 10)
+        self.assertEqual(sorted(result['results']), ['10', '5'])
+        stats = result['results']['10']['book-detail']
+        self.assertEqual(stats['status'], [200])
+        self.assertTrue(stats['url'].startswith('/catalog/book/'))
+        self.assertLessEqual(stats['p50_ms'], stats['p95_ms'])
+        self.assertLessEqual(stats['p95_ms'], stats['p99_ms'])
+        self.assertGreater(stats['queries'], 0)
+        self.assertEqual(result['results']['5']['search']['url'], '/catalog/search/?q=shadow')
+        json.dumps(result) # el resultado se puede guardar como JSON
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+
+    def test_compare_results(self):
+        def result(p95, queries):
+            return {'results': {'100': {'books': {'p95_ms': p95, 'queries': queries}}}}
+
+        self.assertEqual(compare_results(result(10, 3), result(11, 3)), []) # +10%, dentro del umbral
+        self.assertEqual(compare_results(result(0.5, 3), result(1.0, 3)), []) # +100% pero menos de 1 ms
+        self.assertEqual(len(compare_results(result(10, 3), result(15, 3))), 1)
+        self.assertEqual(len(compare_results(result(10, 3), result(10, 4))), 1)
+        self.assertEqual(compare_results(result(10, 3), {'results': {'200': {'books': {'p95_ms': 50, 'queries': 9}}}}), [])
+
+
+import datetime
+from catalog.models import OverdueSnapshot
+
+class SnapshotOverdueLoansCommandTest(TestCase):
+
+    def test_snapshot(self):
+        book = Book.objects.create(title='Book', summary='Summary', isbn='111')
+        reader = User.objects.create_user(username='reader')
+        today = datetime.date.today()
+        for days in (-5, -1, 2, 20):
+            BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=reader, due_back=today + datetime.timedelta(days=days))
+        BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+
+        out = StringIO()
+        call_command('snapshot_overdue_loans', stdout=out)
+        snapshot = OverdueSnapshot.objects.get(date=today)
+        self.assertEqual((snapshot.on_loan, snapshot.overdue, snapshot.due_soon, snapshot.borrowers_overdue), (4, 2, 1, 1))
+        self.assertIn('2 copias atrasadas de 4', out.getvalue())
+
+        # volver a ejecutarlo el mismo día reemplaza el resumen; con --date se calcula otro día
+        call_command('snapshot_overdue_loans', '--due-soon-days', '30', stdout=StringIO())
+        self.assertEqual(OverdueSnapshot.objects.get(date=today).due_soon, 2)
+        call_command('snapshot_overdue_loans', '--date', (today + datetime.timedelta(days=3)).isoformat(), stdout=StringIO())
+        self.assertEqual(OverdueSnapshot.objects.count(), 2)
+        self.assertEqual(OverdueSnapshot.objects.first().overdue, 3)
+
+        with self.assertRaises(CommandError):
+            call_command('snapshot_overdue_loans', '--date', 'ayer')
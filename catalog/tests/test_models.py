@@ -73,3 +73,313 @@ class AuthorModelTest(TestCase):
         author=Author.objects.get(id=1)
         #Esto también fallará si la urlconf no está definida.
         self.assertEquals(author.get_absolute_url(),'/catalog/author/1')
+
+
+# Los contadores desnormalizados (CatalogCounter) se actualizan con señales al crear, cambiar o eliminar registros.
+# Comprobamos que siempre coinciden con el conteo real de las tablas.
+
+from io import StringIO
+from django.core.management import call_command
+from catalog.models import Book, BookInstance, Genre, CatalogCounter
+from catalog.counters import read_counters, count_from_scratch
+from catalog.caching import get_version, author_books_version_name
+
+class CatalogCounterTest(TestCase):
+
+    def setUp(self):
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+        Genre.objects.create(name='Fantasy')
+        self.book = Book.objects.create(title='The Book', summary='My book summary', isbn='ABCDEFG', author=self.author)
+        for status in ('a', 'a', 'o', 'm'):
+            BookInstance.objects.create(book=self.book, imprint='Unlikely Imprint, 2016', status=status)
+
+    def test_counters_match_tables_after_create(self):
+        self.assertEqual(read_counters(), count_from_scratch())
+        self.assertEqual(read_counters()['copies_a'], 2)
+
+    def test_counters_follow_status_change(self):
+        copy = BookInstance.objects.filter(status='a').first()
+        copy.status = 'o'
+        copy.save()
+        counters = read_counters()
+        self.assertEqual(counters['copies_a'], 1)
+        self.assertEqual(counters['copies_o'], 2)
+        self.assertEqual(counters['copies'], 4)
+
+    def test_counters_follow_title_change_and_cascade_delete(self):
+        self.book.title = 'A Book'
+        self.book.save()
+        self.assertEqual(read_counters()['books_with_the'], 0)
+
+        self.book.delete() # elimina también las copias en cascada
+        self.assertEqual(read_counters(), count_from_scratch())
+        self.assertEqual(read_counters()['copies'], 0)
+
+    def test_counters_follow_deferred_status_change(self):
+        # el estado no se cargó (only()), así que su valor anterior se lee de la base de datos al guardar
+        copy = BookInstance.objects.filter(status='a').only('id').first()
+        copy.status = 'o'
+        copy.save()
+        self.assertEqual(read_counters(), count_from_scratch())
+        self.assertEqual(read_counters()['copies_a'], 1)
+
+        # guardar sin tocar el estado diferido no cambia los contadores
+        BookInstance.objects.filter(status='m').only('id', 'imprint').first().save()
+        self.assertEqual(read_counters(), count_from_scratch())
+
+    def test_counters_follow_deferred_title_change(self):
+        book = Book.objects.only('id').get(pk=self.book.pk)
+        book.title = 'A Book'
+        book.save()
+        self.assertEqual(read_counters()['books_with_the'], 0)
+        self.assertEqual(read_counters(), count_from_scratch())
+
+        book = Book.objects.defer('title').get(pk=self.book.pk)
+        book.summary = 'Another summary'
+        book.save()
+        self.assertEqual(read_counters(), count_from_scratch())
+
+    def test_rebuild_command_reports_and_fixes_drift(self):
+        CatalogCounter.objects.filter(name='copies').update(value=100)
+        out = StringIO()
+        call_command('rebuild_catalog_counters', stdout=out)
+        self.assertIn('copies: 100 -> 4', out.getvalue())
+        self.assertEqual(read_counters(), count_from_scratch())
+
+    def test_author_books_version_bumped_on_commit(self):
+        # la lista de libros del autor en caché se invalida al confirmar la transacción, no antes
+        name = author_books_version_name(self.author.pk)
+        version = get_version(name)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.title = 'A Book'
+            self.book.save()
+            self.assertEqual(get_version(name), version)
+        self.assertEqual(get_version(name), version + 1)
+
+
+# Los índices de Meta.indexes deben cubrir las consultas de las listas de préstamos. Le pedimos a la base de datos su plan de ejecución
+# (QuerySet.explain(), es decir EXPLAIN) y comprobamos que usa alguno de nuestros índices en lugar de recorrer la tabla.
+
+import datetime
+import unittest
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import F
+
+LOAN_INDEXES = ('bookinstance_status_due_idx', 'bookinstance_borrower_idx', 'bookinstance_on_loan_idx')
+
+class BookInstanceIndexTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser1', password='12345')
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        for copy_num in range(50):
+            BookInstance.objects.create(book=book, imprint='Imprint', status='o' if copy_num % 5 == 0 else 'a',
+                                        due_back=datetime.date.today() + datetime.timedelta(days=copy_num), borrower=cls.user)
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            # con tan pocas filas PostgreSQL prefiere recorrer la tabla; lo desactivamos para ver qué índice elegiría
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def assertUsesLoanIndex(self, plan):
+        self.assertTrue(any(name in plan for name in LOAN_INDEXES), plan)
+
+    @unittest.skipUnless(connection.vendor in ('sqlite', 'postgresql'), 'EXPLAIN solo se revisa en SQLite y PostgreSQL')
+    def test_all_borrowed_uses_index(self):
+        self.assertUsesLoanIndex(self.explain(BookInstance.objects.filter(status__exact='o').order_by('due_back')))
+
+    @unittest.skipUnless(connection.vendor in ('sqlite', 'postgresql'), 'EXPLAIN solo se revisa en SQLite y PostgreSQL')
+    def test_borrowed_by_user_uses_index(self):
+        plan = self.explain(BookInstance.objects.filter(borrower=self.user).filter(status__exact='o').order_by('due_back'))
+        self.assertUsesLoanIndex(plan)
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'El plan de SQLite dice si necesita ordenar aparte')
+    def test_loan_list_pages_do_not_sort(self):
+        # la paginación por cursor ordena por (due_back, id); el índice ya está en ese orden, así que no hace falta ordenar cada página
+        plan = BookInstance.objects.on_loan().order_by(F('due_back').asc(nulls_last=True), 'pk').explain()
+        self.assertUsesLoanIndex(plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    @unittest.skipUnless(connection.vendor in ('sqlite', 'postgresql'), 'EXPLAIN solo se revisa en SQLite y PostgreSQL')
+    def test_overdue_uses_index(self):
+        self.assertUsesLoanIndex(self.explain(BookInstance.objects.overdue()))
+        self.assertUsesLoanIndex(self.explain(BookInstance.objects.due_within(7)))
+
+
+from unittest import mock
+
+class BookInstanceQuerySetTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        book = Book.objects.create(title='Book', summary='Summary', isbn='111')
+        today = datetime.date.today()
+        cls.late = BookInstance.objects.create(book=book, imprint='Late', status='o', due_back=today - datetime.timedelta(days=2))
+        cls.today = BookInstance.objects.create(book=book, imprint='Today', status='o', due_back=today)
+        cls.soon = BookInstance.objects.create(book=book, imprint='Soon', status='o', due_back=today + datetime.timedelta(days=5))
+        cls.later = BookInstance.objects.create(book=book, imprint='Later', status='o', due_back=today + datetime.timedelta(days=30))
+        # atrasada por la fecha, pero no está prestada
+        cls.maintenance = BookInstance.objects.create(book=book, imprint='Maintenance', status='m', due_back=today - datetime.timedelta(days=2))
+
+    def test_overdue(self):
+        self.assertEqual(list(BookInstance.objects.overdue()), [self.late])
+        # con otra fecha de referencia
+        tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+        self.assertEqual(set(BookInstance.objects.overdue(tomorrow)), {self.late, self.today})
+
+    def test_due_within(self):
+        self.assertEqual(set(BookInstance.objects.due_within(7)), {self.today, self.soon})
+        self.assertEqual(list(BookInstance.objects.due_within(0)), [self.today])
+
+    def test_with_overdue_is_computed_in_sql(self):
+        copies = {copy.imprint: copy for copy in BookInstance.objects.with_overdue()}
+        self.assertTrue(copies['Late'].overdue)
+        self.assertFalse(copies['Today'].overdue)
+        # la propiedad usa el valor anotado, y coincide con el cálculo en Python
+        with mock.patch('catalog.models.date') as mocked_date:
+            self.assertTrue(copies['Late'].is_overdue)
+            self.assertFalse(copies['Soon'].is_overdue)
+            mocked_date.today.assert_not_called()
+        for copy in BookInstance.objects.all():
+            self.assertEqual(copy.is_overdue, copies[copy.imprint].overdue)
+
+
+from django.test import TransactionTestCase
+from catalog.models import Hold
+from catalog.holds import place_hold, cancel_hold, checkout_hold, allocate_copies, queue_position, retry_when_locked, expire_holds
+from catalog.loans import bulk_return
+
+class HoldQueueTest(TestCase):
+
+    def setUp(self):
+        self.book = Book.objects.create(title='Popular', summary='Summary', isbn='111')
+        self.readers = [User.objects.create_user(username=f'reader{number}') for number in range(3)]
+        self.loaned = BookInstance.objects.create(book=self.book, imprint='Imprint', status='o', borrower=self.readers[0],
+                                                  due_back=datetime.date.today() + datetime.timedelta(days=3))
+
+    def test_queue_is_fifo(self):
+        first, created = place_hold(self.book, self.readers[1])
+        second, _ = place_hold(self.book, self.readers[2])
+        self.assertTrue(created)
+        self.assertEqual((first.status, queue_position(first), queue_position(second)), ('w', 1, 2))
+        # reservar otra vez no crea otra reserva
+        self.assertEqual(place_hold(self.book, self.readers[1]), (first, False))
+
+        # al devolver la copia (con captureOnCommitCallbacks se ejecuta lo que espera al final de la transacción) pasa a la primera reserva
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_return([self.loaned.pk])
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.loaned.refresh_from_db()
+        self.assertEqual((first.status, first.copy_id), ('r', self.loaned.pk))
+        self.assertEqual((self.loaned.status, self.loaned.borrower), ('r', self.readers[1]))
+        self.assertEqual((second.status, queue_position(second)), ('w', 1))
+        self.assertEqual(read_counters(), count_from_scratch())
+
+        # si la primera cancela, la copia pasa a la segunda
+        self.assertTrue(cancel_hold(first))
+        second.refresh_from_db()
+        self.assertEqual((second.status, second.copy_id), ('r', self.loaned.pk))
+        self.assertFalse(cancel_hold(first))
+
+        # y cuando la recoge queda prestada
+        due_back = datetime.date.today() + datetime.timedelta(weeks=3)
+        self.assertTrue(checkout_hold(second, due_back))
+        self.loaned.refresh_from_db()
+        self.assertEqual((self.loaned.status, self.loaned.borrower, self.loaned.due_back), ('o', self.readers[2], due_back))
+        self.assertEqual(Hold.objects.get(pk=second.pk).status, 'f')
+        self.assertFalse(checkout_hold(second, due_back))
+        self.assertEqual(read_counters(), count_from_scratch())
+
+    def test_available_copy_is_allocated_immediately(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        hold, _ = place_hold(self.book, self.readers[1])
+        self.assertEqual((hold.status, hold.copy_id), ('r', copy.pk))
+
+        # una copia nueva disponible (guardada con save(), que envía señales) también atiende la cola
+        waiting, _ = place_hold(self.book, self.readers[2])
+        self.assertEqual(waiting.status, 'w')
+        with self.captureOnCommitCallbacks(execute=True):
+            BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        waiting.refresh_from_db()
+        self.assertEqual(waiting.status, 'r')
+        self.assertEqual(allocate_copies(self.book.pk), [])
+
+    def test_uncollected_holds_expire(self):
+        first, _ = place_hold(self.book, self.readers[1])
+        second, _ = place_hold(self.book, self.readers[2])
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_return([self.loaned.pk])
+        deadline = BookInstance.objects.get(pk=self.loaned.pk).due_back
+
+        # el último día para recogerla la reserva sigue lista
+        self.assertEqual(expire_holds(deadline), [])
+        self.assertEqual(Hold.objects.get(pk=first.pk).status, 'r')
+
+        # al día siguiente se cancela y la copia pasa a la siguiente de la cola, con un plazo nuevo
+        out = StringIO()
+        call_command('expire_holds', '--date', (deadline + datetime.timedelta(days=1)).isoformat(), stdout=out)
+        self.assertIn('1 reservas vencidas', out.getvalue())
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.loaned.refresh_from_db()
+        self.assertEqual(first.status, 'c')
+        self.assertEqual((second.status, second.copy_id), ('r', self.loaned.pk))
+        self.assertEqual((self.loaned.status, self.loaned.borrower), ('r', self.readers[2]))
+        self.assertEqual(read_counters(), count_from_scratch())
+
+
+import threading
+from django.db import connections
+
+class HoldAllocationStressTest(TransactionTestCase):
+    """
+    Muchos hilos (cada uno con su propia conexión a la base de datos) devuelven copias y reservan el mismo libro a la vez.
+    Ninguna copia debe quedar apartada para dos reservas y cada reserva debe recibir como mucho una copia.
+    """
+    workers = 8
+    copies = 12
+    readers = 16
+
+    def test_concurrent_allocation(self):
+        book = Book.objects.create(title='Popular', summary='Summary', isbn='111')
+        readers = [User.objects.create_user(username=f'reader{number}') for number in range(self.readers)]
+        for reader in readers:
+            Hold.objects.create(book=book, user=reader)
+        copy_ids = [BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=readers[0]).pk for _ in range(self.copies)]
+
+        errors = []
+        barrier = threading.Barrier(self.workers)
+
+        def worker(number):
+            try:
+                barrier.wait()
+                # cada hilo devuelve su parte de las copias y además intenta asignar todo lo que haya disponible.
+                # SQLite (la base de datos de pruebas) bloquea la tabla entera mientras otro hilo escribe; reintentamos como lo hace holds.py
+                retry_when_locked(lambda: bulk_return(copy_ids[number::self.workers]))
+                allocate_copies(book.pk)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(number,)) for number in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+        ready = list(Hold.objects.filter(status='r').values_list('copy', flat=True))
+        self.assertEqual(len(ready), self.copies) # todas las copias se asignaron (hay más reservas que copias)
+        self.assertEqual(len(set(ready)), self.copies) # y ninguna dos veces
+        self.assertEqual(BookInstance.objects.filter(status='r').count(), self.copies)
+        # por orden de llegada: las reservas atendidas son las primeras
+        self.assertEqual(sorted(Hold.objects.filter(status='r').values_list('pk', flat=True)),
+                         list(Hold.objects.order_by('pk').values_list('pk', flat=True)[:self.copies]))
+        self.assertEqual(read_counters(), count_from_scratch())
@@ -0,0 +1,128 @@
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from catalog.metrics import metrics_text
+from locallibrary.db.pool import ConnectionPool, PoolTimeout, close_pools, get_pool, pool_stats
+
+# Pruebas del pool de conexiones (locallibrary/db/pool.py) con conexiones de mentira: el pool no sabe de qué base de datos son,
+# así que se prueba sin PostgreSQL. El reloj también es de mentira, para probar las comprobaciones y la vida máxima sin esperar.
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.alive = True
+        self.closed = False
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ConnectionPoolTest(SimpleTestCase):
+
+    def make_pool(self, **options):
+        self.opened = []
+        self.clock = FakeClock()
+
+        def connect():
+            self.opened.append(FakeConnection(len(self.opened)))
+            return self.opened[-1]
+
+        def discard(connection):
+            connection.closed = True
+
+        return ConnectionPool(connect, check=lambda connection: connection.alive, discard=discard, clock=self.clock, **options)
+
+    def test_reuses_connections(self):
+        pool = self.make_pool()
+        for _ in range(5):
+            pool.release(pool.acquire())
+        self.assertEqual(len(self.opened), 1)
+        stats = pool.stats()
+        self.assertEqual((stats['acquired'], stats['created'], stats['open'], stats['idle'], stats['in_use']), (5, 1, 1, 1, 0))
+
+    def test_max_size_and_timeout(self):
+        pool = self.make_pool(max_size=2, timeout=0.05)
+        pool.clock = time.monotonic # la espera usa el reloj de verdad
+        first, second = pool.acquire(), pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+        # una conexión devuelta despierta a quien espera
+        got = []
+        waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+        pool.timeout = 5
+        waiter.start()
+        pool.release(first)
+        waiter.join()
+        self.assertIs(got[0], first)
+        self.assertEqual(len(self.opened), 2)
+        self.assertEqual(pool.stats()['waits'], 2)
+
+    def test_checks_idle_connections(self):
+        pool = self.make_pool(check_idle=30)
+        connection = pool.acquire()
+        pool.release(connection)
+        connection.alive = False # p. ej. el servidor se reinició
+
+        self.clock.now = 10 # recién usada: se entrega sin comprobar
+        self.assertIs(pool.acquire(), connection)
+        pool.release(connection)
+
+        self.clock.now = 100
+        fresh = pool.acquire()
+        self.assertIsNot(fresh, connection)
+        self.assertTrue(connection.closed)
+        stats = pool.stats()
+        self.assertEqual((stats['health_check_failures'], stats['discarded'], stats['open']), (1, 1, 1))
+
+    def test_max_lifetime_and_unusable_connections(self):
+        pool = self.make_pool(max_lifetime=60)
+        connection = pool.acquire()
+        self.clock.now = 61
+        pool.release(connection)
+        self.assertTrue(connection.closed)
+
+        connection = pool.acquire()
+        pool.release(connection, reusable=False)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()['open'], 0)
+
+    def test_failed_connect_frees_its_slot(self):
+        pool = self.make_pool(max_size=1)
+        pool.connect = lambda: 1 / 0
+        with self.assertRaises(ZeroDivisionError):
+            pool.acquire()
+        self.assertEqual(pool.stats()['open'], 0)
+
+    def test_after_fork(self):
+        pool = self.make_pool()
+        pool.release(pool.acquire())
+        pool.pid = -1 # como si este proceso fuera el hijo de un fork
+        connection = pool.acquire()
+        self.assertIsNot(connection, self.opened[0])
+        self.assertFalse(self.opened[0].closed) # la del padre no se cierra
+
+    def test_stats_in_metrics(self):
+        pool = get_pool(('test', 'x'), ('test', 'library'), lambda: self.make_pool(max_size=4))
+        try:
+            self.assertIs(get_pool(('test', 'x'), ('test', 'library'), lambda: None), pool)
+            connection = pool.acquire()
+            self.assertEqual(pool_stats()[('test', 'library')]['in_use'], 1)
+            content = metrics_text()
+            self.assertIn('catalog_db_pool_max_size{alias="test",database="library"} 4', content)
+            self.assertIn('catalog_db_pool_in_use{alias="test",database="library"} 1', content)
+            self.assertIn('catalog_db_pool_acquired_total{alias="test",database="library"} 1', content)
+            pool.release(connection)
+        finally:
+            close_pools('test')
+        self.assertTrue(self.opened[0].closed)
+        self.assertNotIn(('test', 'library'), pool_stats())
@@ -0,0 +1,150 @@
+import os
+import tempfile
+import time
+
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.urls import resolve, reverse
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from catalog.models import Author, Book
+from catalog import replicas
+
+# Lecturas en réplicas (catalog/replicas.py) con dos archivos SQLite: la base de datos de pruebas de siempre hace de principal y un
+# archivo temporal, con las mismas tablas pero otros datos, hace de réplica. Así se ve de cuál de las dos leyó cada página.
+
+
+@override_settings(CATALOG_REPLICAS=['replica'], CATALOG_REPLICA_STRATEGY='round_robin')
+class ReplicaRoutingTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # la réplica se añade después de preparar la base de datos de pruebas, así que no participa en la transacción de cada prueba:
+        # sus datos se crean una sola vez aquí y el archivo se borra al terminar
+        cls.directory = tempfile.TemporaryDirectory()
+        connections.settings['replica'] = {**connections['default'].settings_dict,
+                                           'NAME': os.path.join(cls.directory.name, 'replica.sqlite3'), 'TEST': {}}
+        # el router no deja migrar las réplicas (en producción las tablas llegan por replicación), así que aquí se crean sin ella en la lista
+        with override_settings(CATALOG_REPLICAS=[]):
+            call_command('migrate', database='replica', verbosity=0, interactive=False)
+        author = Author.objects.using('replica').create(first_name='John', last_name='Replica')
+        Book.objects.using('replica').create(title='Replica book', summary='Summary', isbn='2', author=author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.directory.cleanup()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        author = Author.objects.create(first_name='John', last_name='Primary')
+        cls.book = Book.objects.create(title='Primary book', summary='Summary', isbn='1', author=author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_catalog_pages_read_from_replica(self):
+        response = self.client.get(reverse('books'))
+        self.assertContains(response, 'Replica book')
+        self.assertNotContains(response, 'Primary book')
+        self.assertContains(self.client.get(reverse('authors')), 'Replica')
+
+    def test_users_and_sessions_read_from_primary(self):
+        # el usuario y su sesión solo existen en la principal
+        self.client.login(username='reader', password='1X<ISRUkw+tuK')
+        response = self.client.get(reverse('books'))
+        self.assertEqual(response.context['user'], self.user)
+        self.assertContains(response, 'Replica book')
+
+        # las vistas que no están en CATALOG_REPLICA_VIEWS leen de la principal
+        response = self.client.get(reverse('my-borrowed'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_read_your_writes(self):
+        self.client.login(username='reader', password='1X<ISRUkw+tuK')
+        response = self.client.post(reverse('book-hold', args=[self.book.pk]))
+        self.assertRedirects(response, reverse('my-borrowed'))
+        self.assertIn('primary_until', response.cookies)
+
+        # después de escribir, el lector ve la principal (donde está su reserva) aunque la réplica no la tenga aún
+        response = self.client.get(reverse('books'))
+        self.assertContains(response, 'Primary book')
+        self.assertNotContains(response, 'Replica book')
+
+        # pasado el intervalo vuelve a leer de la réplica
+        self.client.cookies['primary_until'] = str(int(time.time()) - 1)
+        cache.clear() # los fragmentos de la lista guardados en caché al leer de la principal
+        self.assertContains(self.client.get(reverse('books')), 'Replica book')
+
+    def test_router(self):
+        router = replicas.ReplicaRouter()
+        state = replicas.RoutingState()
+        state.read_alias = 'replica'
+        token = replicas._current.set(state)
+        try:
+            self.assertEqual(router.db_for_read(Book), 'replica')
+            self.assertEqual(router.db_for_read(Session), 'default')
+            self.assertEqual(router.db_for_read(User), 'default')
+            self.assertEqual(router.db_for_write(Book), 'default')
+            # después de escribir, la petición deja de leer de la réplica
+            self.assertTrue(state.wrote)
+            self.assertEqual(router.db_for_read(Book), 'default')
+        finally:
+            replicas._current.reset(token)
+        # fuera de una petición todo va a la principal
+        self.assertEqual(router.db_for_read(Book), 'default')
+
+    def test_replicas_are_not_migrated(self):
+        router = replicas.ReplicaRouter()
+        self.assertIs(router.allow_migrate('replica', 'catalog', 'book'), False)
+        self.assertIs(router.allow_migrate('replica', 'auth'), False)
+        self.assertIsNone(router.allow_migrate('default', 'catalog', 'book'))
+
+    async def test_async_requests(self):
+        # con ASGI el middleware trabaja en modo asíncrono: la vista lee de la réplica y, si escribe, deja la cookie
+        async def get_response(request):
+            # lo que hace Django entre el middleware y la vista: llamar a process_view
+            await sync_to_async(middleware.process_view)(request, None, (), {})
+            titles = await sync_to_async(list)(Book.objects.values_list('title', flat=True))
+            if request.method == 'POST':
+                await Author.objects.acreate(first_name='New', last_name='Author')
+            return HttpResponse(', '.join(titles))
+
+        middleware = replicas.ReplicaRoutingMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        for method in ('get', 'post'):
+            request = getattr(AsyncRequestFactory(), method)(reverse('books'))
+            request.resolver_match = resolve(reverse('books'))
+            response = await middleware(request)
+            if method == 'get':
+                self.assertEqual(response.content, b'Replica book')
+                self.assertNotIn('primary_until', response.cookies)
+            else:
+                self.assertIn('primary_until', response.cookies)
+
+    def test_strategies(self):
+        chosen = [replicas.choose_replica(['replica1', 'replica2']) for _ in range(4)]
+        self.assertEqual(sorted(chosen), ['replica1', 'replica1', 'replica2', 'replica2'])
+        self.assertNotEqual(chosen[0], chosen[1])
+
+        tracker = replicas.LatencyTracker()
+        tracker.observe('replica1', 0.050)
+        tracker.observe('replica2', 0.010)
+        self.assertEqual(tracker.fastest(['replica1', 'replica2']), 'replica2')
+        for _ in range(20):
+            tracker.observe('replica2', 0.200)
+        self.assertEqual(tracker.fastest(['replica1', 'replica2']), 'replica1')
+        with override_settings(CATALOG_REPLICA_STRATEGY='least_latency'):
+            self.assertEqual(replicas.choose_replica(['replica']), 'replica')
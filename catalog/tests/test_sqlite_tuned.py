@@ -0,0 +1,95 @@
+import os
+import tempfile
+import threading
+
+from django.db import OperationalError, connections, transaction
+from django.test import SimpleTestCase
+
+from locallibrary.db.sqlite_tuned.base import WriterLane
+
+# Pruebas del backend locallibrary.db.sqlite_tuned con un archivo SQLite temporal (las pruebas de siempre usan una base de datos en memoria,
+# donde no hay WAL ni carril entre procesos).
+
+
+class TunedSQLiteTest(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.directory.name, 'library.sqlite3')
+        connections.settings['tuned'] = {**connections['default'].settings_dict, 'ENGINE': 'locallibrary.db.sqlite_tuned',
+                                         'NAME': cls.path, 'TEST': {}, 'SQLITE': {'BUSY_TIMEOUT': 10000}}
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['tuned'].close()
+        del connections['tuned']
+        del connections.settings['tuned']
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def test_pragmas(self):
+        with connections['tuned'].cursor() as cursor:
+            values = {}
+            for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'foreign_keys'):
+                cursor.execute(f'PRAGMA {pragma}')
+                values[pragma] = cursor.fetchone()[0]
+        self.assertEqual(values, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 10000, 'cache_size': -16384, 'foreign_keys': 1})
+
+    def test_concurrent_read_then_write_transactions(self):
+        # el caso que con BEGIN diferido falla con "database is locked": varias transacciones leen y después escriben la misma fila
+        with connections['tuned'].cursor() as cursor:
+            cursor.execute('CREATE TABLE IF NOT EXISTS renewals (id INTEGER PRIMARY KEY, total INTEGER)')
+            cursor.execute('DELETE FROM renewals')
+            cursor.execute('INSERT INTO renewals (id, total) VALUES (1, 0)')
+        errors = []
+
+        def renew():
+            try:
+                for _ in range(25):
+                    with transaction.atomic(using='tuned'):
+                        with connections['tuned'].cursor() as cursor:
+                            cursor.execute('SELECT total FROM renewals WHERE id = 1')
+                            total = cursor.fetchone()[0]
+                            cursor.execute('UPDATE renewals SET total = %s WHERE id = 1', [total + 1])
+                    # una escritura suelta, fuera de una transacción (como save() sin atomic())
+                    with connections['tuned'].cursor() as cursor:
+                        cursor.execute('UPDATE renewals SET total = total + 1 WHERE id = 1')
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections['tuned'].close()
+
+        threads = [threading.Thread(target=renew) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        with connections['tuned'].cursor() as cursor:
+            cursor.execute('SELECT total FROM renewals WHERE id = 1')
+            # sin actualizaciones perdidas: cada transacción vio el total de la anterior
+            self.assertEqual(cursor.fetchone()[0], 6 * 25 * 2)
+        self.assertFalse(connections['tuned'].lane_held)
+
+    def test_lane_is_shared_between_processes(self):
+        # dos carriles sobre el mismo archivo se comportan como los de dos workers distintos
+        path = os.path.join(self.directory.name, 'lane.lock')
+        first, second = WriterLane(path, timeout=0.05), WriterLane(path, timeout=0.05)
+        with first:
+            with self.assertRaisesMessage(OperationalError, 'database is locked'):
+                second.acquire()
+        with second:
+            pass
+
+    def test_lane_released_after_failed_transaction(self):
+        with self.assertRaises(ZeroDivisionError):
+            with transaction.atomic(using='tuned'):
+                self.assertTrue(connections['tuned'].lane_held)
+                1 / 0
+        self.assertFalse(connections['tuned'].lane_held)
+        lane = connections['tuned'].get_lane()
+        self.assertTrue(lane.lock.acquire(blocking=False))
+        lane.lock.release()
@@ -2,6 +2,8 @@ from django.test import TestCase
 
 from catalog.models import Author
 from django.urls import reverse
+from django.core.cache import cache
+from django.test import override_settings
 
 # Para validar nuestro comportamiento de vista, usamos la prueba Django Cliente. Esta clase actúa como un navegador web ficticio que podemos usar para simular solicitudes GET y POST en una URL y observar la respuesta. 
 # Podemos ver casi todo sobre la respuesta, desde HTTP de bajo nivel (encabezados de resultados y códigos de estado) hasta la plantilla que estamos usando para representar el HTML y los datos de contexto que le estamos pasando. 
@@ -18,6 +20,10 @@ class AuthorListViewTest(TestCase):
         for author_num in range(number_of_authors):
             Author.objects.create(first_name='Christian %s' % author_num, last_name = 'Surname %s' % author_num,)
 
+    def setUp(self):
+        # las páginas para visitantes anónimos se guardan en caché (catalog/caching.py); empezamos cada prueba sin ellas para que la vista se ejecute
+        cache.clear()
+
     # los métodos de prueba que chequean que la url este en la locación deseada, que se acceda con el nombre correcto, que use la plantilla correcta
     # que la paginación esté bien (que especificamos con el atributo en su clase) y que se listen todos los autores correctamente.
     # Todas las pruebas usan el cliente (perteneciente a la clase derivada de nuestro TestCase) para simular una solicitud GET y obtener una respuesta (resp). 
@@ -59,6 +65,126 @@ class AuthorListViewTest(TestCase):
     # lo que contribuye en gran medida a verificar que cualquier problema de representación se deba únicamente a la plantilla.
         
 
+# La lista de libros no debe hacer una consulta extra por cada libro de la página (problema N+1 con {{book.author}}).
+# Comparamos el número de consultas con páginas de 1 y de 5 libros: si crece con el tamaño de página, la prueba falla.
+
+from unittest import mock
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from catalog.models import Book, Genre
+from catalog.views import BookListView
+from django.core.cache import cache
+
+class BookListViewQueryCountTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        genre = Genre.objects.create(name='Fantasy')
+        for book_num in range(5):
+            author = Author.objects.create(first_name='Author %s' % book_num, last_name='Surname %s' % book_num)
+            book = Book.objects.create(title='Book %s' % book_num, summary='Summary', isbn='ABCDEFG', author=author)
+            book.genre.add(genre)
+
+    def count_queries(self, page_size, prefetch_genres=False):
+        cache.clear() # sin la página en caché de la petición anterior
+        with mock.patch.object(BookListView, 'paginate_by', page_size), mock.patch.object(BookListView, 'prefetch_genres', prefetch_genres):
+            with CaptureQueriesContext(connection) as queries:
+                resp = self.client.get(reverse('books'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.context['book_list']), page_size)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        self.assertEqual(self.count_queries(1), self.count_queries(5))
+
+    def test_query_count_with_genre_prefetch(self):
+        self.assertEqual(self.count_queries(1, prefetch_genres=True), self.count_queries(5, prefetch_genres=True))
+
+
+# La vista detallada de un libro trae el autor, los géneros y las copias con un número fijo de consultas,
+# y resume las copias por estado para no tener que listar todas cuando hay muchas.
+
+from catalog.models import BookInstance
+from catalog.views import BookDetailView
+
+class BookDetailViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=author)
+        cls.book.genre.add(Genre.objects.create(name='Fantasy'))
+        for status in ('a', 'a', 'o', 'm', 'r'):
+            BookInstance.objects.create(book=cls.book, imprint='Unlikely Imprint, 2016', status=status)
+
+    def get_detail(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(reverse('book-detail', kwargs={'pk': self.book.pk}))
+        self.assertEqual(resp.status_code, 200)
+        return resp, len(queries)
+
+    def test_copy_summary(self):
+        resp, _ = self.get_detail()
+        summary = {status: total for status, label, total in resp.context['copy_summary']}
+        self.assertEqual(summary, {'m': 1, 'o': 1, 'a': 2, 'r': 1})
+        self.assertEqual(resp.context['num_copies'], 5)
+
+    def test_query_count_does_not_grow_with_copies(self):
+        _, queries_before = self.get_detail()
+        for copy_num in range(10):
+            BookInstance.objects.create(book=self.book, imprint='Unlikely Imprint, 2016', status='a')
+        _, queries_after = self.get_detail()
+        self.assertEqual(queries_before, queries_after)
+
+    def test_copies_listed_are_limited(self):
+        with mock.patch.object(BookDetailView, 'max_copies_listed', 2):
+            resp, _ = self.get_detail()
+        self.assertEqual(len(resp.context['book'].listed_copies), 2)
+        self.assertEqual(resp.context['num_copies_not_listed'], 3)
+
+
+from catalog.caching import invalidate_catalog_pages
+
+# La vista detallada de un autor pagina sus libros y guarda cada página en caché hasta que cambia algún libro del autor.
+
+class AuthorDetailViewTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = Author.objects.create(first_name='Prolific', last_name='Writer')
+        for book_num in range(13):
+            Book.objects.create(title='Book %02d' % book_num, summary='Summary', isbn='ABCDEFG', author=self.author)
+
+    def get_detail(self, page=1):
+        return self.client.get(reverse('author-detail', kwargs={'pk': self.author.pk}) + '?page=%s' % page)
+
+    def test_books_are_paginated(self):
+        resp = self.get_detail()
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.context['is_paginated'])
+        self.assertEqual(len(resp.context['book_list']), 10)
+        self.assertEqual(len(self.get_detail(page=2).context['book_list']), 3)
+        self.assertEqual(self.get_detail(page=3).status_code, 404)
+
+    def test_second_visit_only_queries_the_author(self):
+        self.get_detail()
+        invalidate_catalog_pages() # que no responda la caché de la página completa, sino la de los libros del autor
+        with self.assertNumQueries(2): # el autor y la consulta de ETag / Last-Modified (catalog/conditional.py)
+            self.get_detail()
+
+    def test_cache_invalidated_when_book_changes_author(self):
+        other = Author.objects.create(first_name='Other', last_name='Writer')
+        self.get_detail(page=2)
+        book = Book.objects.get(title='Book 12')
+        book.author = other
+        with self.captureOnCommitCallbacks(execute=True): # la caché se invalida al confirmar la transacción
+            book.save()
+        self.assertEqual(len(self.get_detail(page=2).context['book_list']), 2)
+        resp = self.client.get(reverse('author-detail', kwargs={'pk': other.pk}))
+        self.assertEqual([b.title for b in resp.context['book_list']], ['Book 12'])
+
+
 # vamos a probar una vista que está restringida solo a los usuarios registrados. 
 # Por ejemplo, nuestro LoanedBooksByUserListView es muy similar a nuestra vista anterior, pero solo está disponible para los usuarios registrados 
 # y solo muestra los registros de BookInstance que el usuario actual tomó prestados, tienen el estado 'en préstamo' y están ordenados como "los más antiguos". primero".
@@ -363,3 +489,816 @@ class AuthorCreateViewTest(TestCase):
 
 
 
+
+
+# la vista index toma sus contadores de la caché (catalog/stats.py). Comprobamos que con la caché "caliente" no consulta las tablas del catálogo
+# y que las señales la invalidan cuando se crea un libro nuevo.
+
+class IndexViewTest(TestCase):
+
+    def setUp(self):
+        # la caché no se revierte entre pruebas como la base de datos, así que la limpiamos
+        cache.clear()
+        test_author = Author.objects.create(first_name='John', last_name='Smith')
+        Book.objects.create(title='The Book', summary='My book summary', isbn='ABCDEFG', author=test_author)
+
+    def test_counts_in_context(self):
+        resp = self.client.get(reverse('index'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context['num_books'], 1)
+        self.assertEqual(resp.context['num_authors'], 1)
+        self.assertEqual(resp.context['num_books_with_the'], 1)
+        self.assertEqual(resp.context['num_instances'], 0)
+
+    def test_warm_cache_does_not_query_catalog_tables(self):
+        self.client.get(reverse('index'))
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(reverse('index'))
+        self.assertEqual(resp.status_code, 200)
+        for query in queries.captured_queries:
+            self.assertNotIn('catalog_', query['sql'])
+
+    def test_cache_invalidated_on_save(self):
+        self.client.get(reverse('index'))
+        Book.objects.create(title='Another', summary='Summary', isbn='HIJKLMN', author=Author.objects.first())
+        resp = self.client.get(reverse('index'))
+        self.assertEqual(resp.context['num_books'], 2)
+
+    # el contador de visitas ya no modifica la sesión (ver catalog/visits.py), así que visitar la página de inicio no escribe en la base de datos
+
+    def visits(self, times):
+        return [self.client.get(reverse('index')).context['num_visits'] for _ in range(times)]
+
+    def test_visits_counted_without_database_writes(self):
+        self.client.get(reverse('index'))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.visits(2), [1, 2])
+        for query in queries.captured_queries:
+            self.assertFalse(query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE')), query['sql'])
+            self.assertNotIn('django_session', query['sql'])
+
+    def test_tampered_cookie_starts_again(self):
+        self.visits(3)
+        self.client.cookies['catalog_visits'] = '100'
+        self.assertEqual(self.visits(1), [0])
+
+    @override_settings(CATALOG_VISIT_COUNTER='catalog.visits.CacheVisitCounter')
+    def test_cache_counter(self):
+        self.assertEqual(self.visits(3), [0, 1, 2])
+        self.client.cookies.clear() # otro visitante
+        self.assertEqual(self.visits(1), [0])
+
+    @override_settings(CATALOG_VISIT_COUNTER='catalog.visits.BufferedVisitCounter', CATALOG_VISITS_FLUSH_EVERY=3, CATALOG_VISITS_FLUSH_INTERVAL=3600,
+                       CATALOG_VISITS_BACKGROUND_FLUSH=False)
+    def test_buffered_counter_writes_in_batches(self):
+        from catalog.models import VisitCount
+        from catalog.visits import get_visit_counter
+        self.assertEqual(self.visits(2), [0, 1])
+        self.assertFalse(VisitCount.objects.exists())
+        self.assertEqual(self.visits(2), [2, 3]) # la tercera visita escribe el lote
+        self.assertEqual(VisitCount.objects.get().visits, 3)
+        get_visit_counter().flush()
+        self.assertEqual(VisitCount.objects.get().visits, 4)
+        # el total guardado ya está en memoria: las visitas siguientes no consultan VisitCount
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.visits(1), [4])
+        self.assertFalse([query for query in queries.captured_queries if 'catalog_visitcount' in query['sql']])
+        get_visit_counter().flush()
+
+    @override_settings(CATALOG_VISIT_COUNTER='catalog.visits.SessionVisitCounter')
+    def test_session_counter(self):
+        self.assertEqual(self.visits(2), [0, 1])
+
+
+# BufferedVisitCounter escribe los lotes desde un hilo en segundo plano, con su propia conexión: la prueba no puede estar dentro
+# de una transacción (TestCase), porque el hilo no vería sus datos.
+
+import time
+from django.test import RequestFactory, TransactionTestCase
+from catalog.models import VisitCount
+from catalog.visits import BufferedVisitCounter
+
+@override_settings(CATALOG_VISITS_FLUSH_EVERY=2, CATALOG_VISITS_FLUSH_INTERVAL=3600, CATALOG_VISITS_BACKGROUND_FLUSH=True)
+class BufferedVisitCounterBackgroundTest(TransactionTestCase):
+
+    def wait_for_visits(self, visits):
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            if VisitCount.objects.filter(visits=visits).exists():
+                return
+            time.sleep(0.01)
+        self.fail(f'El hilo no escribió {visits} visitas')
+
+    def test_flushes_in_background(self):
+        request = RequestFactory().get('/')
+        request.user = User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        counter = BufferedVisitCounter()
+        self.assertEqual([counter.visit(request) for _ in range(2)], [0, 1]) # la segunda completa el lote y despierta al hilo
+        self.wait_for_visits(2)
+        self.assertTrue(counter.thread.is_alive())
+
+        with self.assertNumQueries(0): # ni consulta ni escritura durante la petición
+            self.assertEqual(counter.visit(request), 2)
+        counter.flush()
+        self.assertEqual(VisitCount.objects.get().visits, 3)
+
+
+# Con CATALOG_CURSOR_PAGINATION activado las listas se paginan por cursor. Recorremos todas las páginas hacia adelante y hacia atrás
+# y comprobamos que no se repite ni se pierde ningún registro (aunque haya apellidos repetidos o fechas vacías) y que no se hace COUNT(*).
+
+from django.test import override_settings
+import uuid
+from catalog.pagination import CursorPaginator
+
+@override_settings(CATALOG_CURSOR_PAGINATION=True)
+class CursorPaginationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for author_num in range(13):
+            # solo 4 apellidos distintos, el desempate lo hace la clave primaria
+            Author.objects.create(first_name='Christian %s' % author_num, last_name='Surname %s' % (author_num % 4))
+
+        cls.librarian = User.objects.create_superuser(username='librarian', password='12345')
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        for copy_num in range(25):
+            due_back = None if copy_num % 6 == 0 else datetime.date.today() + datetime.timedelta(days=copy_num % 3)
+            BookInstance.objects.create(book=book, imprint='Imprint', due_back=due_back, status='o', borrower=cls.librarian)
+
+    def walk(self, url, list_name):
+        pages = []
+        resp = self.client.get(url)
+        while True:
+            self.assertEqual(resp.status_code, 200)
+            pages.append([obj.pk for obj in resp.context[list_name]])
+            if not resp.context['page_obj'].has_next():
+                break
+            resp = self.client.get(url + '?cursor=' + resp.context['page_obj'].next_cursor)
+
+        # y de vuelta hacia atrás desde la última página
+        backwards = [pages[-1]]
+        while resp.context['page_obj'].has_previous():
+            resp = self.client.get(url + '?cursor=' + resp.context['page_obj'].previous_cursor)
+            backwards.append([obj.pk for obj in resp.context[list_name]])
+        self.assertEqual(backwards[::-1], pages)
+        return pages
+
+    def test_authors_walk_matches_ordering(self):
+        pages = self.walk(reverse('authors'), 'author_list')
+        self.assertEqual([len(page) for page in pages], [10, 3])
+        expected = list(Author.objects.order_by('last_name', 'pk').values_list('pk', flat=True))
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_loan_list_walk_with_null_dates(self):
+        self.client.login(username='librarian', password='12345')
+        pages = self.walk(reverse('all-borrowed'), 'bookinstance_list')
+        self.assertEqual(sorted(map(str, sum(pages, []))), sorted(str(pk) for pk in BookInstance.objects.values_list('pk', flat=True)))
+
+    def test_no_count_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('authors'))
+        for query in queries.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'].upper())
+
+    def test_invalid_cursor_is_404(self):
+        resp = self.client.get(reverse('authors') + '?cursor=not-a-cursor')
+        self.assertEqual(resp.status_code, 404)
+
+    def test_cursor_predicate_seeks_the_index(self):
+        # el filtro empieza con una cota no estricta (last_name >= v) para que la base de datos salte a ese punto del índice
+        # en lugar de recorrerlo desde el principio en cada página
+        paginator = CursorPaginator(Author.objects.all(), 10, 'last_name')
+        for conditions, bound in ((paginator.after('Surname 2', 5), '>='), (paginator.before('Surname 2', 5), '<=')):
+            self.assertEqual(len(conditions), 1)
+            self.assertIn(f'"last_name" {bound} Surname 2 AND', str(Author.objects.filter(conditions[0]).query))
+        descending = CursorPaginator(Author.objects.all(), 10, '-last_name')
+        self.assertIn('"last_name" <= Surname 2 AND', str(Author.objects.filter(descending.after('Surname 2', 5)[0]).query))
+
+        # si la columna admite NULL, esas filas son un tramo aparte y no se unen con OR a la condición de rango
+        loans = CursorPaginator(BookInstance.objects.on_loan(), 10, 'due_back')
+        after = loans.after(datetime.date.today(), uuid.uuid4())
+        self.assertEqual(len(after), 2)
+        self.assertNotIn('IS NULL', str(BookInstance.objects.filter(after[0]).query))
+
+        if connection.vendor == 'sqlite':
+            queryset = Book.objects.all()
+            paginator = CursorPaginator(queryset, 10, 'title')
+            plan = queryset.filter(paginator.after('M', 5)[0]).order_by(*paginator.ordering()).explain()
+            self.assertIn('SEARCH catalog_book USING INDEX book_title_idx (title>?)', plan)
+            plan = queryset.filter(paginator.before('M', 5)[0]).order_by(*paginator.ordering(reverse=True)).explain()
+            self.assertIn('SEARCH catalog_book USING INDEX book_title_idx (title<?)', plan)
+            plan = loans.queryset.filter(after[0]).order_by(*loans.ordering()).explain()
+            self.assertIn('(status=? AND due_back>?)', plan)
+
+
+# Búsqueda de texto completo: el índice se mantiene con señales, así que los libros creados en la prueba ya se pueden buscar.
+
+class SearchViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        tolkien = Author.objects.create(first_name='John', last_name='Tolkien')
+        fantasy = Genre.objects.create(name='Fantasy')
+        cls.hobbit = Book.objects.create(title='The Hobbit', summary='A hobbit goes on an adventure', isbn='9780261102217', author=tolkien)
+        cls.hobbit.genre.add(fantasy)
+        cls.other = Book.objects.create(title='Unrelated', summary='Mentions a hobbit once', isbn='1111111111111')
+        for book_num in range(12):
+            Book.objects.create(title='Dragon %s' % book_num, summary='Summary', isbn='2222222222222', author=tolkien)
+
+    def search(self, query, page=1):
+        resp = self.client.get(reverse('search'), {'q': query, 'page': page})
+        self.assertEqual(resp.status_code, 200)
+        return resp
+
+    def test_title_match_ranks_above_summary_match(self):
+        resp = self.search('hobbit')
+        self.assertEqual([book.pk for book in resp.context['book_list']], [self.hobbit.pk, self.other.pk])
+
+    def test_search_author_genre_and_isbn(self):
+        self.assertEqual(self.search('tolkien').context['paginator'].count, 13)
+        self.assertEqual([book.pk for book in self.search('fantasy').context['book_list']], [self.hobbit.pk])
+        self.assertEqual([book.pk for book in self.search('9780261102217').context['book_list']], [self.hobbit.pk])
+
+    def test_results_are_paginated(self):
+        self.assertEqual(len(self.search('dragon').context['book_list']), 10)
+        self.assertEqual(len(self.search('dragon', page=2).context['book_list']), 2)
+
+    def test_index_follows_changes(self):
+        Author.objects.filter(last_name='Tolkien').update(last_name='Renamed') # update() no envía señales
+        author = Author.objects.get(last_name='Renamed')
+        author.save()
+        self.assertEqual(self.search('renamed').context['paginator'].count, 13)
+
+        self.hobbit.genre.clear()
+        self.assertEqual(self.search('fantasy').context['paginator'].count, 0)
+
+        self.hobbit.delete()
+        self.assertEqual([book.pk for book in self.search('hobbit').context['book_list']], [self.other.pk])
+
+    def test_special_characters_are_safe(self):
+        self.assertEqual(self.search('"hobbit*) ^').context['paginator'].count, 2)
+        self.assertEqual(self.search('').context['book_list'], [])
+
+
+# Autocompletado: el índice de trigramas vive en memoria en cada proceso, así que lo descartamos antes de cada prueba
+# (las transacciones de las pruebas se revierten sin enviar señales).
+
+from catalog import autocomplete
+
+class AutocompleteViewTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        autocomplete.reset()
+        self.tolkien = Author.objects.create(first_name='John', last_name='Tolkien')
+        self.hobbit = Book.objects.create(title='The Hobbit', summary='Summary', isbn='ABCDEFG', author=self.tolkien)
+        Book.objects.create(title='The Silmarillion', summary='Summary', isbn='ABCDEFG', author=self.tolkien)
+        Author.objects.create(first_name='Gabriel', last_name='García Márquez')
+
+    def suggest(self, query):
+        resp = self.client.get(reverse('autocomplete'), {'q': query})
+        self.assertEqual(resp.status_code, 200)
+        return [(result['type'], result['label']) for result in resp.json()['results']]
+
+    def test_prefix_of_title_and_author(self):
+        self.assertEqual(self.suggest('hob'), [('book', 'The Hobbit')])
+        self.assertEqual(self.suggest('tolk'), [('author', 'Tolkien John')])
+        self.assertEqual(self.suggest('garcia'), [('author', 'García Márquez Gabriel')])
+
+    def test_tolerates_typo(self):
+        self.assertIn(('book', 'The Silmarillion'), self.suggest('silmarilion'))
+
+    def test_warm_index_does_not_query(self):
+        self.suggest('hob')
+        with self.assertNumQueries(0):
+            self.suggest('silm')
+
+    def test_index_follows_changes(self):
+        self.suggest('hob')
+        self.hobbit.title = 'There and Back Again'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hobbit.save()
+            # hasta confirmar la transacción el índice no cambia
+            self.assertEqual(self.suggest('hobbit'), [('book', 'The Hobbit')])
+        self.assertEqual(self.suggest('hobbit'), [])
+        self.assertEqual(self.suggest('back again'), [('book', 'There and Back Again')])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tolkien.delete()
+        self.assertEqual(self.suggest('tolkien'), [])
+
+    def test_url_in_results(self):
+        resp = self.client.get(reverse('autocomplete'), {'q': 'hobbit'})
+        self.assertEqual(resp.json()['results'][0]['url'], self.hobbit.get_absolute_url())
+
+    def test_limit_is_clamped(self):
+        resp = self.client.get(reverse('autocomplete'), {'q': 'the', 'limit': '-1'})
+        self.assertEqual(len(resp.json()['results']), 1)
+
+    def test_compaction_replaces_the_index(self):
+        index = autocomplete.TrigramIndex()
+        for pk in range(2000):
+            index.add(autocomplete.BOOK, pk, f'Book number {pk}')
+        for pk in range(1001):
+            index.remove(autocomplete.BOOK, pk)
+        self.assertTrue(index.needs_compaction())
+        compacted = index.compacted()
+        # el índice viejo sigue igual para las búsquedas que ya lo estaban usando
+        self.assertEqual(len(index.labels), 2000)
+        self.assertEqual(len(compacted.labels), 999)
+        self.assertEqual(compacted.search('book number 1999', 1), index.search('book number 1999', 1))
+
+import gzip
+import json
+
+class ExportViewTest(TestCase):
+    def setUp(self):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        genres = [Genre.objects.create(name=name) for name in ('Fantasy', 'Poetry')]
+        for number in range(5):
+            book = Book.objects.create(title=f'Book {number}', summary='Summary', isbn=f'{number}', author=author, language='English')
+            book.genre.set(genres[:number % 3])
+        User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        User.objects.create_user(username='staff', password='1X<ISRUkw+tuK', is_staff=True)
+
+    def test_requires_staff(self):
+        self.client.login(username='reader', password='1X<ISRUkw+tuK')
+        response = self.client.get(reverse('catalog-export', args=['books']))
+        self.assertEqual(response.status_code, 302)
+
+    def test_streams_csv(self):
+        self.client.login(username='staff', password='1X<ISRUkw+tuK')
+        response = self.client.get(reverse('catalog-export', args=['books']))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,isbn,title,summary,language,author_id,author_first_name,author_last_name,genres')
+        self.assertEqual(len(lines), 6)
+        self.assertTrue(lines[3].endswith(',Fantasy;Poetry'))
+
+    def test_streams_gzipped_jsonl(self):
+        self.client.login(username='staff', password='1X<ISRUkw+tuK')
+        response = self.client.get(reverse('catalog-export', args=['books']), {'format': 'jsonl', 'gzip': '1'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('books.jsonl.gz', response['Content-Disposition'])
+        rows = [json.loads(line) for line in gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()]
+        self.assertEqual([row['title'] for row in rows], [f'Book {number}' for number in range(5)])
+        self.assertEqual(rows[1]['genres'], ['Fantasy'])
+
+    def test_unknown_export(self):
+        self.client.login(username='staff', password='1X<ISRUkw+tuK')
+        self.assertEqual(self.client.get(reverse('catalog-export', args=['users'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('catalog-export', args=['books']), {'format': 'xml'}).status_code, 404)
+
+from catalog.counters import read_counters, count_from_scratch
+
+class BulkLoansViewTest(TestCase):
+    def setUp(self):
+        self.borrower = User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        User.objects.create_superuser(username='librarian', password='1X<ISRUkw+tuK')
+        book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG')
+        due_back = datetime.date.today() + datetime.timedelta(days=5)
+        self.on_loan = [BookInstance.objects.create(book=book, imprint='Imprint', due_back=due_back, borrower=self.borrower, status='o') for _ in range(3)]
+        self.available = BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+        self.client.login(username='librarian', password='1X<ISRUkw+tuK')
+
+    def post(self, **data):
+        return self.client.post(reverse('bulk-loans-librarian'), data)
+
+    def test_permission_required(self):
+        self.client.login(username='reader', password='1X<ISRUkw+tuK')
+        response = self.post(action='return', copies=[self.on_loan[0].pk])
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(BookInstance.objects.get(pk=self.on_loan[0].pk).status, 'o')
+
+    def test_renew_with_one_update(self):
+        new_date = datetime.date.today() + datetime.timedelta(weeks=2)
+        copies = [copy.pk for copy in self.on_loan] + [self.available.pk]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(action='renew', renewal_date=new_date, copies=copies)
+        updates = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('UPDATE "catalog_bookinstance"')]
+        self.assertEqual(len(updates), 1)
+
+        self.assertEqual(response.context['num_done'], 3)
+        self.assertFalse(response.context['results'][-1].ok) # la copia disponible no estaba prestada
+        self.assertEqual(BookInstance.objects.filter(due_back=new_date).count(), 3)
+
+    def test_renew_date_validated_like_renew_form(self):
+        response = self.post(action='renew', renewal_date=datetime.date.today() + datetime.timedelta(weeks=5), copies=[self.on_loan[0].pk])
+        self.assertIn('renewal_date', response.context['form'].errors)
+        self.assertEqual(BookInstance.objects.filter(due_back=datetime.date.today() + datetime.timedelta(days=5)).count(), 3)
+
+    def test_return_and_checkout_keep_counters(self):
+        self.post(action='return', copies=[copy.pk for copy in self.on_loan[:2]])
+        self.assertEqual(BookInstance.objects.filter(status='a', borrower=None).count(), 3)
+        self.assertEqual(read_counters(), count_from_scratch())
+
+        due_back = datetime.date.today() + datetime.timedelta(weeks=3)
+        response = self.post(action='checkout', borrower=self.borrower.pk, renewal_date=due_back, copies=[self.available.pk])
+        self.assertEqual(response.context['num_done'], 1)
+        self.assertEqual(BookInstance.objects.get(pk=self.available.pk).borrower, self.borrower)
+        self.assertEqual(read_counters(), count_from_scratch())
+
+    def test_admin_actions(self):
+        url = reverse('admin:catalog_bookinstance_changelist')
+        self.client.post(url, {'action': 'return_copies', '_selected_action': [copy.pk for copy in self.on_loan]})
+        self.assertEqual(BookInstance.objects.filter(status='o').count(), 0)
+        self.assertEqual(read_counters(), count_from_scratch())
+
+    def test_all_borrowed_has_checkboxes(self):
+        response = self.client.get(reverse('all-borrowed'))
+        self.assertContains(response, 'name="copies"', count=3)
+        self.assertContains(response, reverse('bulk-loans-librarian'))
+
+from catalog.caching import page_cache_stats
+
+class PageCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+        for number in range(5):
+            Book.objects.create(title=f'Book {number}', summary='Summary', isbn=f'{number}', author=self.author)
+        User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+
+    def test_anonymous_pages_are_cached_per_page(self):
+        url = reverse('books')
+        self.assertEqual(self.client.get(url)['X-Catalog-Cache'], 'MISS')
+        with self.assertNumQueries(1): # solo la consulta de ETag / Last-Modified
+            response = self.client.get(url)
+        self.assertEqual(response['X-Catalog-Cache'], 'HIT')
+        self.assertContains(response, 'Book 0')
+
+        # la segunda página tiene su propia entrada
+        response = self.client.get(url, {'page': 2})
+        self.assertEqual(response['X-Catalog-Cache'], 'MISS')
+        self.assertContains(response, 'Book 3')
+        self.assertEqual(page_cache_stats()['books'], {'hit': 1, 'miss': 2})
+
+    def test_changes_invalidate_cached_pages(self):
+        url = reverse('author-detail', args=[self.author.pk])
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Catalog-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.create(title='A new book', summary='Summary', isbn='9', author=self.author)
+        response = self.client.get(url)
+        self.assertEqual(response['X-Catalog-Cache'], 'MISS')
+        self.assertContains(response, 'A new book')
+
+    def test_logged_in_users_get_their_own_sidebar(self):
+        url = reverse('books')
+        self.client.get(url) # una versión anónima en caché
+        self.client.login(username='reader', password='1X<ISRUkw+tuK')
+        response = self.client.get(url)
+        self.assertEqual(response['X-Catalog-Cache'], 'BYPASS')
+        self.assertContains(response, 'User: reader')
+
+        # la lista sí sale del fragmento en caché: no se vuelven a consultar los libros de la página
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertContains(response, 'Book 0')
+        self.assertFalse([query for query in queries.captured_queries if query['sql'].startswith('SELECT "catalog_book"')])
+
+import re
+from django.test import Client
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+        self.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=self.author)
+        self.copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+
+    def revalidate(self, url):
+        response = self.client.get(url)
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_not_modified_without_rendering(self):
+        for url in (reverse('books'), reverse('authors'), self.book.get_absolute_url(), self.author.get_absolute_url()):
+            response = self.client.get(url)
+            with self.assertNumQueries(1), self.assertTemplateNotUsed('base_generic.html'):
+                second = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(second.status_code, 304, url)
+
+    def test_copy_change_modifies_book_detail(self):
+        url = self.book.get_absolute_url()
+        response = self.client.get(url)
+        self.copy.status = 'o'
+        self.copy.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_genre_change_modifies_book_detail(self):
+        url = self.book.get_absolute_url()
+        response = self.client.get(url)
+        self.book.genre.add(Genre.objects.create(name='Fantasy'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_deleted_book_modifies_lists(self):
+        other = Book.objects.create(title='Other', summary='Summary', isbn='1', author=self.author)
+        books = self.client.get(reverse('books'))
+        author = self.client.get(self.author.get_absolute_url())
+        other.delete()
+        self.assertEqual(self.client.get(reverse('books'), HTTP_IF_NONE_MATCH=books['ETag']).status_code, 200)
+        self.assertEqual(self.client.get(self.author.get_absolute_url(), HTTP_IF_NONE_MATCH=author['ETag']).status_code, 200)
+
+    def test_etag_depends_on_user(self):
+        url = reverse('books')
+        response = self.client.get(url)
+        self.client.login(username='reader', password='1X<ISRUkw+tuK')
+        response_logged_in = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response_logged_in.status_code, 200)
+        # las páginas de un usuario con sesión no llevan validadores
+        self.assertNotIn('ETag', response_logged_in)
+        self.assertNotIn('Last-Modified', response_logged_in)
+
+    def test_new_login_gets_fresh_csrf_token(self):
+        # el token CSRF cambia en cada inicio de sesión: la página guardada de la sesión anterior no debe volver a usarse
+        client = Client(enforce_csrf_checks=True)
+        url = self.book.get_absolute_url()
+        client.login(username='reader', password='1X<ISRUkw+tuK')
+        old = client.get(url)
+        client.logout()
+        client.login(username='reader', password='1X<ISRUkw+tuK')
+        response = client.get(url, HTTP_IF_NONE_MATCH=old.get('ETag', '"x"'), HTTP_IF_MODIFIED_SINCE=old.get('Last-Modified', ''))
+        self.assertEqual(response.status_code, 200)
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', response.content.decode()).group(1)
+        response = client.post(reverse('book-hold', args=[self.book.pk]), {'csrfmiddlewaretoken': token})
+        self.assertEqual(response.status_code, 302)
+
+    def test_missing_book_is_404(self):
+        self.assertEqual(self.client.get(reverse('book-detail', args=[self.book.pk + 100])).status_code, 404)
+
+from django.contrib.auth.models import AnonymousUser
+from django.test import AsyncRequestFactory
+from django.http import Http404
+from catalog import async_views
+
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+        for number in range(5):
+            book = Book.objects.create(title=f'Book {number}', summary='Summary', isbn=f'{number}', author=self.author)
+        BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+        self.book = book
+        self.reader = User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        self.factory = AsyncRequestFactory()
+
+    def request(self, path='/', user=None, headers=None, **params):
+        request = self.factory.get(path, params, headers=headers)
+        request.user = user or AnonymousUser() # lo que haría AuthenticationMiddleware
+        return request
+
+    async def test_index(self):
+        response = await async_views.index(self.request())
+        self.assertContains(response, '<strong>Books:</strong> 5', html=False)
+        self.assertIn('catalog_visits', response.cookies)
+
+    async def test_book_list_is_paginated(self):
+        response = await async_views.book_list(self.request(reverse('books'), page=2))
+        self.assertContains(response, 'Book 3')
+        self.assertContains(response, 'Page 2 of 2')
+        with self.assertRaises(Http404):
+            await async_views.book_list(self.request(reverse('books'), page=3))
+
+    async def test_book_detail(self):
+        path = reverse('book-detail', args=[self.book.pk])
+        response = await async_views.book_detail(self.request(path), self.book.pk)
+        self.assertContains(response, 'Book 4')
+        self.assertContains(response, 'Available: 1')
+        with self.assertRaises(Http404):
+            await async_views.book_detail(self.request(reverse('book-detail', args=[self.book.pk + 100])), self.book.pk + 100)
+
+    async def test_author_pages(self):
+        response = await async_views.author_list(self.request(reverse('authors')))
+        self.assertContains(response, 'Smith')
+        response = await async_views.author_detail(self.request(reverse('author-detail', args=[self.author.pk])), self.author.pk)
+        self.assertContains(response, 'Book 0')
+
+    async def test_anonymous_pages_are_cached(self):
+        path = reverse('author-detail', args=[self.author.pk])
+        response = await async_views.author_detail(self.request(path), self.author.pk)
+        self.assertEqual(response['X-Catalog-Cache'], 'MISS')
+        response = await async_views.author_detail(self.request(path), self.author.pk)
+        self.assertEqual(response['X-Catalog-Cache'], 'HIT')
+        self.assertContains(response, 'Book 0')
+
+        response = await async_views.book_list(self.request(reverse('books'), user=self.reader))
+        self.assertEqual(response['X-Catalog-Cache'], 'BYPASS')
+
+    async def test_not_modified(self):
+        path = reverse('book-detail', args=[self.book.pk])
+        response = await async_views.book_detail(self.request(path), self.book.pk)
+        etag = response['ETag']
+        response = await async_views.book_detail(self.request(path, headers={'If-None-Match': etag}), self.book.pk)
+        self.assertEqual(response.status_code, 304)
+
+        await Book.objects.filter(pk=self.book.pk).aupdate(updated_at=timezone.now() + datetime.timedelta(seconds=1))
+        response = await async_views.book_detail(self.request(path, headers={'If-None-Match': etag}), self.book.pk)
+        self.assertEqual(response.status_code, 200)
+
+        # los usuarios con sesión no reciben validadores (ver catalog/conditional.py)
+        response = await async_views.book_list(self.request(reverse('books'), user=self.reader))
+        self.assertFalse(response.has_header('ETag'))
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.http import HttpResponse
+from django.urls import resolve
+from catalog.metrics import registry, RollingHistogram, QueryMetricsMiddleware
+
+class MetricsViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='John', last_name='Tolkien')
+        Book.objects.create(title='The Hobbit', summary='Summary', isbn='111', author=author)
+        cls.staff = User.objects.create_user(username='staff', password='1X<ISRUkw+tuK', is_staff=True)
+        cls.reader = User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+
+    def test_records_queries_and_times_per_view(self):
+        self.client.get(reverse('books'))
+        self.client.get(reverse('books'))
+        self.client.login(username='staff', password='1X<ISRUkw+tuK')
+        response = self.client.get(reverse('catalog-metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        content = response.content.decode()
+        self.assertIn('# TYPE catalog_request_duration_seconds histogram', content)
+        self.assertIn('catalog_request_duration_seconds_count{view="books"} 2', content)
+        self.assertIn('catalog_request_queries_bucket{view="books",le="+Inf"} 2', content)
+        self.assertIn('# TYPE catalog_request_duration_seconds_recent gauge', content)
+        self.assertIn('catalog_request_duration_seconds_recent_count{view="books"} 2', content)
+        self.assertIn('catalog_request_queries_recent{view="books",quantile="0.95"}', content)
+        self.assertIn('catalog_page_cache_requests_total{page="books",outcome="miss"} 1', content)
+        # la plantilla de la lista se generó (una vez; la segunda petición salió de la caché de páginas)
+        template_sum = [line for line in content.splitlines() if line.startswith('catalog_request_template_seconds_sum{view="books"}')]
+        self.assertGreater(float(template_sum[0].split()[-1]), 0)
+
+    def test_staff_or_token_only(self):
+        self.assertEqual(self.client.get(reverse('catalog-metrics')).status_code, 403)
+        self.client.login(username='reader', password='1X<ISRUkw+tuK')
+        self.assertEqual(self.client.get(reverse('catalog-metrics')).status_code, 403)
+        self.client.logout()
+
+        with override_settings(CATALOG_METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(reverse('catalog-metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertEqual(self.client.get(reverse('catalog-metrics'), HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    @override_settings(CATALOG_SLOW_QUERY_MS=0.000001)
+    def test_logs_slow_queries(self):
+        with self.assertLogs('catalog.metrics', 'WARNING') as logs:
+            self.client.get(reverse('books'))
+        self.assertIn('Consulta lenta', logs.output[0])
+        self.assertNotIn('desconocido', logs.output[0])
+        self.assertIn(('books', len(logs.output)), registry.snapshot()[1].items())
+
+    async def test_async_requests(self):
+        # con ASGI el middleware trabaja en modo asíncrono y cuenta las consultas que la vista hace con sync_to_async
+        async def view(request):
+            await sync_to_async(list)(Book.objects.all())
+            await sync_to_async(Author.objects.count)()
+            return HttpResponse('ok')
+
+        middleware = QueryMetricsMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        request = AsyncRequestFactory().get('/catalog/books/')
+        request.resolver_match = resolve(reverse('books'))
+        response = await middleware(request)
+        self.assertEqual(response.content, b'ok')
+        histograms = registry.snapshot()[0]
+        self.assertEqual(histograms[('catalog_request_queries', 'books')][0], ([0, 0, 1, 1, 1, 1, 1, 1, 1, 1], 2, 1))
+
+    def test_rolling_histogram_forgets_old_values(self):
+        histogram = RollingHistogram((1, 10, float('inf')), window=60, slots=6)
+        histogram.observe(0.5, now=0)
+        histogram.observe(20, now=30)
+        self.assertEqual(histogram.snapshot(now=30), ([1, 1, 2], 20.5, 2))
+        # pasada la ventana solo queda la observación más reciente
+        self.assertEqual(histogram.snapshot(now=65), ([0, 0, 1], 20, 1))
+        self.assertEqual(histogram.snapshot(now=200), ([0, 0, 0], 0, 0))
+        self.assertIsNone(histogram.quantile(0.5, now=200))
+        # las cuentas que se exportan en el histograma de Prometheus no bajan nunca
+        self.assertEqual(histogram.totals(), ([1, 1, 2], 20.5, 2))
+
+    def test_rolling_histogram_quantiles(self):
+        histogram = RollingHistogram((1, 10, float('inf')), window=60, slots=6)
+        for value in (0.5, 0.5, 0.5, 5, 50):
+            histogram.observe(value, now=0)
+        self.assertEqual(histogram.quantile(0.5, now=0), 1)
+        self.assertEqual(histogram.quantile(0.8, now=0), 10)
+        self.assertEqual(histogram.quantile(0.99, now=0), float('inf'))
+
+
+class OverdueLoansViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # el permiso can_mark_returned no llega a crearse (Book.Meta lo reemplaza por can_modify), así que usamos un superusuario
+        cls.librarian = User.objects.create_superuser(username='librarian', password='1X<ISRUkw+tuK')
+        User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        cls.book = Book.objects.create(title='Book', summary='Summary', isbn='111')
+
+    def add_readers(self, readers, copies_each, first=0):
+        today = datetime.date.today()
+        for number in range(first, first + readers):
+            borrower = User.objects.create_user(username=f'late{number}')
+            for copy_number in range(copies_each):
+                BookInstance.objects.create(book=self.book, imprint='Imprint', status='o', borrower=borrower,
+                                            due_back=today - datetime.timedelta(days=number + 1))
+
+    def test_requires_permission(self):
+        response = self.client.get(reverse('overdue-loans'))
+        self.assertRedirects(response, '/accounts/login/?next=/catalog/loans/overdue/')
+        self.client.login(username='reader', password='1X<ISRUkw+tuK')
+        self.assertEqual(self.client.get(reverse('overdue-loans')).status_code, 302)
+
+    def test_grouped_by_borrower(self):
+        self.add_readers(3, 2)
+        # una copia que no está atrasada no aparece
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='o', borrower=User.objects.get(username='reader'),
+                                    due_back=datetime.date.today() + datetime.timedelta(days=3))
+        self.client.login(username='librarian', password='1X<ISRUkw+tuK')
+        response = self.client.get(reverse('overdue-loans'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'catalog/bookinstance_list_overdue.html')
+        borrowers = response.context['borrowers']
+        # primero el atraso más antiguo
+        self.assertEqual([entry.borrower.username for entry in borrowers], ['late2', 'late1', 'late0'])
+        self.assertEqual([entry.count for entry in borrowers], [2, 2, 2])
+        self.assertEqual(borrowers[0].days_overdue, 3)
+        self.assertEqual(response.context['summary']['overdue'], 6)
+        self.assertEqual(response.context['summary']['on_loan'], 7)
+        self.assertEqual(response.context['summary']['due_soon'], 1)
+
+    def test_bounded_queries(self):
+        self.client.login(username='librarian', password='1X<ISRUkw+tuK')
+        self.add_readers(3, 2)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('overdue-loans'))
+
+        # más lectores (más de una página) y uno con muchas copias: las mismas consultas, y solo las primeras copias de cada lector
+        self.add_readers(30, 1, first=3)
+        self.add_readers(1, 15, first=33)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(reverse('overdue-loans'))
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+        self.assertTrue(response.context['is_paginated'])
+        entry = response.context['borrowers'][0]
+        self.assertEqual((entry.count, len(entry.copies), entry.copies_not_listed), (15, 10, 5))
+
+        self.assertEqual(self.client.get(reverse('overdue-loans') + '?page=99').status_code, 404)
+
+    def test_borrowed_lists_query_count(self):
+        # all-borrowed ya no hace una consulta por copia para el libro y el prestatario
+        self.client.login(username='librarian', password='1X<ISRUkw+tuK')
+        self.add_readers(2, 1)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(reverse('all-borrowed'))
+        self.add_readers(5, 1, first=2)
+        with CaptureQueriesContext(connection) as more:
+            response = self.client.get(reverse('all-borrowed'))
+        self.assertEqual(len(more.captured_queries), len(few.captured_queries))
+        self.assertContains(response, 'text-danger', count=7)
+
+
+from catalog.models import Hold
+
+class HoldViewsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        cls.other = User.objects.create_user(username='other', password='1X<ISRUkw+tuK')
+        author = Author.objects.create(first_name='John', last_name='Tolkien')
+        cls.book = Book.objects.create(title='Popular', summary='Summary', isbn='111', author=author)
+
+    def test_place_and_cancel_hold(self):
+        self.assertEqual(self.client.post(reverse('book-hold', args=[self.book.pk])).status_code, 302)
+        self.assertFalse(Hold.objects.exists()) # sin sesión no se reserva
+
+        self.client.login(username='reader', password='1X<ISRUkw+tuK')
+        self.assertEqual(self.client.get(reverse('book-hold', args=[self.book.pk])).status_code, 405) # solo POST
+        response = self.client.post(reverse('book-hold', args=[self.book.pk]))
+        self.assertRedirects(response, reverse('my-borrowed'))
+        hold = Hold.objects.get(user=self.reader)
+        self.assertEqual(hold.status, 'w')
+
+        response = self.client.get(reverse('my-borrowed'))
+        self.assertEqual(response.context['holds'], [hold])
+        self.assertContains(response, 'posición 1')
+        self.assertContains(self.client.get(reverse('book-detail', args=[self.book.pk])), reverse('book-hold', args=[self.book.pk]))
+
+        # nadie puede cancelar la reserva de otro
+        self.client.login(username='other', password='1X<ISRUkw+tuK')
+        self.assertEqual(self.client.post(reverse('hold-cancel', args=[hold.pk])).status_code, 404)
+        self.client.login(username='reader', password='1X<ISRUkw+tuK')
+        self.client.post(reverse('hold-cancel', args=[hold.pk]))
+        self.assertEqual(Hold.objects.get(pk=hold.pk).status, 'c')
@@ -1,6 +1,18 @@
+from django.conf import settings
 from django.urls import path, include
 
-from . import views
+from . import views, async_views
+
+# con CATALOG_ASYNC_VIEWS las páginas de lectura (inicio, listas y detalles de libros y autores) usan las vistas async def de
+# catalog/async_views.py, pensadas para un servidor ASGI (uvicorn/daphne con locallibrary/asgi.py)
+if settings.CATALOG_ASYNC_VIEWS:
+    index_view = async_views.index
+    book_list_view, book_detail_view = async_views.book_list, async_views.book_detail
+    author_list_view, author_detail_view = async_views.author_list, async_views.author_detail
+else:
+    index_view = views.index
+    book_list_view, book_detail_view = views.BookListView.as_view(), views.BookDetailView.as_view()
+    author_list_view, author_detail_view = views.AuthorListView.as_view(), views.AuthorDetailView.as_view()
 
 # Éste es donde añadimos nuestros patrones a medida que construimos la aplicación.
 # Al abrir la pagina web, como sabemos la url raíz d ela página nos va a redirigir al submodule /catalog/ dentro de esa url raíz
@@ -12,13 +24,13 @@ urlpatterns = [
     # Esta cadena que parece vacía, debe coincidir con la cadena envíada por include, si está vacía significa que la url terminó en /catalog/, pues es la parte que coincide y django la asume
     # por tanto esta sub-url sería el index de catalog porque no hay nada después de /catalog/
     # el parametro name, que identifica unicamente a esta url se puede usar para crear dinamicamente otra url usando su valor con jinja, es decir referirnos a este path dentro de una plantilla
-    path('', views.index, name='index'),
+    path('', index_view, name='index'),
 
     # si la url coincide con /books (que originalmente debe ser /catalog/books/) se llamará a la función de vista que servirá una página que muestre todos los libros
     # La función de vista tiene un formato diferente al anterior — eso es porque esta vista será en realidad implementada como una clase. 
     # Heredaremos desde una función de vista genérica existente que ya hace la mayoría de lo que queremos que esta función de vista haga, en lugar de escribir una nueva desde el inicio.
     # esto es similar a como tenemos una platilla html base la cual podemos usar en todas las otras plantillas en lugar de reescribirla desde cero
-    path('books/', views.BookListView.as_view(), name='books'),
+    path('books/', book_list_view, name='books'),
 
     # La página de detalle de libro desplegará información sobre un libro específico, a la que se accede usando la URL catalog/book/<id> (donde <id> es la clave primaria para el libro). 
     # Además de los campos en el modelo Book (autor, resumen, etc), listaremos también los detalles de las copias disponibles (BookInstances) incluyendo su estado, fecha de devolución esperada, edición e id.
@@ -26,7 +38,7 @@ urlpatterns = [
     # los corchetes angulares definen la parte de la URL a capturar (<int:pk>), encerrando el nombre de la variable que la vista puede utilizar para acceder a los datos capturados. 
     # Por ejemplo, <algo>, capturará el patrón marcado y pasará el valor a la vista como una variable "algo". Adicionalmente se peude añadir una etiqueta que defina el tipo de dato de la variable (en este caso, int)
     # entonces En este caso utilizamos '<int:pk>' para capturar el id del libro, que debe ser una cadena con un formato especial y pasarlo a la vista como un parámetro llamado pk (abreviatura de primary key).
-    path('book/<int:pk>', views.BookDetailView.as_view(), name='book-detail'),
+    path('book/<int:pk>', book_detail_view, name='book-detail'),
 
     # también se puede especificar un path de url con expresiones regulares, esto puede ser util para que el el filtrado del path solo acepte cadenas con un cierto número de carácteres, por ejemplo.
     # lo más básico es que las RE se declaran así: r'<tu expresión regular va aquí>'). Para ver parte del sintaxis ver tutorial django parte 6 mdn
@@ -38,22 +50,44 @@ urlpatterns = [
     # re_path(r'^book/(?P<pk>\d+)$', views.BookDetailView.as_view(), name='book-detail')
 
     # la pagina de lista de los autores
-    path('authors/', views.AuthorListView.as_view(), name='authors'), 
+    path('authors/', author_list_view, name='authors'), 
 
     #la pagina de vista detallada de los autores
-    path('author/<int:pk>', views.AuthorDetailView.as_view(), name='author-detail'),
+    path('author/<int:pk>', author_detail_view, name='author-detail'),
 
     # la pagina de vista que va a mostrar la lista de libros que tiene el user alquilado usando vista génerica basada en clases para listas
+    # búsqueda de texto completo en el catálogo, p. ej. /catalog/search/?q=tolkien
+    path('search/', views.SearchView.as_view(), name='search'),
+
+    # sugerencias de títulos y autores en JSON para el autocompletado, p. ej. /catalog/autocomplete/?q=tolk
+    path('autocomplete/', views.autocomplete_view, name='autocomplete'),
+
+    # descarga de libros, autores o copias en CSV o JSONL (opcionalmente con gzip), solo para el personal
+    path('export/<str:name>/', views.export_view, name='catalog-export'),
+
+    # métricas de rendimiento por vista en formato Prometheus (consultas, tiempo en la base de datos y en las plantillas), solo para el personal
+    path('metrics/', views.metrics_view, name='catalog-metrics'),
+
+    # reservar un libro (ponerse en la cola) y cancelar una reserva, solo por POST (ver catalog/holds.py)
+    path('book/<int:pk>/hold/', views.place_hold_view, name='book-hold'),
+    path('hold/<int:pk>/cancel/', views.cancel_hold_view, name='hold-cancel'),
+
     path('mybooks/', views.LoanedBooksByUserListView.as_view(), name='my-borrowed'),
 
     # pagina de vista solo para bibliotecarios que muestra todos los libros que han sido prestados y sus prestatarios respectivos
     path('allborrowed/', views.AllLoanedBooksListView.as_view(), name='all-borrowed'),
 
+    # copias atrasadas agrupadas por lector, solo para bibliotecarios
+    path('loans/overdue/', views.overdue_loans_librarian, name='overdue-loans'),
+
     # pagina que permitirá a los bibilotecarios renovar los libros prestados usando un django form
     # La configuración de URL redirigirá las URL con el formato /catalog/book/<bookinstance id>/renew/ a la función llamada renew_book_librarian() en views.py, 
     # y envia el id de BookInstance como parametro llamado pk.
     path('book/<uuid:pk>/renew/', views.renew_book_librarian, name='renew-book-librarian'),
 
+    # renovar, devolver o prestar varias copias a la vez (recibe las copias marcadas en la lista de todos los libros prestados)
+    path('loans/bulk/', views.bulk_loans_librarian, name='bulk-loans-librarian'),
+
     # configuración de url de las vistas de edición genéricas para crear, editar y eliminar autores
     path('author/create/', views.AuthorCreate.as_view(), name='author-create'),
     path('author/<int:pk>/update/', views.AuthorUpdate.as_view(), name='author-update'),
@@ -1,15 +1,37 @@
 from django.shortcuts import render
 from .models import Book, Author, BookInstance, Genre
 from django.views import generic
+from django.db.models import Count, Prefetch
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 
 # necessary imports for our form class
 from django.contrib.auth.decorators import permission_required
 from django.shortcuts import get_object_or_404
-from django.http import HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseRedirect, Http404, JsonResponse, StreamingHttpResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.paginator import InvalidPage
 from django.urls import reverse
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.utils.crypto import constant_time_compare
 import datetime
-from .forms import RenewBookForm
+from .forms import RenewBookForm, BulkLoanForm
+from .loans import bulk_renew, bulk_return, bulk_checkout
+from .stats import get_catalog_stats
+from .visits import get_visit_counter
+from .caching import author_books_page, cache_anonymous_page, CatalogFragmentCacheMixin
+from django.utils.decorators import method_decorator
+from .conditional import conditional_page, book_list_validators, book_detail_validators, author_list_validators, author_detail_validators
+from .pagination import CursorPaginationMixin
+from .search import SearchResults
+from . import autocomplete
+from .export import EXPORTS, FORMATS, export_lines, encode
+from .metrics import metrics_text
+from .overdue import overdue_by_borrower, overdue_summary
+from .holds import place_hold, cancel_hold, queue_position
+from .models import Hold
+from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import require_POST
 
 # vamos a usar vistas de edición genéricas para crear páginas para agregar funcionalidad para crear, editar y eliminar registros de Author de nuestra libreria
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
@@ -25,67 +47,179 @@ def index(request):
     Función vista para la página inicio del sitio.
     """
     # Genera contadores de algunos de los objetos principales, como de los libros y las instancias de cada uno
-    num_books=Book.objects.all().count()
-    num_instances=BookInstance.objects.all().count()
-    num_instances_available=BookInstance.objects.filter(status__exact='a').count() # Cuenta los Libros disponibles (los filtramos por: status = 'a')
-    num_authors=Author.objects.count()  # El 'all()' esta implícito por defecto.
-    num_genres=Genre.objects.count()
-    num_books_with_the=Book.objects.filter(title__icontains='the').count() #this will count only the books that contain the subtring 'the'. case insentive
-
-    # Numero de visitas a esta viissta, como está contado en la variable de sesión.
-    # request.session.get es para obtener un valor dentro de la sesión que tenga el nombre que se coloca en el primer parámetro
-    # si no existe ese dato en la sesión, lo crea y le da un valor de 0, como establece el segundo parametro
-    # y cada vez que se recibe una solicitud a la pagina de index, o se llama esta función, que es igual, se incrementa el valor por 1
-    num_visits = request.session.get('num_visits', 0)
-    request.session['num_visits'] = num_visits + 1
-
-    # la información de la sesión se guarda automáticamente, porque Django solo guarda información en la base de datos de sesión y envía la cookie de sesión al cliente cuando la sesión ha sido modificada (asignada) o eliminada. 
-    # Si estás actualizando algún dato usando su clave de sesión no hay que preocuparse por esto. esto solo funciona al cambiar un dato de la sesión, y no DENTRO de ella, ver abajo
+    # (libros, copias, copias disponibles, autores, géneros y libros que contienen 'the' en el título).
+    # Antes eran seis consultas count() separadas; ahora get_catalog_stats() los calcula en una sola consulta y los guarda en caché (ver catalog/stats.py)
+    stats = get_catalog_stats()
+
+    # Numero de visitas a esta vista. Antes se contaba en la variable de sesión (request.session['num_visits']), pero modificar la sesión
+    # la guarda en la base de datos en cada visita. Ahora lo cuenta un contador intercambiable (por defecto en una cookie firmada),
+    # elegido con CATALOG_VISIT_COUNTER en settings.py (ver catalog/visits.py): visit() devuelve las visitas anteriores y cuenta esta.
+    visit_counter = get_visit_counter()
+    num_visits = visit_counter.visit(request)
 
     # Renderiza la plantilla HTML index.html, envíando los datos obtenidos de los modelos en un diccionario
     # la función render va a buscar la plantilla en el directorio templates o en otras palabras espera encontrar el archivo: /locallibrary/catalog/templates/index.html
-    return render(
+    response = render(
         request, #HTTP
         'index.html', #Plantilla
-        context={'num_books':num_books,'num_instances':num_instances,'num_instances_available':num_instances_available,'num_authors':num_authors, 'num_genres':num_genres, 'num_books_with_the':num_books_with_the, 'num_visits':num_visits}, # Datos
+        context={**stats, 'num_visits':num_visits}, # Datos
     )
+    # algunos contadores guardan el número (o el identificador del visitante) en una cookie de la respuesta
+    visit_counter.save(request, response)
+    return response
 
 # para la página de vista de la lista de los libros en lugar de una función de vista regular se va a usar una vista de lista genérica basada en clases (ListView) — una clase que hereda una vista ya existente que toma como módelo, por eso es generica.
 # esta ya implementa la mayoría de la funcionalidad que necesitamos, y sigue la práctica adecuada de Django, seremos capaces de crear una vista de lista más robusta con menos código, menos repetición, y por último menos mantenimiento.
 
+# Las vistas de lista usan CursorPaginationMixin (catalog/pagination.py): si CATALOG_CURSOR_PAGINATION está activado en settings.py,
+# paginan por cursor (?cursor=...) en vez de por número de página (?page=N), así las páginas profundas no se vuelven más lentas.
+
 # Con esto ya La vista genérica consultará a la base de datos para obtener todos los registros del modelo especificado (Book) y renderizará una plantilla ubicada en /locallibrary/catalog/templates/catalog/book_list.html (que crearemos más abajo). 
 # Dentro de la plantilla puedes acceder a la lista de libros mediante la variable de plantilla llamada object_list O book_list (esto es, genéricamente, "nombre_del_modelo_list").
 
-class BookListView(generic.ListView):
+# Las listas y los detalles de libros y autores se guardan completos en caché para los visitantes anónimos (cache_anonymous_page),
+# y las listas también guardan en caché el fragmento con los resultados para los usuarios con sesión (ver catalog/caching.py).
+# conditional_page responde 304 Not Modified si el navegador ya tiene la versión actual de la página (solo a los visitantes anónimos, ver catalog/conditional.py);
+# va primero para que en ese caso ni siquiera se busque la página en caché.
+@method_decorator(conditional_page(book_list_validators), name='dispatch')
+@method_decorator(cache_anonymous_page('books'), name='dispatch')
+class BookListView(CatalogFragmentCacheMixin, CursorPaginationMixin, generic.ListView):
     model = Book # obtener todos los datos del modelo book de la base de datos
     paginate_by = 3 # para añadir paginación los items deben tener un orden definido, ya sea aquí mismo en al vista o en la clase del módelo, como hice yo
     context_object_name = 'book_list'   # su propio nombre para la lista como variable de plantilla
     template_name = 'books/my_arbitrary_template_name_list.html'  # Especifique su propio nombre/ubicación de plantilla
     # queryset = Book.objects.filter(title__icontains='war')[:5] # Consigue 5 libros que contengan el título de guerra, ajustando el queryset con filter.
 
+    # la plantilla muestra {{book.author}} en cada fila; sin select_related cada libro haría otra consulta a Author (el problema "N+1").
+    # select_related trae el autor en la misma consulta con un JOIN. Si la plantilla también mostrara los géneros, poner prefetch_genres = True
+    # hace una sola consulta extra para todos los géneros de la página (prefetch_related) en lugar de una por libro.
+    prefetch_genres = False
+
+    def get_queryset(self):
+        queryset = super().get_queryset().select_related('author')
+        if self.prefetch_genres:
+            queryset = queryset.prefetch_related('genre')
+        return queryset
+
 # vista detallada de un libro en específico basado también en vistas genéricas (esta vez no es de listas sino de detalle como el nombre indica)
 #  con estas líneas Lo único que necesitas hacer ahora es crear una plantilla llamada /locallibrary/catalog/templates/catalog/book_detail.html, 
 # y la vista enviará la información en la base de datos para el registro del libro específico, extraído por el mapeador URL. 
 # Dentro de la plantilla puedes acceder a la lista de libros mediante la variable de plantilla llamada object o book (esto es, genéricamente, "el_nombre_del_modelo").
     
+@method_decorator(conditional_page(book_detail_validators), name='dispatch')
+@method_decorator(cache_anonymous_page('book-detail'), name='dispatch')
 class BookDetailView(generic.DetailView):
     model = Book
 
-class AuthorListView(generic.ListView):
+    # la plantilla usa book.author, book.genre.all y las copias del libro. Sin ajustar el queryset cada una de esas cosas es otra consulta
+    # (y los títulos populares tienen cientos de copias). Traemos el autor con un JOIN (select_related) y los géneros y las copias
+    # con una consulta cada uno (prefetch_related). De las copias solo listamos las primeras max_copies_listed; el resto se resume por estado.
+    max_copies_listed = 50
+
+    def get_queryset(self):
+        listed_copies = BookInstance.objects.all()[:self.max_copies_listed]
+        return Book.objects.select_related('author').prefetch_related(
+            'genre',
+            Prefetch('bookinstance_set', queryset=listed_copies, to_attr='listed_copies'),
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super(BookDetailView, self).get_context_data(**kwargs)
+        # resumen de copias por estado (disponibles, prestadas, en mantenimiento...) con una sola consulta agrupada
+        counts = dict(self.object.bookinstance_set.order_by().values_list('status').annotate(total=Count('pk')))
+        context['copy_summary'] = [(status, label, counts.get(status, 0)) for status, label in BookInstance.LOAN_STATUS]
+        context['num_copies'] = sum(counts.values())
+        context['num_copies_not_listed'] = context['num_copies'] - len(self.object.listed_copies)
+        return context
+
+@method_decorator(conditional_page(author_list_validators), name='dispatch')
+@method_decorator(cache_anonymous_page('authors'), name='dispatch')
+class AuthorListView(CatalogFragmentCacheMixin, CursorPaginationMixin, generic.ListView):
     model = Author
     context_object_name = 'author_list'
     paginate_by = 10
 
+@method_decorator(conditional_page(author_detail_validators), name='dispatch')
+@method_decorator(cache_anonymous_page('author-detail'), name='dispatch')
 class AuthorDetailView(generic.DetailView):
     model = Author
+    books_paginate_by = 10 # los autores prolíficos pueden tener cientos de libros, así que los paginamos
 
     # envíamos información adicional para que la página de vista reciba la lista de libros escritos por el autor actual
+    # solo la página pedida (?page=N), con las columnas que usa la plantilla y guardada en caché por autor (ver catalog/caching.py)
     def get_context_data(self, **kwargs):
         context = super(AuthorDetailView, self).get_context_data(**kwargs)
-        context['book_list'] = Book.objects.filter(author=self.object).all
+        try:
+            page = author_books_page(self.object, self.request.GET.get('page') or 1, self.books_paginate_by)
+        except InvalidPage:
+            raise Http404('Página no válida')
+        context['book_list'] = page.object_list
+        # mismos nombres que usan las vistas de lista, así el bloque de paginación de base_generic.html funciona igual
+        context['paginator'] = page.paginator
+        context['page_obj'] = page
+        context['is_paginated'] = page.has_other_pages()
+        return context
+
+class SearchView(generic.ListView):
+    """
+    Búsqueda de texto completo en el catálogo (?q=...): título, resumen, ISBN, autor y géneros, ordenados por relevancia.
+    El trabajo lo hace catalog/search.py; SearchResults se puede paginar como un queryset, así que ListView se encarga del resto.
+    """
+    template_name = 'catalog/search_results.html'
+    context_object_name = 'book_list'
+    paginate_by = 10
+
+    def get_queryset(self):
+        return SearchResults(self.request.GET.get('q', ''))
+
+    def get_context_data(self, **kwargs):
+        context = super(SearchView, self).get_context_data(**kwargs)
+        context['query'] = self.object_list.text
         return context
 
-class LoanedBooksByUserListView(LoginRequiredMixin,generic.ListView):
+def autocomplete_view(request):
+    """
+    Sugerencias de títulos y autores mientras se escribe (?q=...), en JSON. Las busca en un índice de trigramas en memoria
+    (catalog/autocomplete.py), así que no consulta la base de datos salvo la primera vez que se construye el índice en cada proceso.
+    """
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 10)), 20))
+    except ValueError:
+        limit = 10
+    results = autocomplete.suggest(request.GET.get('q', ''), limit)
+    for result in results:
+        result['url'] = reverse('book-detail' if result['type'] == 'book' else 'author-detail', args=[str(result['id'])])
+    return JsonResponse({'results': results})
+
+@staff_member_required
+def export_view(request, name):
+    """
+    Descarga de una exportación del catálogo (books, authors o copies) solo para el personal, p. ej. /catalog/export/books/?format=jsonl&gzip=1.
+    Con StreamingHttpResponse cada trozo se envía en cuanto se genera (ver catalog/export.py), así que la memoria no crece con la tabla.
+    """
+    format = request.GET.get('format', 'csv')
+    if name not in EXPORTS or format not in FORMATS:
+        raise Http404('Exportación no encontrada')
+    compress = request.GET.get('gzip') in ('1', 'true')
+
+    filename = f'{name}.{format}' + ('.gz' if compress else '')
+    content_type = 'application/gzip' if compress else ('text/csv' if format == 'csv' else 'application/x-ndjson') + '; charset=utf-8'
+    response = StreamingHttpResponse(encode(export_lines(name, format), compress=compress), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def metrics_view(request):
+    """
+    Métricas de rendimiento por vista en el formato de texto de Prometheus (ver catalog/metrics.py). Solo para el personal, o para quien envíe
+    la cabecera Authorization: Bearer <CATALOG_METRICS_TOKEN> (así Prometheus puede leerlas sin iniciar sesión).
+    """
+    token = getattr(settings, 'CATALOG_METRICS_TOKEN', '')
+    authorized = bool(token) and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not authorized and not (request.user.is_active and request.user.is_staff):
+        raise PermissionDenied
+    return HttpResponse(metrics_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+class LoanedBooksByUserListView(LoginRequiredMixin, CursorPaginationMixin, generic.ListView):
     """
     Vista genérica basada en clases que enumera los libros prestados al usuario actual. Estamos usando LoginRequiredMixin para solo permitir el acceso a los usuarios logeados
     """
@@ -96,10 +230,21 @@ class LoanedBooksByUserListView(LoginRequiredMixin,generic.ListView):
     # editar el queryset para obtener en el contexto solo los libros que en su campo borrower tengan como valor el usuario actual
     # Nótese que "o" es el código almacenado para "on loan" (en alquiler) y vamos a ordenar por la fecha due_back para que los elementos más antiguos se muestren primero.
 
+    # with_overdue() calcula en SQL si cada copia está atrasada (la plantilla usa bookinst.is_overdue) y select_related('book')
+    # trae el título de cada libro en la misma consulta
     def get_queryset(self):
-        return BookInstance.objects.filter(borrower=self.request.user).filter(status__exact='o').order_by('due_back')
+        return BookInstance.objects.filter(borrower=self.request.user).on_loan().with_overdue().select_related('book').order_by('due_back')
+
+    def get_context_data(self, **kwargs):
+        # las reservas activas del usuario, con su posición en la cola de cada libro (ver catalog/holds.py)
+        context = super().get_context_data(**kwargs)
+        holds = list(Hold.objects.filter(user=self.request.user, status__in=Hold.ACTIVE_STATUSES).select_related('book'))
+        for hold in holds:
+            hold.position = queue_position(hold)
+        context['holds'] = holds
+        return context
     
-class AllLoanedBooksListView(PermissionRequiredMixin, generic.ListView):
+class AllLoanedBooksListView(PermissionRequiredMixin, CursorPaginationMixin, generic.ListView):
     """
     Vista genérica basada en clases que enumera los libros todos los libros prestados de la biblioteca con su respectivo prestatario. 
     Estamos usando PermissionRequiredMixin para solo permitir el acceso a los bibliotecarios
@@ -116,10 +261,53 @@ class AllLoanedBooksListView(PermissionRequiredMixin, generic.ListView):
 
     # filtrar todos los libros que tengan de status "on loan"
 
+    # igual que en LoanedBooksByUserListView, con with_overdue() y select_related() para no hacer dos consultas más por copia (libro y prestatario)
     def get_queryset(self):
-        return BookInstance.objects.filter(status__exact='o').order_by('due_back')
+        return BookInstance.objects.on_loan().with_overdue().select_related('book', 'borrower').order_by('due_back')
+
+    def get_context_data(self, **kwargs):
+        context = super(AllLoanedBooksListView, self).get_context_data(**kwargs)
+        # fecha propuesta para renovar las copias marcadas, la misma que propone renew_book_librarian
+        context['proposed_renewal_date'] = datetime.date.today() + datetime.timedelta(weeks=3)
+        return context
     
     
+@require_POST
+@login_required
+def place_hold_view(request, pk):
+    """
+    Reserva el libro para el usuario (lo pone en la cola, o le aparta una copia si hay alguna disponible) y lo lleva a sus préstamos y reservas.
+    """
+    place_hold(get_object_or_404(Book, pk=pk), request.user)
+    return HttpResponseRedirect(reverse('my-borrowed'))
+
+@require_POST
+@login_required
+def cancel_hold_view(request, pk):
+    """
+    Cancela una reserva del usuario; si tenía una copia apartada, pasa a la siguiente persona en la cola.
+    """
+    cancel_hold(get_object_or_404(Hold, pk=pk, user=request.user))
+    return HttpResponseRedirect(reverse('my-borrowed'))
+
+@permission_required('catalog.can_mark_returned')
+def overdue_loans_librarian(request):
+    """
+    Copias atrasadas agrupadas por lector (los que llevan más tiempo de atraso primero), paginando por lectores.
+    Las consultas son siempre las mismas sin importar cuántos préstamos haya (ver overdue_by_borrower en catalog/overdue.py).
+    """
+    try:
+        page, borrowers = overdue_by_borrower(request.GET.get('page') or 1, per_page=20)
+    except InvalidPage:
+        raise Http404('Página no válida')
+    return render(request, 'catalog/bookinstance_list_overdue.html', {
+        'borrowers': borrowers,
+        'page_obj': page,
+        'paginator': page.paginator,
+        'is_paginated': page.has_other_pages(),
+        'summary': overdue_summary(),
+    })
+
 # restringir el acceso a la vista a los bibliotecarios. Probablemente deberíamos crear un nuevo permiso en BookInstance ("can_renew"),
 # pero para simplificar las cosas aquí solo usamos el decorator @permission_required con nuestro existente permiso can_mark_returned.
 @permission_required('catalog.can_mark_returned')
@@ -159,6 +347,36 @@ def renew_book_librarian(request, pk):
     return render(request, 'catalog/book_renew_librarian.html', {'form': form, 'bookinst':book_inst})
 
 
+# renovar, devolver o prestar muchas copias a la vez. El formulario de la lista de todos los libros prestados envía aquí las copias marcadas.
+# En vez de una consulta por copia, catalog/loans.py aplica el cambio a todas con un solo UPDATE dentro de una transacción,
+# y la página de respuesta muestra el resultado de cada copia (p. ej. las que ya no estaban prestadas no se renuevan).
+@permission_required('catalog.can_mark_returned')
+def bulk_loans_librarian(request):
+    """
+    View function for renewing, returning or checking out several BookInstances at once
+    """
+    if request.method != 'POST':
+        return HttpResponseRedirect(reverse('all-borrowed'))
+
+    form = BulkLoanForm(request.POST)
+    results = []
+    if form.is_valid():
+        copies = form.cleaned_data['copies']
+        action = form.cleaned_data['action']
+        if action == 'renew':
+            results = bulk_renew(copies, form.cleaned_data['renewal_date'])
+        elif action == 'return':
+            results = bulk_return(copies)
+        else:
+            results = bulk_checkout(copies, form.cleaned_data['borrower'], form.cleaned_data['renewal_date'])
+
+    return render(request, 'catalog/bookinstance_bulk_loans.html', {
+        'form': form,
+        'results': results,
+        'num_done': sum(result.ok for result in results),
+    })
+
+
 # El algoritmo de manejo de formularios que utilizamos en nuestro ejemplo de vista de funciones anterior representa un patrón extremadamente común en las vistas de edición de formularios. 
 # Django extrae gran parte de esta "plantilla" para ti, para crear vistas de edición genéricas ( generic editing views ) para crear, editar y eliminar vistas basadas en modelos.
 # No solo manejan el comportamiento de "vista", sino que crean automáticamente la clase de formulario (un ModelForm) para tu modelo.
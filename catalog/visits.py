@@ -0,0 +1,252 @@
+"""
+Contador de visitas de la página de inicio ("You have visited this page N times").
+
+Antes el contador vivía en la sesión: request.session['num_visits'] = num_visits + 1 modifica la sesión en cada visita, así que
+Django la guarda en la tabla django_session en cada petición y cada visita anónima se convertía en una escritura en la base de datos.
+Ahora el contador es intercambiable; CATALOG_VISIT_COUNTER en settings.py elige la clase:
+
+- SignedCookieVisitCounter (por defecto): el número viaja en una cookie firmada. El servidor no guarda nada.
+- CacheVisitCounter: el número se guarda en la caché, con un identificador de visitante en una cookie firmada (o el usuario si inició sesión).
+- BufferedVisitCounter: suma las visitas en memoria y un hilo en segundo plano las escribe en la tabla VisitCount por lotes (cada
+  CATALOG_VISITS_FLUSH_EVERY visitas o CATALOG_VISITS_FLUSH_INTERVAL segundos), en una sola transacción en lugar de una escritura por visita.
+- SessionVisitCounter: el comportamiento anterior, con la sesión.
+
+Uso en una vista: counter = get_visit_counter(); num_visits = counter.visit(request); ...; counter.save(request, response)
+"""
+import atexit
+import collections
+import logging
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils.module_loading import import_string
+
+from .models import VisitCount
+
+logger = logging.getLogger(__name__)
+
+# un año; el contador de visitas no es un dato importante, pero que no se pierda al cerrar el navegador
+COOKIE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+class VisitCounter:
+    """
+    Clase base. visit() devuelve cuántas veces había visitado la página este visitante antes de esta visita y cuenta la nueva;
+    save() recibe la respuesta para poder guardar lo que haga falta en ella (p. ej. una cookie).
+    """
+    def visit(self, request):
+        raise NotImplementedError
+
+    def save(self, request, response):
+        pass
+
+
+class SignedCookieVisitCounter(VisitCounter):
+    cookie_name = 'catalog_visits'
+    salt = 'catalog.visits'
+
+    def visit(self, request):
+        try:
+            num_visits = int(request.get_signed_cookie(self.cookie_name, default=0, salt=self.salt))
+        except ValueError:
+            num_visits = 0
+        request._catalog_visits = num_visits + 1
+        return num_visits
+
+    def save(self, request, response):
+        if hasattr(request, '_catalog_visits'):
+            response.set_signed_cookie(self.cookie_name, request._catalog_visits, salt=self.salt,
+                                       max_age=COOKIE_MAX_AGE, httponly=True, samesite='Lax')
+
+
+class VisitorIdMixin:
+    """
+    Identifica al visitante: el usuario si inició sesión, si no un identificador aleatorio en una cookie firmada.
+    """
+    cookie_name = 'catalog_visitor'
+    salt = 'catalog.visits.visitor'
+
+    def visitor_id(self, request):
+        if request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        visitor = request.get_signed_cookie(self.cookie_name, default=None, salt=self.salt)
+        if visitor is None:
+            visitor = uuid.uuid4().hex
+            request._catalog_new_visitor = visitor
+        return f'anonymous:{visitor}'
+
+    def save(self, request, response):
+        visitor = getattr(request, '_catalog_new_visitor', None)
+        if visitor is not None:
+            response.set_signed_cookie(self.cookie_name, visitor, salt=self.salt,
+                                       max_age=COOKIE_MAX_AGE, httponly=True, samesite='Lax')
+
+
+class CacheVisitCounter(VisitorIdMixin, VisitCounter):
+
+    def visit(self, request):
+        key = f'catalog:visits:{self.visitor_id(request)}'
+        try:
+            return cache.incr(key) - 1
+        except ValueError:
+            # primera visita (o la entrada expiró); add() no pisa el valor si otra petición la creó mientras tanto
+            if cache.add(key, 1, COOKIE_MAX_AGE):
+                return 0
+            return cache.incr(key) - 1
+
+
+class BufferedVisitCounter(VisitorIdMixin, VisitCounter):
+    """
+    Cuenta en memoria y escribe en la base de datos por lotes desde un hilo en segundo plano, nunca durante una petición.
+    Cada proceso tiene su propio búfer y una caché (known) con el total guardado de cada visitante que ya conoce, así que solo la
+    primera visita de un visitante en este proceso consulta VisitCount. El total de un visitante es lo conocido más lo que se está
+    escribiendo (flushing) más lo pendiente. Si el proceso termina de forma abrupta se pierden como mucho las visitas de un lote.
+
+    Con CATALOG_VISITS_BACKGROUND_FLUSH = False no se inicia el hilo y el lote se escribe en la petición que lo completa
+    (p. ej. en las pruebas, donde la base de datos está dentro de una transacción que el hilo no vería).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock() # un solo flush a la vez, para que flushing y known no se mezclen
+        self.pending = {}
+        self.flushing = {}
+        self.known = collections.OrderedDict() # visitante -> visitas guardadas, los usados más recientemente al final
+        self.flushed_at = time.monotonic()
+        self.wake_up = threading.Event()
+        self.thread = None
+        self.pid = None
+        atexit.register(self.flush_at_exit)
+
+    def visit(self, request):
+        visitor = self.visitor_id(request)
+        with self.lock:
+            stored = self.known.get(visitor)
+        if stored is None:
+            stored = VisitCount.objects.filter(visitor=visitor).values_list('visits', flat=True).first() or 0
+        with self.lock:
+            # si un flush ya actualizó known mientras consultábamos, su valor es más reciente que el nuestro
+            stored = self.known.setdefault(visitor, stored)
+            self.known.move_to_end(visitor)
+            while len(self.known) > getattr(settings, 'CATALOG_VISITS_CACHE_SIZE', 10000):
+                self.known.popitem(last=False)
+            num_visits = stored + self.flushing.get(visitor, 0) + self.pending.get(visitor, 0)
+            self.pending[visitor] = self.pending.get(visitor, 0) + 1
+            due = (sum(self.pending.values()) >= getattr(settings, 'CATALOG_VISITS_FLUSH_EVERY', 100)
+                   or time.monotonic() - self.flushed_at >= getattr(settings, 'CATALOG_VISITS_FLUSH_INTERVAL', 10))
+        if not getattr(settings, 'CATALOG_VISITS_BACKGROUND_FLUSH', True):
+            if due:
+                self.flush()
+        else:
+            self.start()
+            if due:
+                self.wake_up.set()
+        return num_visits
+
+    def start(self):
+        """
+        Inicia el hilo que escribe los lotes (uno por proceso: después de un fork el hijo inicia el suyo).
+        """
+        with self.lock:
+            if self.pid == os.getpid() and self.thread is not None:
+                return
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self.run, name='catalog-visits-flush', daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while True:
+            self.wake_up.wait(getattr(settings, 'CATALOG_VISITS_FLUSH_INTERVAL', 10))
+            self.wake_up.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('No se pudieron guardar las visitas pendientes')
+            finally:
+                # este hilo tiene su propia conexión; la cerramos (o la devolvemos al pool) hasta el siguiente lote
+                connection.close()
+
+    def flush_at_exit(self):
+        # al terminar el proceso la base de datos puede no estar disponible; en ese caso se pierde el último lote
+        try:
+            self.flush()
+        except DatabaseError:
+            logger.warning('No se pudieron guardar las visitas pendientes al terminar el proceso')
+
+    def flush(self):
+        """
+        Escribe las visitas pendientes en una sola transacción: un UPDATE visits = visits + n por visitante que ya tenía fila
+        y un bulk_create para los nuevos. Después guarda en known los totales escritos.
+        """
+        with self.flush_lock:
+            with self.lock:
+                pending, self.pending = self.pending, {}
+                self.flushing = pending
+                self.flushed_at = time.monotonic()
+            if not pending:
+                return
+            try:
+                self.write(pending)
+            except BaseException:
+                # la transacción se revirtió: las visitas vuelven al búfer para el siguiente intento
+                with self.lock:
+                    for visitor, count in pending.items():
+                        self.pending[visitor] = self.pending.get(visitor, 0) + count
+                    self.flushing = {}
+                raise
+            try:
+                totals = dict(VisitCount.objects.filter(visitor__in=pending).values_list('visitor', 'visits'))
+            except DatabaseError:
+                totals = None
+            with self.lock:
+                for visitor in pending:
+                    if totals is None:
+                        self.known.pop(visitor, None) # la próxima visita lo vuelve a leer
+                    else:
+                        # también los que aún no estaban: una visita que los consultó antes de escribir el lote usará este valor
+                        self.known[visitor] = totals.get(visitor, 0)
+                self.flushing = {}
+
+    def write(self, pending):
+        with transaction.atomic():
+            existing = set(VisitCount.objects.select_for_update().filter(visitor__in=pending).values_list('visitor', flat=True))
+            for visitor in existing:
+                VisitCount.objects.filter(visitor=visitor).update(visits=F('visits') + pending[visitor])
+            new = [VisitCount(visitor=visitor, visits=count) for visitor, count in pending.items() if visitor not in existing]
+            try:
+                with transaction.atomic():
+                    VisitCount.objects.bulk_create(new)
+            except IntegrityError:
+                # otro proceso creó alguna de estas filas al mismo tiempo; las sumamos una por una
+                for visit_count in new:
+                    VisitCount.objects.get_or_create(visitor=visit_count.visitor)
+                    VisitCount.objects.filter(visitor=visit_count.visitor).update(visits=F('visits') + visit_count.visits)
+
+
+class SessionVisitCounter(VisitCounter):
+    """
+    El contador en la sesión, como antes: cada visita modifica la sesión y la guarda (una escritura en django_session con el motor db).
+    """
+    def visit(self, request):
+        num_visits = request.session.get('num_visits', 0)
+        request.session['num_visits'] = num_visits + 1
+        return num_visits
+
+
+_counters = {}
+
+
+def get_visit_counter():
+    """
+    Instancia (una por proceso) de la clase indicada en CATALOG_VISIT_COUNTER.
+    """
+    path = getattr(settings, 'CATALOG_VISIT_COUNTER', 'catalog.visits.SignedCookieVisitCounter')
+    if path not in _counters:
+        _counters[path] = import_string(path)()
+    return _counters[path]
@@ -0,0 +1,197 @@
+"""
+Pool de conexiones a la base de datos dentro de cada proceso (cada worker de gunicorn), sin depender del motor de base de datos.
+
+Lo usa el backend locallibrary.db.postgresql_pool: en lugar de abrir una conexión nueva en cada petición (con CONN_MAX_AGE = 0) o de guardar
+una conexión por hilo durante minutos (CONN_MAX_AGE = 500, que con muchos workers agota las conexiones de PostgreSQL y, tras una
+conmutación por error, entrega conexiones muertas), al terminar la petición la conexión vuelve al pool y la siguiente petición la reutiliza.
+
+- Como mucho max_size conexiones abiertas por pool; si están todas en uso, acquire() espera hasta timeout segundos y luego lanza PoolTimeout.
+- Una conexión que lleva más de check_idle segundos sin usarse se comprueba (check) antes de entregarla; si no responde se descarta y se
+  toma otra. Las conexiones con más de max_lifetime segundos se cierran al devolverlas o al tomarlas, para que se repartan de nuevo
+  entre los servidores después de una conmutación o de un cambio en el balanceador.
+- Después de un fork (gunicorn --preload) el proceso hijo no usa las conexiones del padre: empieza con el pool vacío.
+
+pool_stats() devuelve los contadores de todos los pools del proceso (los publica catalog/metrics.py).
+"""
+import collections
+import os
+import threading
+import time
+
+
+class PoolTimeout(Exception):
+    """
+    No se liberó ninguna conexión del pool en el tiempo de espera.
+    """
+
+
+class ConnectionPool:
+    """
+    Conexiones libres de un mismo destino (alias y parámetros de conexión). connect() abre una conexión nueva, check(conexión) devuelve
+    si sigue funcionando y discard(conexión) la cierra. Es seguro usarlo desde varios hilos.
+    """
+    def __init__(self, connect, check, discard, max_size=10, timeout=10.0, max_lifetime=3600.0, check_idle=30.0, clock=time.monotonic):
+        self.connect = connect
+        self.check = check
+        self.discard = discard
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_idle = check_idle
+        self.clock = clock
+        self.condition = threading.Condition()
+        self.pid = os.getpid()
+        self.idle = collections.deque() # (conexión, creada, último uso); se toma la última en volver, así las que sobran envejecen y se cierran
+        self.born = {} # id(conexión) -> cuándo se abrió, para las que están en uso
+        self.size = 0 # conexiones abiertas: libres más en uso
+        self.counters = dict.fromkeys(['acquired', 'created', 'discarded', 'waits', 'timeouts', 'health_check_failures'], 0)
+        self.wait_seconds = 0.0
+
+    def _after_fork(self):
+        # las conexiones del proceso padre no son nuestras: las olvidamos sin cerrarlas (cerrarlas cortaría las del padre)
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.idle.clear()
+            self.born.clear()
+            self.size = 0
+
+    def acquire(self):
+        """
+        Una conexión del pool (o una nueva si hay sitio). Lanza PoolTimeout si todas siguen en uso pasados timeout segundos.
+        """
+        started = self.clock()
+        deadline = started + self.timeout
+        waited = False
+        while True:
+            with self.condition:
+                self._after_fork()
+                while not self.idle and self.size >= self.max_size:
+                    remaining = deadline - self.clock()
+                    if remaining <= 0:
+                        self.counters['timeouts'] += 1
+                        raise PoolTimeout(f'Las {self.max_size} conexiones del pool siguen en uso después de {self.timeout} s')
+                    if not waited:
+                        waited = True
+                        self.counters['waits'] += 1
+                    self.condition.wait(remaining)
+                if waited:
+                    self.wait_seconds += self.clock() - started
+                    waited = False
+                if self.idle:
+                    connection, born, last_used = self.idle.pop()
+                else:
+                    connection, born, last_used = None, None, None
+                    self.size += 1
+
+            if connection is None:
+                return self._open()
+            now = self.clock()
+            if now - born > self.max_lifetime:
+                self._forget(connection)
+                continue
+            if now - last_used > self.check_idle and not self.check(connection):
+                with self.condition:
+                    self.counters['health_check_failures'] += 1
+                self._forget(connection)
+                continue
+            with self.condition:
+                self.born[id(connection)] = born
+                self.counters['acquired'] += 1
+            return connection
+
+    def _open(self):
+        try:
+            connection = self.connect()
+        except BaseException:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise
+        with self.condition:
+            self.born[id(connection)] = self.clock()
+            self.counters['created'] += 1
+            self.counters['acquired'] += 1
+        return connection
+
+    def _forget(self, connection):
+        """
+        Cierra una conexión que ya no está en el pool y deja su sitio libre.
+        """
+        with self.condition:
+            self.size -= 1
+            self.counters['discarded'] += 1
+            self.condition.notify()
+        try:
+            self.discard(connection)
+        except Exception:
+            pass # una conexión rota puede fallar también al cerrarla
+
+    def release(self, connection, reusable=True):
+        """
+        Devuelve una conexión tomada con acquire(). Con reusable=False (p. ej. si quedó en un estado desconocido) se cierra.
+        """
+        with self.condition:
+            if self.pid != os.getpid():
+                return # la tomó el proceso padre antes del fork
+            born = self.born.pop(id(connection), None)
+            if born is not None and reusable and self.clock() - born <= self.max_lifetime:
+                self.idle.append((connection, born, self.clock()))
+                self.condition.notify()
+                return
+        self._forget(connection)
+
+    def close(self):
+        """
+        Cierra las conexiones libres (las que están en uso se cierran al devolverlas).
+        """
+        with self.condition:
+            idle = [connection for connection, _, _ in self.idle]
+            self.idle.clear()
+            self.max_lifetime = -1 # las que están en uso no vuelven al pool
+        for connection in idle:
+            self._forget(connection)
+
+    def stats(self):
+        with self.condition:
+            return {
+                'max_size': self.max_size,
+                'open': self.size,
+                'idle': len(self.idle),
+                'in_use': self.size - len(self.idle),
+                'wait_seconds': self.wait_seconds,
+                **self.counters,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, label, factory):
+    """
+    El pool de key (p. ej. el alias y los parámetros de conexión), creado con factory() la primera vez. label identifica al pool en las métricas.
+    """
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = (label, factory())
+        return _pools[key][1]
+
+
+def close_pools(alias=None):
+    """
+    Cierra y olvida los pools del proceso (o los de un alias), p. ej. antes de borrar la base de datos de pruebas.
+    """
+    with _pools_lock:
+        keys = [key for key in _pools if alias is None or key[0] == alias]
+        closing = [_pools.pop(key)[1] for key in keys]
+    for pool in closing:
+        pool.close()
+
+
+def pool_stats():
+    """
+    {(alias, base de datos): contadores} de todos los pools de este proceso.
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {label: pool.stats() for label, pool in pools}
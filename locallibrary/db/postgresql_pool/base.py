@@ -0,0 +1,92 @@
+"""
+Backend de PostgreSQL con un pool de conexiones por proceso (ver locallibrary/db/pool.py). Se activa con DATABASE_POOL=1 en settings.py.
+
+Es el backend de Django (django.db.backends.postgresql, con psycopg2 o psycopg 3) con dos cambios: get_new_connection() toma una conexión del
+pool en lugar de abrir una nueva, y _close() la devuelve al pool en lugar de cerrarla. Como Django "cierra" la conexión al final de cada
+petición (CONN_MAX_AGE = 0), cada petición usa una conexión del pool solo mientras dura y el establecimiento de la conexión (TCP, TLS,
+autenticación, y los SET de zona horaria y rol) sale del camino de la petición.
+
+La configuración va en la clave POOL de la base de datos: MAX_SIZE (conexiones por proceso), TIMEOUT (segundos esperando una conexión libre),
+MAX_LIFETIME (segundos que vive una conexión) y CHECK_IDLE (segundos sin usarse tras los que se comprueba con SELECT 1 antes de entregarla).
+"""
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.creation import DatabaseCreation as BaseDatabaseCreation
+from django.db.backends.postgresql.psycopg_any import IsolationLevel, is_psycopg3
+
+from locallibrary.db.pool import ConnectionPool, PoolTimeout, close_pools, get_pool
+
+if is_psycopg3:
+    from psycopg.pq import TransactionStatus
+    IDLE = TransactionStatus.IDLE
+else:
+    from psycopg2.extensions import TRANSACTION_STATUS_IDLE as IDLE
+
+
+def transaction_status(connection):
+    if is_psycopg3:
+        return connection.info.transaction_status
+    return connection.get_transaction_status()
+
+
+def check_connection(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        if transaction_status(connection) != IDLE:
+            connection.rollback() # sin autocommit, el SELECT 1 abrió una transacción
+        return True
+    except base.Database.Error:
+        return False
+
+
+class DatabaseCreation(BaseDatabaseCreation):
+    # PostgreSQL no deja borrar ni copiar una base de datos con conexiones abiertas, y el pool guarda conexiones libres a la de pruebas
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        close_pools(self.connection.alias)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+    def _clone_test_db(self, suffix, verbosity, keepdb=False):
+        close_pools(self.connection.alias)
+        super()._clone_test_db(suffix, verbosity, keepdb)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def get_pool(self, conn_params):
+        options = self.settings_dict.get('POOL', {})
+        # una conexión sirve para otra petición solo si apunta a la misma base de datos con los mismos parámetros
+        key = (self.alias, repr(sorted(conn_params.items())))
+        label = (self.alias, conn_params.get('dbname') or conn_params.get('database') or '')
+        return get_pool(key, label, lambda: ConnectionPool(
+            connect=lambda: super(DatabaseWrapper, self).get_new_connection(conn_params),
+            check=check_connection,
+            discard=lambda connection: connection.close(),
+            max_size=int(options.get('MAX_SIZE', 10)),
+            timeout=float(options.get('TIMEOUT', 10)),
+            max_lifetime=float(options.get('MAX_LIFETIME', 3600)),
+            check_idle=float(options.get('CHECK_IDLE', 30)),
+        ))
+
+    def get_new_connection(self, conn_params):
+        # lo que hace get_new_connection() del backend de Django con self.isolation_level, también para las conexiones reutilizadas
+        self.isolation_level = IsolationLevel(self.settings_dict['OPTIONS'].get('isolation_level', IsolationLevel.READ_COMMITTED))
+        try:
+            return self.get_pool(conn_params).acquire()
+        except PoolTimeout as error:
+            raise self.Database.OperationalError(str(error)) from error
+
+    def _close(self):
+        if self.connection is None:
+            return
+        connection = self.connection
+        reusable = not connection.closed
+        if reusable and transaction_status(connection) != IDLE:
+            # quedó una transacción abierta (p. ej. se cerró dentro de un atomic()); la deshacemos para no pasársela a otra petición
+            try:
+                connection.rollback()
+            except self.Database.Error:
+                reusable = False
+            reusable = reusable and transaction_status(connection) == IDLE
+        self.get_pool(self.get_connection_params()).release(connection, reusable)
@@ -0,0 +1,192 @@
+"""
+Backend de SQLite para producción en las bibliotecas pequeñas. Se activa con SQLITE_TUNED=1 en settings.py.
+
+Con la configuración de Django por defecto, cuando dos peticiones escriben a la vez (renovaciones, sesiones) una de ellas recibe
+"database is locked": una transacción empieza leyendo (BEGIN es diferido) y, al querer escribir, SQLite no puede esperar a la otra sin
+arriesgar un bloqueo mutuo, así que falla enseguida aunque haya un busy_timeout. Además, con el diario por defecto (rollback journal)
+quien escribe bloquea también a quienes leen. Este backend:
+
+- Al conectar ajusta la base de datos con PRAGMA: journal_mode = WAL (los lectores no esperan al que escribe ni al revés),
+  synchronous = NORMAL (con WAL sigue siendo seguro ante caídas del proceso; solo se pierde la última transacción si se va la luz),
+  mmap_size y cache_size (lecturas desde memoria) y busy_timeout (cuánto espera una conexión a que se libere la base de datos).
+- Empieza las transacciones de atomic() con BEGIN IMMEDIATE, que toma el permiso de escritura al principio: si otra transacción está
+  escribiendo, esta espera (busy_timeout) en lugar de fallar a mitad de camino.
+- Hace pasar todas las escrituras por un único "carril" (WriterLane): un lock entre los hilos del proceso y un flock() sobre un archivo
+  junto a la base de datos entre los workers de gunicorn. Quien quiere escribir espera su turno en el carril, en orden y sin los sondeos
+  con pausas crecientes (hasta 100 ms) del busy handler de SQLite. Las lecturas no pasan por el carril, así que siguen repartiéndose
+  entre todos los workers a la vez.
+
+La configuración va en la clave SQLITE de la base de datos: MMAP_SIZE (bytes), CACHE_SIZE (KiB), BUSY_TIMEOUT (milisegundos) y
+WRITER_LANE (True/False).
+"""
+import os
+import re
+import threading
+import time
+
+from django.db import OperationalError
+from django.db.backends.sqlite3 import base
+
+try:
+    import fcntl
+except ImportError: # Windows: el carril solo ordena los hilos de cada proceso
+    fcntl = None
+
+WRITE_STATEMENT = re.compile(r'\s*(INSERT|UPDATE|DELETE|REPLACE)\b', re.IGNORECASE)
+
+
+class WriterLane:
+    """
+    Turno para escribir en una base de datos SQLite: entre hilos con un lock y entre procesos con flock() sobre path (si hay path).
+    """
+    def __init__(self, path=None, timeout=5.0):
+        self.lock = threading.Lock()
+        self.path = path
+        self.timeout = timeout
+        self.file = None
+        self.pid = None
+
+    def _lock_file(self):
+        # cada proceso abre su propio archivo: el que se hereda de un fork compartiría el flock() con el proceso padre
+        if self.pid != os.getpid():
+            self.file = open(self.path, 'a+b')
+            self.pid = os.getpid()
+        return self.file
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        if not self.lock.acquire(timeout=self.timeout):
+            raise OperationalError('database is locked (esperando el turno de escritura)')
+        if self.path is None or fcntl is None:
+            return
+        pause = 0.0005
+        try:
+            while True:
+                try:
+                    fcntl.flock(self._lock_file(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        raise OperationalError('database is locked (esperando el turno de escritura de otro proceso)')
+                    time.sleep(pause)
+                    pause = min(pause * 2, 0.005)
+        except BaseException:
+            self.lock.release()
+            raise
+
+    def release(self):
+        if self.path is not None and fcntl is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+_lanes = {}
+_lanes_lock = threading.Lock()
+
+
+def writer_lane(name, in_memory, timeout):
+    """
+    El carril de la base de datos name (el mismo para todas las conexiones del proceso).
+    """
+    with _lanes_lock:
+        if name not in _lanes:
+            lane = WriterLane(None if in_memory else f'{name}-writer.lock', timeout)
+            # la clase de los cursores de este carril (la conexión de sqlite3 no admite atributos propios para guardar el carril)
+            lane.cursor_factory = type('LaneCursorWrapper', (LaneCursorWrapper,), {'lane': lane})
+            _lanes[name] = lane
+        return _lanes[name]
+
+
+class LaneCursorWrapper(base.SQLiteCursorWrapper):
+    """
+    Cursor que espera su turno en el carril para las escrituras sueltas, fuera de una transacción (p. ej. save() sin atomic()).
+    """
+    lane = None
+
+    def execute(self, query, params=None):
+        if self.lane is None or self.connection.in_transaction or not WRITE_STATEMENT.match(query):
+            return super().execute(query, params)
+        with self.lane:
+            return super().execute(query, params)
+
+    def executemany(self, query, param_list):
+        if self.lane is None or self.connection.in_transaction or not WRITE_STATEMENT.match(query):
+            return super().executemany(query, param_list)
+        with self.lane:
+            return super().executemany(query, param_list)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lane_held = False
+
+    @property
+    def tuning(self):
+        return self.settings_dict.get('SQLITE', {})
+
+    def get_lane(self):
+        if not self.tuning.get('WRITER_LANE', True):
+            return None
+        return writer_lane(str(self.settings_dict['NAME']), self.is_in_memory_db(), self.tuning.get('BUSY_TIMEOUT', 5000) / 1000)
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        if not self.is_in_memory_db():
+            connection.execute('PRAGMA journal_mode = WAL')
+        connection.execute('PRAGMA synchronous = NORMAL')
+        connection.execute(f"PRAGMA busy_timeout = {int(self.tuning.get('BUSY_TIMEOUT', 5000))}")
+        connection.execute(f"PRAGMA mmap_size = {int(self.tuning.get('MMAP_SIZE', 128 * 1024 * 1024))}")
+        connection.execute(f"PRAGMA cache_size = {-int(self.tuning.get('CACHE_SIZE', 16 * 1024))}") # negativo: en KiB
+        connection.execute('PRAGMA temp_store = MEMORY')
+        return connection
+
+    def create_cursor(self, name=None):
+        lane = self.get_lane()
+        if lane is None:
+            return super().create_cursor(name)
+        return self.connection.cursor(factory=lane.cursor_factory)
+
+    def _start_transaction_under_autocommit(self):
+        lane = self.get_lane()
+        if lane is not None:
+            lane.acquire()
+            self.lane_held = True
+        try:
+            self.cursor().execute('BEGIN IMMEDIATE')
+        except BaseException:
+            self._release_lane()
+            raise
+
+    def _release_lane(self):
+        if self.lane_held and not (self.connection is not None and self.connection.in_transaction):
+            self.lane_held = False
+            self.get_lane().release()
+
+    def _commit(self):
+        try:
+            super()._commit()
+        finally:
+            self._release_lane()
+
+    def _rollback(self):
+        try:
+            super()._rollback()
+        finally:
+            self._release_lane()
+
+    def _close(self):
+        try:
+            super()._close()
+        finally:
+            if self.lane_held:
+                self.lane_held = False
+                self.get_lane().release()
@@ -45,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'catalog.metrics.QueryMetricsMiddleware', # consultas y tiempos por vista (ver catalog/metrics.py); el primero para medir también los demás
+    'catalog.replicas.ReplicaRoutingMiddleware', # lecturas del catálogo en las réplicas, si hay (ver catalog/replicas.py)
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware', # Para instalar WhiteNoise en la aplicación Django
     'django.contrib.sessions.middleware.SessionMiddleware',  #Manages sessions across requests
@@ -59,7 +61,7 @@ ROOT_URLCONF = 'locallibrary.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'catalog.metrics.InstrumentedDjangoTemplates', # el motor de Django, midiendo el tiempo de render() (ver catalog/metrics.py)
         'DIRS': [
             os.path.join(BASE_DIR, 'templates'), # con esto django va a poder encontrar nuestras plantillas, ya sea las exclusivas para el catalogo, o las que son más globales como las de login, logout, etc
         ],
@@ -132,9 +134,64 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend' # queremos que
 
 # Heroku: Actualice la configuración de la base de datos desde $DATABASE_URL.
 import dj_database_url
-db_from_env = dj_database_url.config(conn_max_age=500)
+# CONN_HEALTH_CHECKS: antes de reutilizar una conexión persistente en una petición nueva, Django comprueba que siga viva
+# (p. ej. después de una conmutación por error del servidor) y si no, abre otra en lugar de fallar.
+db_from_env = dj_database_url.config(conn_max_age=500, conn_health_checks=True)
 DATABASES['default'].update(db_from_env)
 
+# Réplicas de solo lectura (ver catalog/replicas.py): DATABASE_REPLICA_URLS es una lista de URL separadas por comas, con el mismo formato que
+# DATABASE_URL, p. ej. postgres://lector@replica1/locallibrary,postgres://lector@replica2/locallibrary (o, para probar en local, dos copias
+# de la base de datos SQLite: sqlite:////ruta/replica1.sqlite3,sqlite:////ruta/replica2.sqlite3). Se llaman replica1, replica2, ...
+# En las pruebas cada réplica es un espejo de 'default' (TEST MIRROR), pero las pruebas de las vistas solo usan 'default', así que
+# se ejecutan sin DATABASE_REPLICA_URLS; el enrutado se prueba con dos archivos SQLite en catalog/tests/test_replicas.py.
+CATALOG_REPLICAS = []
+for number, url in enumerate(filter(None, (url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(','))), start=1):
+    DATABASES[f'replica{number}'] = {**dj_database_url.parse(url, conn_max_age=500, conn_health_checks=True), 'TEST': {'MIRROR': 'default'}}
+    CATALOG_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['catalog.replicas.ReplicaRouter']
+
+# Pool de conexiones de PostgreSQL dentro de cada worker (ver locallibrary/db/postgresql_pool/base.py), con DATABASE_POOL=1.
+# Cada petición toma una conexión del pool y la devuelve al terminar (CONN_MAX_AGE = 0), así cada worker tiene como mucho
+# DATABASE_POOL_MAX_SIZE conexiones abiertas (conviene que workers x tamaño quede por debajo de max_connections de PostgreSQL).
+# DATABASE_POOL_TIMEOUT: segundos esperando una conexión libre; DATABASE_POOL_MAX_LIFETIME: segundos que vive una conexión;
+# DATABASE_POOL_CHECK_IDLE: segundos sin usarse tras los que se comprueba una conexión antes de entregarla.
+DATABASE_POOL = os.environ.get('DATABASE_POOL', '') in ('1', 'true', 'True')
+if DATABASE_POOL:
+    for database in DATABASES.values():
+        if database['ENGINE'] == 'django.db.backends.postgresql':
+            database.update(ENGINE='locallibrary.db.postgresql_pool', CONN_MAX_AGE=0, POOL={
+                'MAX_SIZE': int(os.environ.get('DATABASE_POOL_MAX_SIZE', 10)),
+                'TIMEOUT': float(os.environ.get('DATABASE_POOL_TIMEOUT', 10)),
+                'MAX_LIFETIME': float(os.environ.get('DATABASE_POOL_MAX_LIFETIME', 3600)),
+                'CHECK_IDLE': float(os.environ.get('DATABASE_POOL_CHECK_IDLE', 30)),
+            })
+
+# SQLite ajustado para producción (ver locallibrary/db/sqlite_tuned/base.py), con SQLITE_TUNED=1: diario WAL, synchronous NORMAL,
+# BEGIN IMMEDIATE en las transacciones y un solo "carril" de escritura compartido por todos los workers, para que las escrituras
+# simultáneas esperen su turno en lugar de fallar con "database is locked".
+# SQLITE_MMAP_SIZE (bytes), SQLITE_CACHE_SIZE (KiB por conexión), SQLITE_BUSY_TIMEOUT (milisegundos que se espera para escribir)
+SQLITE_TUNED = os.environ.get('SQLITE_TUNED', '') in ('1', 'true', 'True')
+if SQLITE_TUNED:
+    for database in DATABASES.values():
+        if database['ENGINE'] == 'django.db.backends.sqlite3':
+            database.update(ENGINE='locallibrary.db.sqlite_tuned', SQLITE={
+                'MMAP_SIZE': int(os.environ.get('SQLITE_MMAP_SIZE', 128 * 1024 * 1024)),
+                'CACHE_SIZE': int(os.environ.get('SQLITE_CACHE_SIZE', 16 * 1024)),
+                'BUSY_TIMEOUT': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),
+                'WRITER_LANE': os.environ.get('SQLITE_WRITER_LANE', '1') in ('1', 'true', 'True'),
+            })
+
+# cómo se reparte la lectura entre las réplicas: round_robin (por turnos) o least_latency (la que respondió más rápido últimamente)
+CATALOG_REPLICA_STRATEGY = os.environ.get('CATALOG_REPLICA_STRATEGY', 'round_robin')
+
+# las vistas (nombres de URL) cuyas lecturas GET pueden ir a las réplicas; todas las demás leen de la principal
+CATALOG_REPLICA_VIEWS = ['index', 'books', 'book-detail', 'authors', 'author-detail', 'search', 'autocomplete']
+
+# segundos que un visitante lee de la principal después de escribir (para ver sus propios cambios aunque las réplicas vayan con retraso)
+CATALOG_REPLICA_STICKY_SECONDS = int(os.environ.get('CATALOG_REPLICA_STICKY_SECONDS', 10))
+CATALOG_REPLICA_STICKY_COOKIE = 'primary_until'
+
 # Archivos estáticos (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/1.10/howto/static-files/
 
@@ -145,4 +202,58 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATIC_URL = '/static/'
 
 # podemos reducir el tamaño de los ficheros estáticos al ser servidos (lo que lo hace más eficiente).
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
\ No newline at end of file
+STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# Caché
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Sin CACHES Django usa LocMemCache (una caché en memoria por proceso). En producción con varios workers de gunicorn
+# conviene una caché compartida, por ejemplo redis o memcached, configurada aquí.
+
+# segundos que la vista index guarda en caché los contadores del catálogo (ver catalog/stats.py)
+CATALOG_STATS_TIMEOUT = int(os.environ.get('CATALOG_STATS_TIMEOUT', 300))
+
+# segundos que se guardan en caché las listas de libros de cada autor (ver catalog/caching.py)
+CATALOG_CACHE_TIMEOUT = int(os.environ.get('CATALOG_CACHE_TIMEOUT', 600))
+
+# paginación por cursor en las vistas de lista del catálogo en lugar de ?page=N (ver catalog/pagination.py).
+# Desactivada por defecto; se activa con la variable de entorno CATALOG_CURSOR_PAGINATION=1
+CATALOG_CURSOR_PAGINATION = os.environ.get('CATALOG_CURSOR_PAGINATION', '') in ('1', 'true', 'True')
+
+# cada cuántos segundos, como mucho, un worker comprueba si otro proceso cambió el catálogo y reconstruye su índice de autocompletado (ver catalog/autocomplete.py)
+CATALOG_AUTOCOMPLETE_REFRESH = int(os.environ.get('CATALOG_AUTOCOMPLETE_REFRESH', 30))
+
+# segundos que se guardan en caché las páginas del catálogo para los visitantes anónimos y los fragmentos de las listas (ver catalog/caching.py)
+CATALOG_PAGE_CACHE_TIMEOUT = int(os.environ.get('CATALOG_PAGE_CACHE_TIMEOUT', 300))
+
+# Sesiones
+# https://docs.djangoproject.com/en/5.0/topics/http/sessions/#configuring-the-session-engine
+# Con el motor por defecto (db) cada sesión se lee de la tabla django_session. cached_db la lee de la caché y solo va a la base de datos
+# si no está en caché (sigue escribiendo en ella al modificarla); signed_cookies guarda la sesión entera en una cookie firmada y
+# nunca toca la base de datos. Se elige con la variable de entorno SESSION_ENGINE=cached_db|signed_cookies|db
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + os.environ.get('SESSION_ENGINE', 'cached_db')
+
+# contador de visitas de la página de inicio (ver catalog/visits.py): SignedCookieVisitCounter, CacheVisitCounter,
+# BufferedVisitCounter o SessionVisitCounter (el comportamiento anterior, que guarda la sesión en cada visita)
+CATALOG_VISIT_COUNTER = 'catalog.visits.' + os.environ.get('CATALOG_VISIT_COUNTER', 'SignedCookieVisitCounter')
+
+# BufferedVisitCounter escribe las visitas pendientes cada tantas visitas o cada tantos segundos, desde un hilo en segundo plano
+# (con CATALOG_VISITS_BACKGROUND_FLUSH=0, en la petición que completa el lote), y recuerda el total de hasta tantos visitantes
+CATALOG_VISITS_FLUSH_EVERY = int(os.environ.get('CATALOG_VISITS_FLUSH_EVERY', 100))
+CATALOG_VISITS_FLUSH_INTERVAL = int(os.environ.get('CATALOG_VISITS_FLUSH_INTERVAL', 10))
+CATALOG_VISITS_BACKGROUND_FLUSH = os.environ.get('CATALOG_VISITS_BACKGROUND_FLUSH', '1') in ('1', 'true', 'True')
+CATALOG_VISITS_CACHE_SIZE = int(os.environ.get('CATALOG_VISITS_CACHE_SIZE', 10000))
+
+# vistas asíncronas (async def) para las páginas de lectura del catálogo, para servir el sitio con ASGI (ver catalog/async_views.py).
+# Se activa con la variable de entorno CATALOG_ASYNC_VIEWS=1; con WSGI (gunicorn) conviene dejarlas desactivadas
+CATALOG_ASYNC_VIEWS = os.environ.get('CATALOG_ASYNC_VIEWS', '') in ('1', 'true', 'True')
+
+# métricas de rendimiento por vista (ver catalog/metrics.py), en /catalog/metrics/ en formato Prometheus.
+# CATALOG_METRICS_WINDOW: segundos que cubren los percentiles recientes (_recent); CATALOG_METRICS_TOKEN: token para leerlas sin sesión (Authorization: Bearer);
+# CATALOG_SLOW_QUERY_MS: si se define, se registran en el log las consultas más lentas que ese número de milisegundos
+CATALOG_METRICS = os.environ.get('CATALOG_METRICS', '1') in ('1', 'true', 'True')
+CATALOG_METRICS_WINDOW = int(os.environ.get('CATALOG_METRICS_WINDOW', 300))
+CATALOG_METRICS_TOKEN = os.environ.get('CATALOG_METRICS_TOKEN', '')
+CATALOG_SLOW_QUERY_MS = float(os.environ['CATALOG_SLOW_QUERY_MS']) if os.environ.get('CATALOG_SLOW_QUERY_MS') else None
+
+# días que se guarda una copia apartada para una reserva antes de que el lector la recoja (ver catalog/holds.py); pasado ese plazo
+# el comando diario "manage.py expire_holds" cancela la reserva y la copia pasa a la siguiente de la cola
+CATALOG_HOLD_PICKUP_DAYS = int(os.environ.get('CATALOG_HOLD_PICKUP_DAYS', 3))
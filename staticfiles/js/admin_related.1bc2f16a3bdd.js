@@ -0,0 +1,40 @@
+// Listas paginadas de filas relacionadas en el formulario de cambio del admin (ver LazyRelatedMixin en catalog/admin.py).
+// Cada <details data-related-url> pide su primera página la primera vez que se abre; los enlaces "anterior"/"siguiente"
+// cargan la página correspondiente en el mismo sitio, sin recargar el formulario (y sin perder lo que se haya escrito en él).
+'use strict';
+{
+    function load(details, url) {
+        const content = details.querySelector('.related-rows-content');
+        fetch(url, {credentials: 'same-origin', headers: {'X-Requested-With': 'XMLHttpRequest'}})
+            .then(function(response) {
+                if (!response.ok) {
+                    throw new Error(response.status);
+                }
+                return response.text();
+            })
+            .then(function(html) {
+                content.innerHTML = html;
+            })
+            .catch(function() {
+                content.innerHTML = '<p class="errornote">No se pudo cargar la lista.</p>';
+            });
+    }
+
+    document.addEventListener('DOMContentLoaded', function() {
+        document.querySelectorAll('details[data-related-url]').forEach(function(details) {
+            details.addEventListener('toggle', function() {
+                if (details.open && !details.dataset.loaded) {
+                    details.dataset.loaded = 'true';
+                    load(details, details.dataset.relatedUrl);
+                }
+            });
+            details.addEventListener('click', function(event) {
+                const link = event.target.closest('a.related-page');
+                if (link) {
+                    event.preventDefault();
+                    load(details, link.getAttribute('href'));
+                }
+            });
+        });
+    });
+}